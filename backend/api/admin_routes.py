@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, Request, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from services.profiler_service import ProfilerService
+
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+def require_local(request: Request):
+    """Diagnostics are only reachable from the host machine itself"""
+    if not request.client or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Admin endpoints are local only")
+
+
+router = APIRouter(
+    prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_local)]
+)
+
+
+@router.get("/profiler")
+async def profiler_status():
+    return ProfilerService.status()
+
+
+@router.post("/profiler/start")
+async def profiler_start(interval_ms: float = Query(5, ge=1, le=1000)):
+    return ProfilerService.start(interval_ms / 1000)
+
+
+@router.post("/profiler/stop")
+async def profiler_stop():
+    return ProfilerService.stop()
+
+
+@router.get("/profiler/folded", response_class=PlainTextResponse)
+async def profiler_folded():
+    """Sampled stacks; feed to flamegraph.pl or load into speedscope"""
+    return PlainTextResponse(
+        ProfilerService.folded(),
+        headers={"Content-Disposition": 'attachment; filename="profile.folded"'},
+    )
+
+
+@router.get("/loop-lag")
+async def loop_lag(reset: bool = False):
+    """How late the event loop wakes up; reset starts a fresh window"""
+    return ProfilerService.loop_lag(reset)
+
+
+@router.get("/slow")
+async def slow_requests():
+    return {"requests": ProfilerService.slow_requests(), **ProfilerService.status()}
+
+
+@router.post("/slow")
+async def configure_slow(request: Request):
+    data = await request.json()
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+    ProfilerService.configure(data.get("threshold_ms"), data.get("keep"))
+    return ProfilerService.status()
+
+
+@router.get("/slow/{request_id}/folded", response_class=PlainTextResponse)
+async def slow_request_folded(request_id: int):
+    folded = ProfilerService.slow_folded(request_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Slow request not found")
+    return PlainTextResponse(
+        folded,
+        headers={
+            "Content-Disposition": f'attachment; filename="request_{request_id}.folded"'
+        },
+    )
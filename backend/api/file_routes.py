@@ -1,30 +1,131 @@
 import os
 import shutil
+import asyncio
 import tempfile
 from typing import List, Optional
-from fastapi import APIRouter, Request, Response, Query, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Request, Response, Query, BackgroundTasks, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from services.file_service import FileService, UPLOAD_DIR
 from services.session_manager import session_manager
 from services.analytics_service import AnalyticsService
 from services.thumbnail_service import ThumbnailService
+from services.retention_service import RetentionService
+from services.write_pipeline import UploadWriter
+from services.media_service import MediaService
+from services.index_service import IndexService
+from services.relay_service import RelayService
+from services.admission_service import AdmissionService
+from services.journal_service import JournalService
+from services.trash_service import TrashService
+from services.archive_service import ArchiveService
+from services.profiler_service import ProfilerService
+from core.responses import FastJSONResponse
 
 router = APIRouter(prefix="/api/files", tags=["files"])
 
 
+LIST_FIELDS = {
+    "name",
+    "size",
+    "modified",
+    "direction",
+    "session_id",
+    "is_dir",
+    "has_thumbnail",
+    "mime",
+    "exif_date",
+}
+
+
 @router.get("/")
-async def list_files(request: Request):
+async def list_files(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=IndexService.MAX_PAGE),
+    sort: str = Query("name", pattern="^(name|size|mtime|exif_date)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    direction: Optional[str] = Query(None, pattern="^(received|sent)$"),
+    device: Optional[str] = None,
+    type: Optional[str] = None,
+    since: Optional[float] = None,
+    fields: Optional[str] = None,
+):
     session_id = request.headers.get("x-session-id")
     if session_id == "null" or not session_id:
         session_id = None
 
     device_name = None
-    if session_id:
-        session = session_manager.get_session(session_id)
-        if session:
-            device_name = session.get("device_name")
-
-    return FileService.list_files(session_id, device_name)
+    session = session_manager.get_session(session_id) if session_id else None
+    if session:
+        device_name = session.get("device_name")
+
+    if limit is None and cursor is None:
+        # Legacy: the full array, scanned live from disk
+        with ProfilerService.stage("list_files"):
+            files = FileService.list_files(session_id, device_name)
+        return FastJSONResponse(files)
+
+    # Paginated: one page from the catalog, cost independent of total files.
+    # An expired session must not fall through to the unscoped listing.
+    if session_id and not session:
+        raise HTTPException(status_code=401, detail="Unknown session")
+    try:
+        page = IndexService.list_page(
+            cursor,
+            sort=sort,
+            order=order,
+            limit=limit or 100,
+            device=device,
+            direction=direction,
+            file_type=type,
+            since=since,
+            session_id=session_id,
+            session_device=device_name,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if fields:
+        wanted = LIST_FIELDS.intersection(f.strip() for f in fields.split(","))
+        page["items"] = [
+            {k: v for k, v in item.items() if k in wanted} for item in page["items"]
+        ]
+    return FastJSONResponse(page)
+
+
+@router.get("/search")
+async def search(
+    request: Request,
+    q: Optional[str] = None,
+    device: Optional[str] = None,
+    direction: Optional[str] = Query(None, pattern="^(received|sent)$"),
+    type: Optional[str] = None,
+    since: Optional[float] = None,
+    sort: str = Query("mtime", pattern="^(name|size|mtime|exif_date)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(50, ge=1, le=IndexService.MAX_PAGE),
+    offset: int = Query(0, ge=0),
+):
+    session_id = request.headers.get("x-session-id")
+    if session_id == "null" or not session_id:
+        session_id = None
+    session = session_manager.get_session(session_id) if session_id else None
+    if session_id and not session:
+        raise HTTPException(status_code=401, detail="Unknown session")
+
+    return IndexService.search(
+        q,
+        sort=sort,
+        order=order,
+        limit=limit,
+        offset=offset,
+        device=device,
+        direction=direction,
+        file_type=type,
+        since=since,
+        session_id=session_id,
+        session_device=session.get("device_name") if session else None,
+    )
 
 
 @router.post("/upload")
@@ -35,10 +136,175 @@ async def upload(request: Request):
     if session_id == "null" or not session_id:
         session_id = None
 
-    filename = await FileService.save_stream(request, session_id, is_host=is_host)
+    with ProfilerService.stage("save_stream"):
+        filename = await FileService.save_stream(request, session_id, is_host=is_host)
     return {"status": "success", "filename": filename}
 
 
+@router.get("/tree")
+async def tree(
+    request: Request,
+    direction: str = Query("received", pattern="^(received|sent)$"),
+    path: str = "",
+):
+    """Recursive size/mtime listing of this session's folder (for sync clients)"""
+    session_id = request.headers.get("x-session-id")
+    session = session_manager.get_session(session_id) if session_id else None
+    if not session or session.get("status") != "AUTHENTICATED":
+        raise HTTPException(status_code=401, detail="Unknown session")
+    loop = asyncio.get_running_loop()
+    return FastJSONResponse(
+        await loop.run_in_executor(
+            None,
+            FileService.list_tree,
+            session_id,
+            session["device_name"],
+            direction,
+            path,
+        )
+    )
+
+
+@router.post("/sync/manifest")
+async def sync_manifest(request: Request):
+    """
+    Which of a device's files the host lacks or has a different copy of:
+    post {"files": [[path, size, mtime(, sha256)], ...]} with paths relative
+    to its received folder; upload only what comes back.
+    """
+    session_id = request.headers.get("x-session-id")
+    session = session_manager.get_session(session_id) if session_id else None
+    if not session or session.get("status") != "AUTHENTICATED":
+        raise HTTPException(status_code=401, detail="Unknown session")
+    data = await request.json()
+    manifest = data.get("files") if isinstance(data, dict) else None
+    if not isinstance(manifest, list):
+        raise HTTPException(status_code=400, detail="Expected a files list")
+    loop = asyncio.get_running_loop()
+    return FastJSONResponse(
+        await loop.run_in_executor(
+            None, FileService.diff_manifest, session["device_name"], manifest
+        )
+    )
+
+
+@router.post("/upload/batch")
+async def upload_batch(request: Request, background_tasks: BackgroundTasks):
+    session_id = request.headers.get("x-session-id")
+    is_host = request.headers.get("x-is-host") == "true"
+
+    if session_id == "null" or not session_id:
+        session_id = None
+
+    results, saved = await FileService.save_multipart(
+        request, session_id, is_host=is_host
+    )
+    # Thumbnails for the whole batch are built after the response is sent
+    background_tasks.add_task(ThumbnailService.generate_thumbnails_async, saved)
+    return {"status": "success", "results": results}
+
+
+@router.post("/broadcast")
+async def broadcast(request: Request, background_tasks: BackgroundTasks):
+    """Host send to several devices; the payload is stored on disk only once"""
+    targets = [
+        sid.strip()
+        for sid in request.headers.get("x-target-sessions", "").split(",")
+        if sid.strip()
+    ]
+    if not targets:
+        raise HTTPException(status_code=400, detail="No target sessions given")
+    unknown = [sid for sid in targets if not session_manager.get_session(sid)]
+    if unknown:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown sessions: {', '.join(unknown)}"
+        )
+
+    targets = list(dict.fromkeys(targets))
+    paths = await FileService.save_broadcast(request, targets)
+    background_tasks.add_task(ThumbnailService.generate_thumbnails_async, paths)
+    # Names can differ per device when duplicates are not overwritten
+    return {
+        "status": "success",
+        "files": {sid: os.path.basename(p) for sid, p in zip(targets, paths)},
+    }
+
+
+@router.post("/relay/offer")
+async def relay_offer(request: Request):
+    """
+    Announces a live device-to-device send. The payload is piped from the
+    sender's PUT to the receiver's GET without being staged on disk.
+    """
+    data = await request.json()
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+    session_id = request.headers.get("x-session-id")
+    is_host = request.headers.get("x-is-host") == "true"
+
+    if is_host:
+        sender = "Host"
+    else:
+        session = session_manager.get_session(session_id) if session_id else None
+        if not session:
+            raise HTTPException(status_code=401, detail="Unknown session")
+        sender = session.get("device_name") or "Unknown_Device"
+
+    target = data.get("target_session")
+    if not target or not session_manager.get_session(target):
+        raise HTTPException(status_code=404, detail="Target device not connected")
+
+    filename = FileService.sanitize_filename(data.get("filename") or "unnamed_file")
+    if not FileService.is_safe(filename):
+        raise HTTPException(status_code=403, detail="File type blocked for security")
+
+    size = data.get("size") or 0  # 0 = unknown, streamed until the body ends
+    try:
+        if isinstance(size, (bool, float)):
+            raise ValueError
+        size = int(size)
+    except (TypeError, ValueError):
+        size = -1
+    if size < 0:
+        raise HTTPException(status_code=400, detail="Invalid size")
+
+    return RelayService.create_offer(
+        sender,
+        None if is_host else session_id,
+        target,
+        filename,
+        size=size,
+        persist=bool(data.get("persist", False)),
+    )
+
+
+@router.get("/relay/pending")
+async def relay_pending(request: Request):
+    session_id = request.headers.get("x-session-id")
+    if not session_id:
+        raise HTTPException(status_code=400, detail="Session ID required")
+    return {"relays": RelayService.pending_for(session_id)}
+
+
+@router.put("/relay/{relay_id}")
+async def relay_send(relay_id: str, request: Request):
+    size = await FileService.relay_stream(relay_id, request)
+    return {"status": "success", "size": size}
+
+
+@router.get("/relay/{relay_id}")
+async def relay_receive(relay_id: str, request: Request):
+    relay, body = await RelayService.receive(
+        relay_id, request.headers.get("x-session-id")
+    )
+    headers = {"Content-Disposition": f'attachment; filename="{relay["filename"]}"'}
+    if relay["size"]:
+        headers["Content-Length"] = str(relay["size"])
+    return StreamingResponse(
+        body, media_type="application/octet-stream", headers=headers
+    )
+
+
 @router.get("/config")
 async def get_config():
     return {
@@ -46,15 +312,54 @@ async def get_config():
         "safety_filter": FileService.SAFETY_FILTER_ENABLED,
         "overwrite_duplicates": FileService.OVERWRITE_DUPLICATES,
         "autosync_path": FileService.AUTOSYNC_PATH,
+        "fsync_policy": UploadWriter.FSYNC_POLICY,
+        "zip_level": ArchiveService.LEVEL,
     }
 
 
 @router.post("/cleanup")
-async def cleanup():
-    count = FileService.cleanup_transfers(0)  # Age 0 = clear everything
+async def cleanup(max_age_hours: float = 0, device_name: Optional[str] = None):
+    # Age 0 = clear everything (optionally only one device's folder)
+    count = FileService.cleanup_transfers(max_age_hours, device_name)
     return {"status": "success", "count": count}
 
 
+@router.get("/queue")
+async def get_queue(ticket: Optional[str] = None):
+    """
+    Admission pools for heavy work. Clients that sent an x-ticket header
+    with a queued request can poll ?ticket= for their position.
+    """
+    return AdmissionService.get_status(ticket)
+
+
+@router.post("/queue")
+async def update_queue(request: Request):
+    AdmissionService.update(await request.json())
+    return {"status": "success", "queue": AdmissionService.get_status()}
+
+
+@router.get("/jobs")
+async def get_jobs():
+    """Transfer jobs currently open in the crash-recovery journal"""
+    return {"jobs": JournalService.get_jobs()}
+
+
+@router.get("/retention")
+async def get_retention():
+    return {
+        "policy": RetentionService.get_policy(),
+        "usage": RetentionService.get_usage(),
+    }
+
+
+@router.post("/retention")
+async def update_retention(request: Request):
+    data = await request.json()
+    RetentionService.update_policy(data)
+    return {"status": "success", "policy": RetentionService.get_policy()}
+
+
 @router.post("/config")
 async def update_config(request: Request):
     data = await request.json()
@@ -62,6 +367,8 @@ async def update_config(request: Request):
     safety = data.get("safety_filter")
     overwrite = data.get("overwrite_duplicates")
     autosync = data.get("autosync_path")
+    fsync_policy = data.get("fsync_policy")
+    zip_level = data.get("zip_level")
 
     if path:
         FileService.set_save_path(path)
@@ -71,6 +378,14 @@ async def update_config(request: Request):
         FileService.OVERWRITE_DUPLICATES = overwrite
     if autosync:
         FileService.AUTOSYNC_PATH = autosync
+    if fsync_policy:
+        if fsync_policy not in UploadWriter.FSYNC_POLICIES:
+            raise HTTPException(status_code=400, detail="Unknown fsync policy")
+        UploadWriter.FSYNC_POLICY = fsync_policy
+    if zip_level is not None:
+        if zip_level not in range(10):
+            raise HTTPException(status_code=400, detail="zip_level must be 0-9")
+        ArchiveService.LEVEL = zip_level
 
     return {
         "status": "success",
@@ -78,6 +393,8 @@ async def update_config(request: Request):
         "safety_filter": FileService.SAFETY_FILTER_ENABLED,
         "overwrite_duplicates": FileService.OVERWRITE_DUPLICATES,
         "autosync_path": FileService.AUTOSYNC_PATH,
+        "fsync_policy": UploadWriter.FSYNC_POLICY,
+        "zip_level": ArchiveService.LEVEL,
     }
 
 
@@ -88,8 +405,23 @@ async def batch_delete(request: Request):
     session_id = request.headers.get("x-session-id")
     device_name = data.get("device_name")
 
-    FileService.batch_delete(filenames, session_id, device_name)
-    return {"status": "success"}
+    trash_id = await FileService.batch_delete(filenames, session_id, device_name)
+    return {
+        "status": "success",
+        "trash_id": trash_id,
+        "undo_seconds": TrashService.UNDO_WINDOW if trash_id else 0,
+    }
+
+
+@router.get("/trash")
+async def list_trash(request: Request):
+    """Deletes from this session that can still be undone"""
+    return {"batches": TrashService.list_batches(request.headers.get("x-session-id"))}
+
+
+@router.post("/trash/{trash_id}/restore")
+async def restore_trash(trash_id: str, request: Request):
+    return TrashService.restore(trash_id, request.headers.get("x-session-id"))
 
 
 @router.get("/batch-download")
@@ -102,9 +434,15 @@ async def batch_download(
     if not filenames:
         raise HTTPException(status_code=400, detail="No filenames provided")
 
-    zip_path = await FileService.zip_files(filenames, session_id, device_name)
-    return FileResponse(
-        zip_path, filename="batch_transfer.zip", media_type="application/zip"
+    ticket = request.headers.get("x-ticket")
+    zip_path = await FileService.zip_files(
+        filenames, session_id, device_name, ticket=ticket
+    )
+    return await AdmissionService.file_response(
+        zip_path,
+        ticket,
+        filename="batch_transfer.zip",
+        media_type="application/zip",
     )
 
 
@@ -131,6 +469,65 @@ async def get_thumbnail(filename: str):
     raise HTTPException(status_code=404, detail="Thumbnail not found")
 
 
+async def _thumbnail_batch(request: Request, ids: List[str], fmt: str):
+    if not ids:
+        raise HTTPException(status_code=400, detail="No ids given")
+    if len(ids) > ThumbnailService.MAX_BATCH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {ThumbnailService.MAX_BATCH} thumbnails per request",
+        )
+    loop = asyncio.get_running_loop()
+    found, missing, to_render = await loop.run_in_executor(
+        None, ThumbnailService.lookup, ids, request.headers.get("x-session-id")
+    )
+    if to_render:
+        # Missing thumbnails show up in the next fetch (with a new ETag)
+        ThumbnailService.schedule(to_render)
+
+    etag = ThumbnailService.batch_etag(fmt, ids, found)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if fmt == "sprite":
+        sprite = await loop.run_in_executor(
+            None, ThumbnailService.render_sprite, found, missing, etag
+        )
+        return FastJSONResponse(sprite, headers=headers)
+    boundary = etag.strip('"')
+    body = await loop.run_in_executor(
+        None, ThumbnailService.render_multipart, found, missing, boundary
+    )
+    return Response(
+        body, media_type=f"multipart/mixed; boundary={boundary}", headers=headers
+    )
+
+
+@router.get("/thumbnails")
+async def get_thumbnails(
+    request: Request,
+    ids: List[str] = Query([]),
+    format: str = Query("multipart", pattern="^(multipart|sprite)$"),
+):
+    """
+    A page of thumbnails in one response: ids are the names /thumbnail
+    takes. multipart returns an image/webp part per id; sprite returns one
+    sheet with an offset map. Revalidate with If-None-Match.
+    """
+    return await _thumbnail_batch(request, ids, format)
+
+
+@router.post("/thumbnails")
+async def post_thumbnails(request: Request):
+    """Same as GET /thumbnails for id lists too long for a URL"""
+    data = await request.json()
+    fmt = data.get("format", "multipart")
+    if fmt not in ("multipart", "sprite"):
+        raise HTTPException(status_code=400, detail="Unknown format")
+    ids = [i for i in data.get("ids") or [] if isinstance(i, str)]
+    return await _thumbnail_batch(request, ids, fmt)
+
+
 @router.get("/analytics/history")
 async def get_analytics():
     return {
@@ -144,25 +541,74 @@ async def download(filename: str, request: Request):
     session_id = request.headers.get("x-session-id")
     is_host = request.headers.get("x-is-host") == "true"
 
-    search_paths = []
+    ticket = request.headers.get("x-ticket")
+
+    path = FileService.resolve_path(filename, session_id)
+    if path and os.path.isfile(path):
+        RetentionService.touch(path)
+        return await AdmissionService.file_response(
+            path, ticket, filename=os.path.basename(path)
+        )
+    elif path and os.path.isdir(path):
+        # Zip it!
+        zip_path = await FileService.zip_directory(path, ticket=ticket)
+        return await AdmissionService.file_response(
+            zip_path,
+            ticket,
+            filename=f"{os.path.basename(path)}.zip",
+            media_type="application/zip",
+        )
 
-    if session_id and session_id != "null":
-        search_paths.append(os.path.join(UPLOAD_DIR, session_id, "outgoing", filename))
+    raise HTTPException(status_code=404, detail="File not found")
 
-    search_paths.append(os.path.join(UPLOAD_DIR, filename))
-    search_paths.append(os.path.join(FileService.SAVE_PATH, filename))
 
-    for path in search_paths:
-        if os.path.exists(path):
-            if os.path.isfile(path):
-                return FileResponse(path, filename=os.path.basename(path))
-            elif os.path.isdir(path):
-                # Zip it!
-                zip_path = await FileService.zip_directory(path)
-                return FileResponse(
-                    zip_path,
-                    filename=f"{os.path.basename(path)}.zip",
-                    media_type="application/zip",
-                )
+def _resolve_media(filename: str, request: Request) -> str:
+    path = FileService.resolve_path(filename, request.headers.get("x-session-id"))
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return path
 
-    raise HTTPException(status_code=404, detail="File not found")
+
+@router.get("/stream/{filename:path}")
+async def stream(filename: str, request: Request):
+    """Inline playback; Range requests are answered with 206 partial content"""
+    path = _resolve_media(filename, request)
+    RetentionService.touch(path)
+    return await AdmissionService.file_response(
+        path,
+        request.headers.get("x-ticket"),
+        filename=os.path.basename(path),
+        content_disposition_type="inline",
+    )
+
+
+@router.get("/poster/{filename:path}")
+async def poster(filename: str, request: Request):
+    path = _resolve_media(filename, request)
+    poster_path = await MediaService.get_poster(path)
+    if not poster_path:
+        raise HTTPException(status_code=404, detail="Poster not available")
+    return FileResponse(poster_path, media_type="image/jpeg")
+
+
+@router.get("/preview/{filename:path}")
+async def preview(filename: str, request: Request):
+    """Low-bitrate preview; 202 while it is being generated, 404 if that failed"""
+    path = _resolve_media(filename, request)
+    if not MediaService.is_video(path) or not MediaService.get_status()["available"]:
+        raise HTTPException(status_code=404, detail="Preview not available")
+    preview_path = MediaService.get_preview(path)
+    if not preview_path:
+        return JSONResponse(
+            status_code=202,
+            content={"status": "processing"},
+            headers={"Retry-After": "5"},
+        )
+    return FileResponse(
+        preview_path, media_type="video/mp4", content_disposition_type="inline"
+    )
+
+
+@router.get("/media/status")
+async def media_status():
+    return MediaService.get_status()
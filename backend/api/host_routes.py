@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Request, HTTPException
 from services.clipboard_service import ClipboardService
 from services.host_service import HostService
+from services.network_service import NetworkService
+from core import startup
 from services.session_manager import session_manager
 
 router = APIRouter(prefix="/api/host", tags=["host"])
@@ -9,12 +11,18 @@ router = APIRouter(prefix="/api/host", tags=["host"])
 @router.get("/info")
 async def get_host_info():
     return {
-        "host_name": HostService.get_host_name(),
+        "host_name": NetworkService.get_host_name(),
         "status": "online",
         "platform": "windows",
     }
 
 
+@router.get("/startup")
+async def get_startup_report():
+    """Seconds from process start to each startup milestone"""
+    return startup.report()
+
+
 @router.get("/clipboard")
 async def get_clipboard():
     return ClipboardService.get_content()
@@ -0,0 +1,57 @@
+import os
+from urllib.parse import quote
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse
+from services.file_service import FileService
+from services.session_manager import session_manager
+from services.retention_service import RetentionService
+from services.secure_transport import SecureTransport
+
+# Served on the plain-HTTP AEAD port (and on the main TLS port as well)
+router = APIRouter(prefix="/api/secure", tags=["secure"])
+
+
+def _session_id(request: Request) -> str:
+    session_id = request.headers.get("x-session-id")
+    session = session_manager.get_session(session_id) if session_id else None
+    if not session or session.get("status") != "AUTHENTICATED":
+        raise HTTPException(status_code=401, detail="Unknown session")
+    return session_id
+
+
+@router.post("/upload")
+async def upload(request: Request):
+    """
+    Body is an AEAD frame stream under the key derived from x-aead-salt;
+    x-filesize is the plaintext size
+    """
+    session_id = _session_id(request)
+    context = f"upload|{session_id}|{request.headers.get('x-filename', '')}"
+    body = SecureTransport.decrypt_stream(
+        session_id, request.headers.get("x-aead-salt"), context, request.stream()
+    )
+    filename = await FileService.save_stream(request, session_id, body=body)
+    return {"status": "success", "filename": filename}
+
+
+@router.get("/download/{filename:path}")
+async def download(filename: str, request: Request):
+    session_id = _session_id(request)
+    path = FileService.resolve_path(filename, session_id)
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    RetentionService.touch(path)
+    encryptor = SecureTransport.encryptor(
+        session_id, f"download|{session_id}|{filename}"
+    )
+    return StreamingResponse(
+        SecureTransport.encrypt_file(path, encryptor),
+        media_type="application/octet-stream",
+        headers={
+            "x-aead-salt": SecureTransport.b64encode(encryptor.salt),
+            "x-plain-size": str(os.path.getsize(path)),
+            # Percent-encoded UTF-8; header values must be latin-1
+            "x-filename": quote(os.path.basename(path)),
+        },
+    )
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, Request, Response, Query
+from fastapi.responses import JSONResponse
 from services.session_manager import session_manager
-from qr_gen import generate_qr_code_buffer
-from net_utils import get_primary_ip
+from qr_gen import render_qr_code, clear_qr_cache
+from services.network_service import NetworkService
+from services.secure_transport import SecureTransport
 
 router = APIRouter(prefix="/api/session", tags=["session"])
 
+# Codes embed the primary IP, so cached renders go stale when it changes
+NetworkService.add_listener(clear_qr_cache)
+
 
 @router.get("/status")
 async def get_status():
@@ -22,7 +26,13 @@ async def verify(request: Request):
     data = await request.json()
     session = session_manager.verify_pin(data.get("pin"))
     if session:
-        return {"status": "AUTHENTICATED", "session": session}
+        response = {"status": "AUTHENTICATED", "session": session}
+        if data.get("public_key"):
+            # Opt-in AEAD transport: key agreement piggybacks on the PIN check
+            response["transport"] = SecureTransport.negotiate(
+                session, data.get("pin"), data["public_key"], data.get("cipher")
+            )
+        return response
     return JSONResponse(
         status_code=400, content={"status": "error", "message": "Invalid PIN"}
     )
@@ -46,9 +56,16 @@ async def reset():
 
 
 @router.get("/qr")
-async def get_qr():
-    ip = get_primary_ip()
+async def get_qr(
+    request: Request,
+    format: str = Query("png", pattern="^(png|svg)$"),
+    size: int = Query(10, ge=1, le=40),
+):
+    ip = NetworkService.get_primary_ip()
     # URL now just points to the app; mobile will hit /init on load
     url = f"https://{ip}:8000?id=session&start=1"
-    buf = generate_qr_code_buffer(url)
-    return StreamingResponse(buf, media_type="image/png")
+    payload, media_type, etag = render_qr_code(url, format, size)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(payload, media_type=media_type, headers=headers)
@@ -0,0 +1,85 @@
+"""Helpers shared by the benchmark scripts: run a throwaway local server."""
+
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVER_SNIPPET = """
+import sys
+sys.path.insert(0, {backend!r})
+from ssl_gen import generate_self_signed_cert
+from server_profiles import serve
+generate_self_signed_cert()
+serve({profile!r}, host="127.0.0.1", port={port})
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def require_httpx():
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        sys.exit("Benchmarks need httpx: pip install 'httpx[http2]'")
+
+
+@contextmanager
+def local_server(profile="default", port=None, env=None, timeout=30):
+    """
+    Starts the backend with the given server profile inside a temp working
+    directory (uploads, certs and analytics stay out of the real tree).
+    Yields the base URL.
+    """
+    import httpx
+
+    port = port or free_port()
+    workdir = tempfile.mkdtemp(prefix="turbo_bench_")
+    server_env = dict(os.environ, VITE_DEV="true", HOME=workdir, USERPROFILE=workdir)
+    server_env.update(env or {})
+    code = SERVER_SNIPPET.format(backend=BACKEND_DIR, profile=profile, port=port)
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code],
+        cwd=workdir,
+        env=server_env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"https://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                httpx.get(f"{base_url}/api/session/status", verify=False, timeout=1)
+                break
+            except httpx.HTTPError:
+                if proc.poll() is not None or time.time() > deadline:
+                    raise RuntimeError(f"Server profile '{profile}' failed to start")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def pair(client, device_name="bench") -> str:
+    """Runs the PIN handshake and returns an authenticated session id"""
+    session = (
+        await client.get("/api/session/init", params={"device_name": device_name})
+    ).json()
+    await client.post("/api/session/verify", json={"pin": session["pin"]})
+    return session["session_id"]
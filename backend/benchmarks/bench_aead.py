@@ -0,0 +1,194 @@
+"""
+Bulk transfer throughput: TLS vs the session-keyed AEAD transport.
+
+    python benchmarks/bench_aead.py --size 256 --files 4 --cipher aesgcm
+
+Uploads (and then downloads) the same files over the normal HTTPS
+endpoints and over plain HTTP with AEAD frames, client-side crypto
+included. Sizes are in MB.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+from _server import BACKEND_DIR, free_port, local_server, require_httpx
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+async def handshake(client, cipher):
+    from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+    from services.secure_transport import SecureTransport
+
+    session = (
+        await client.get("/api/session/init", params={"device_name": "bench"})
+    ).json()
+    private = X25519PrivateKey.generate()
+    verified = (
+        await client.post(
+            "/api/session/verify",
+            json={
+                "pin": session["pin"],
+                "public_key": SecureTransport.b64encode(
+                    SecureTransport.public_bytes(private)
+                ),
+                "cipher": cipher,
+            },
+        )
+    ).json()
+    transport = verified["transport"]
+    key = SecureTransport.derive_key(
+        private,
+        SecureTransport.b64decode(transport["server_public_key"]),
+        session["session_id"],
+        session["pin"],
+        transport["cipher"],
+    )
+    return session["session_id"], key, transport["cipher"]
+
+
+async def run(base_url, aead_url, files, size, concurrency, cipher):
+    import httpx
+    from services.secure_transport import (
+        FrameDecryptor,
+        FrameEncryptor,
+        SecureTransport,
+    )
+
+    frame = SecureTransport.FRAME_SIZE
+    payload = os.urandom(size)
+    results = {}
+
+    async with httpx.AsyncClient(
+        base_url=base_url, verify=False, timeout=600
+    ) as tls, httpx.AsyncClient(base_url=aead_url, timeout=600) as plain:
+        session_id, key, cipher = await handshake(tls, cipher)
+
+        async def tls_upload(i):
+            r = await tls.post(
+                "/api/files/upload",
+                content=payload,
+                headers={
+                    "x-filename": f"tls_{i}.bin",
+                    "x-filesize": str(size),
+                    "x-device-name": "bench",
+                },
+            )
+            r.raise_for_status()
+
+        async def aead_upload(i):
+            name = f"aead_{i}.bin"
+            enc = FrameEncryptor(key, cipher, f"upload|{session_id}|{name}".encode())
+
+            async def body():
+                for start in range(0, size, frame):
+                    chunk = payload[start : start + frame]
+                    yield enc.seal(chunk, start + frame >= size)
+
+            r = await plain.post(
+                "/api/secure/upload",
+                content=body(),
+                headers={
+                    "x-session-id": session_id,
+                    "x-filename": name,
+                    "x-filesize": str(size),
+                    "x-device-name": "bench",
+                    "x-aead-salt": SecureTransport.b64encode(enc.salt),
+                },
+            )
+            r.raise_for_status()
+
+        async def tls_download(i):
+            async with tls.stream("GET", f"/api/files/download/bench/tls_{i}.bin") as r:
+                r.raise_for_status()
+                received = 0
+                async for chunk in r.aiter_raw():
+                    received += len(chunk)
+            assert received == size
+
+        async def aead_download(i):
+            name = f"bench/aead_{i}.bin"
+            headers = {"x-session-id": session_id}
+            async with plain.stream(
+                "GET", f"/api/secure/download/{name}", headers=headers
+            ) as r:
+                r.raise_for_status()
+                dec = FrameDecryptor(
+                    key,
+                    cipher,
+                    f"download|{session_id}|{name}".encode(),
+                    SecureTransport.b64decode(r.headers["x-aead-salt"]),
+                    frame,
+                )
+                received = 0
+                async for chunk in r.aiter_raw():
+                    received += sum(len(p) for p in dec.feed(chunk))
+                dec.close()
+            assert received == size
+
+        for label, op in [
+            ("TLS upload", tls_upload),
+            ("AEAD upload", aead_upload),
+            ("TLS download", tls_download),
+            ("AEAD download", aead_download),
+        ]:
+            sem = asyncio.Semaphore(concurrency)
+
+            async def limited(i):
+                async with sem:
+                    await op(i)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(limited(i) for i in range(files)))
+            results[label] = time.perf_counter() - start
+    return results
+
+
+def wait_for(url, timeout=30):
+    """The AEAD listener starts with the deferred startup work"""
+    import httpx
+
+    deadline = time.time() + timeout
+    while True:
+        try:
+            httpx.get(f"{url}/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            if time.time() > deadline:
+                raise RuntimeError("AEAD listener did not start")
+            time.sleep(0.2)
+
+
+def main():
+    require_httpx()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--size", type=int, default=128, help="MB per file")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--cipher", choices=["aesgcm", "chacha20"], default="aesgcm")
+    parser.add_argument("--profile", default="default")
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    aead_port = free_port()
+    env = {"TURBO_AEAD_PORT": str(aead_port), "TURBO_AEAD_CIPHER": args.cipher}
+    with local_server(args.profile, env=env) as base_url:
+        aead_url = f"http://127.0.0.1:{aead_port}"
+        wait_for(aead_url)
+        results = asyncio.run(
+            run(base_url, aead_url, args.files, size, args.concurrency, args.cipher)
+        )
+
+    total = args.files * size / 1e6
+    for label, elapsed in results.items():
+        print(f"{label:>14}: {total / elapsed:8.1f} MB/s ({elapsed:.2f}s)")
+    for kind in ("upload", "download"):
+        tls, aead = results[f"TLS {kind}"], results[f"AEAD {kind}"]
+        print(f"AEAD vs TLS {kind}: {tls / aead:.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
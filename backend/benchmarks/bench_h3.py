@@ -0,0 +1,316 @@
+"""
+Upload/download throughput on a lossy link: HTTP/1.1 over TLS vs HTTP/3.
+
+    python benchmarks/bench_h3.py --size 32 --loss 0.02 --delay 10
+    sudo python benchmarks/bench_h3.py --size 32 --netem "loss 2% delay 10ms"
+
+Two ways to emulate the link (sizes in MB, delay in ms each way):
+
+  --netem   applies a tc netem qdisc to the loopback device for the run
+            (Linux, root, sch_netem). Both transports see real packet loss;
+            this is the faithful comparison.
+  default   userspace proxies: QUIC datagrams go through a UDP proxy that
+            drops and delays them; TCP goes through a proxy that delays
+            data and models each lost segment as a head-of-line stall of
+            one round trip (fast retransmit), which flatters TCP since its
+            congestion window is never cut.
+
+HTTP/3 requests use aioquic directly; TLS requests use httpx.
+"""
+
+import os
+import sys
+import ssl
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+
+from _server import free_port, local_server, require_httpx
+
+MSS = 1448
+
+
+class LossyUdpProxy(asyncio.DatagramProtocol):
+    """Client <-> proxy <-> server, dropping/delaying datagrams both ways"""
+
+    def __init__(self, target, loss, delay):
+        self.target, self.loss, self.delay = target, loss, delay
+        self.client = None
+        self.upstream = None
+
+    @classmethod
+    async def start(cls, target, loss, delay):
+        loop = asyncio.get_running_loop()
+        proxy = cls(target, loss, delay)
+        proxy.transport, _ = await loop.create_datagram_endpoint(
+            lambda: proxy, local_addr=("127.0.0.1", 0)
+        )
+
+        class Upstream(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                proxy.forward(proxy.transport.sendto, data, proxy.client)
+
+        proxy.upstream, _ = await loop.create_datagram_endpoint(
+            Upstream, remote_addr=target
+        )
+        return proxy
+
+    @property
+    def port(self):
+        return self.transport.get_extra_info("sockname")[1]
+
+    def forward(self, sendto, data, *addr):
+        if random.random() < self.loss:
+            return
+        asyncio.get_running_loop().call_later(self.delay, sendto, data, *addr)
+
+    def datagram_received(self, data, addr):
+        self.client = addr
+        self.forward(self.upstream.sendto, data)
+
+    def close(self):
+        self.transport.close()
+        self.upstream.close()
+
+
+async def start_tcp_proxy(target, loss, delay):
+    """Delays TCP data; a lost segment stalls everything behind it one RTT"""
+
+    async def pump(reader, writer):
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                if data is None:
+                    break
+                await asyncio.sleep(max(0, due - time.monotonic()))
+                writer.write(data)
+                await writer.drain()
+            writer.close()
+
+        task = asyncio.create_task(deliver())
+        ready = 0.0
+        while True:
+            data = await reader.read(64 * 1024)
+            if not data:
+                break
+            due = max(time.monotonic() + delay, ready)
+            segments = -(-len(data) // MSS)
+            if random.random() < 1 - (1 - loss) ** segments:
+                due += 2 * delay  # Retransmission after a duplicate-ACK round trip
+            ready = due
+            queue.put_nowait((due, data))
+        queue.put_nowait((0, None))
+        await task
+
+    async def handle(reader, writer):
+        up_reader, up_writer = await asyncio.open_connection(*target)
+        await asyncio.gather(
+            pump(reader, up_writer), pump(up_reader, writer), return_exceptions=True
+        )
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def make_h3_client():
+    from aioquic.asyncio import QuicConnectionProtocol
+    from aioquic.h3.connection import H3Connection
+    from aioquic.h3.events import DataReceived, HeadersReceived
+
+    class H3Client(QuicConnectionProtocol):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.h3 = H3Connection(self._quic)
+            self.streams = {}
+
+        def quic_event_received(self, event):
+            for ev in self.h3.handle_event(event):
+                state = self.streams.get(getattr(ev, "stream_id", None))
+                if state is None:
+                    continue
+                if isinstance(ev, HeadersReceived):
+                    state["status"] = int(dict(ev.headers)[b":status"])
+                elif isinstance(ev, DataReceived):
+                    state["bytes"] += len(ev.data)
+                if getattr(ev, "stream_ended", False) and not state["done"].done():
+                    state["done"].set_result(None)
+
+        async def request(self, method, path, headers=(), body=b""):
+            stream_id = self._quic.get_next_available_stream_id()
+            state = {"status": None, "bytes": 0}
+            state["done"] = asyncio.get_running_loop().create_future()
+            self.streams[stream_id] = state
+            self.h3.send_headers(
+                stream_id,
+                [
+                    (b":method", method.encode()),
+                    (b":scheme", b"https"),
+                    (b":authority", b"127.0.0.1"),
+                    (b":path", path.encode()),
+                    *[(k.encode(), v.encode()) for k, v in headers],
+                ],
+                end_stream=not body,
+            )
+            if body:
+                self.h3.send_data(stream_id, body, end_stream=True)
+            self.transmit()
+            await state["done"]
+            del self.streams[stream_id]
+            if state["status"] >= 400:
+                raise RuntimeError(f"HTTP/3 {method} {path}: {state['status']}")
+            return state
+
+    return H3Client
+
+
+def upload_headers(name, size):
+    return {
+        "x-filename": name,
+        "x-filesize": str(size),
+        "x-device-name": "bench",
+    }
+
+
+async def bench_h3(port, payload, files):
+    from aioquic.asyncio import connect
+    from aioquic.h3.connection import H3_ALPN
+    from aioquic.quic.configuration import QuicConfiguration
+
+    config = QuicConfiguration(
+        is_client=True, alpn_protocols=H3_ALPN, verify_mode=ssl.CERT_NONE
+    )
+    results = {}
+    async with connect(
+        "127.0.0.1", port, configuration=config, create_protocol=make_h3_client()
+    ) as client:
+        start = time.perf_counter()
+        for i in range(files):
+            headers = upload_headers(f"h3_{i}.bin", len(payload)).items()
+            await client.request("POST", "/api/files/upload", headers, payload)
+        results["upload"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(files):
+            r = await client.request("GET", f"/api/files/download/bench/h3_{i}.bin")
+            assert r["bytes"] == len(payload)
+        results["download"] = time.perf_counter() - start
+    return results
+
+
+async def bench_tls(base_url, payload, files):
+    import httpx
+
+    results = {}
+    async with httpx.AsyncClient(base_url=base_url, verify=False, timeout=600) as c:
+        start = time.perf_counter()
+        for i in range(files):
+            r = await c.post(
+                "/api/files/upload",
+                content=payload,
+                headers=upload_headers(f"tls_{i}.bin", len(payload)),
+            )
+            r.raise_for_status()
+        results["upload"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(files):
+            r = await c.get(f"/api/files/download/bench/tls_{i}.bin")
+            r.raise_for_status()
+            assert len(r.content) == len(payload)
+        results["download"] = time.perf_counter() - start
+    return results
+
+
+async def wait_for_h3(port, timeout=30):
+    """The QUIC listener starts with the deferred startup work"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return await asyncio.wait_for(bench_h3(port, b"", 0), 2)
+        except Exception:
+            if time.time() > deadline:
+                raise RuntimeError("HTTP/3 listener did not start")
+            await asyncio.sleep(0.5)
+
+
+async def run(base_url, h3_port, args):
+    payload = os.urandom(args.size * 1024 * 1024)
+    await wait_for_h3(h3_port)
+    if args.netem:
+        return {
+            "TLS": await bench_tls(base_url, payload, args.files),
+            "HTTP/3": await bench_h3(h3_port, payload, args.files),
+        }
+
+    loss, delay = args.loss, args.delay / 1000
+    port = int(base_url.rsplit(":", 1)[1])
+    tcp_proxy, tcp_port = await start_tcp_proxy(("127.0.0.1", port), loss, delay)
+    udp_proxy = await LossyUdpProxy.start(("127.0.0.1", h3_port), loss, delay)
+    try:
+        return {
+            "TLS": await bench_tls(
+                f"https://127.0.0.1:{tcp_port}", payload, args.files
+            ),
+            "HTTP/3": await bench_h3(udp_proxy.port, payload, args.files),
+        }
+    finally:
+        tcp_proxy.close()
+        udp_proxy.close()
+
+
+def netem(spec):
+    if spec:
+        subprocess.run(
+            ["tc", "qdisc", "replace", "dev", "lo", "root", "netem", *spec.split()],
+            check=True,
+        )
+    else:
+        subprocess.run(["tc", "qdisc", "del", "dev", "lo", "root"], check=False)
+
+
+def main():
+    require_httpx()
+    try:
+        import aioquic  # noqa: F401
+    except ImportError:
+        sys.exit(
+            "This benchmark needs aioquic and hypercorn: pip install aioquic hypercorn"
+        )
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--size", type=int, default=16, help="MB per file")
+    parser.add_argument("--loss", type=float, default=0.02, help="proxy mode, 0-1")
+    parser.add_argument("--delay", type=float, default=10, help="proxy mode, ms")
+    parser.add_argument("--netem", help='e.g. "loss 2%% delay 10ms" (root)')
+    args = parser.parse_args()
+
+    h3_port = free_port()
+    env = {"TURBO_H3_PORT": str(h3_port), "TURBO_AEAD_PORT": "0"}
+    with local_server("default", env=env) as base_url:
+        if args.netem:
+            netem(args.netem)
+        try:
+            results = asyncio.run(run(base_url, h3_port, args))
+        finally:
+            if args.netem:
+                netem(None)
+
+    link = args.netem or f"proxy, {args.loss:.1%} loss, {args.delay:g} ms each way"
+    total = args.files * args.size * 1024 * 1024 / 1e6
+    print(f"Link: {link}")
+    for transport, timings in results.items():
+        for kind, elapsed in timings.items():
+            print(
+                f"{transport:>7} {kind:>8}: {total / elapsed:8.1f} MB/s ({elapsed:.2f}s)"
+            )
+    for kind in ("upload", "download"):
+        ratio = results["TLS"][kind] / results["HTTP/3"][kind]
+        print(f"HTTP/3 vs TLS {kind}: {ratio:.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
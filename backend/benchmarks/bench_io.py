@@ -0,0 +1,111 @@
+"""
+File I/O backends under concurrent transfers: thread pool vs io_uring.
+
+    python benchmarks/bench_io.py --size 16 --concurrency 1 16 64
+    python benchmarks/bench_io.py --backends threads io_uring --fsync close
+
+Each transfer uploads a file through UploadWriter the way save_stream does
+(64 KB request chunks, coalesced) and then downloads it the way
+FileResponse does (64 KB preads). Runs in-process, so only the I/O path is
+measured: wall-clock throughput plus CPU seconds per GB, which is where
+thread hand-offs and GIL contention show up. Sizes are in MB per transfer.
+Files live in a temp folder (page cache included, like a warm server).
+"""
+
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+from _server import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+REQUEST_CHUNK = 64 * 1024  # What request.stream() typically hands over
+READ_CHUNK = 64 * 1024  # FileResponse.chunk_size
+
+
+async def transfer(workdir, i, payload, fsync):
+    from services.io_backend import IOBackend
+    from services.write_pipeline import UploadWriter
+
+    path = os.path.join(workdir, f"t_{i}.bin")
+    async with UploadWriter(path, len(payload), fsync) as writer:
+        view = memoryview(payload)
+        for offset in range(0, len(view), REQUEST_CHUNK):
+            await writer.write(view[offset : offset + REQUEST_CHUNK])
+
+    io = IOBackend.get()
+    fd = await io.open(path, os.O_RDONLY)
+    try:
+        offset = 0
+        while chunk := await io.pread(fd, READ_CHUNK, offset):
+            offset += len(chunk)
+    finally:
+        await io.close(fd)
+    assert offset == len(payload)
+    os.remove(path)
+
+
+async def run(workdir, payload, concurrency, rounds, fsync):
+    await asyncio.gather(
+        *(
+            transfer(workdir, c * rounds + r, payload, fsync)
+            for c in range(concurrency)
+            for r in range(rounds)
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=16, help="MB per transfer")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--total", type=int, default=1024, help="MB per run")
+    parser.add_argument(
+        "--backends", nargs="+", default=["threads", "io_uring"], help="in order"
+    )
+    parser.add_argument(
+        "--fsync", choices=["none", "close", "periodic"], default="none"
+    )
+    args = parser.parse_args()
+
+    from services.io_backend import IOBackend
+
+    payload = os.urandom(args.size * 1024 * 1024)
+    workdir = tempfile.mkdtemp(prefix="turbo_bench_")
+    results = {}
+    try:
+        for name in args.backends:
+            io = IOBackend.use(name)
+            if io.name != name:
+                print(f"{name}: not available here, skipped")
+                continue
+            for concurrency in args.concurrency:
+                rounds = max(1, args.total // (args.size * concurrency))
+                moved = 2 * len(payload) * rounds * concurrency  # Up and down
+                wall, cpu = time.perf_counter(), time.process_time()
+                asyncio.run(run(workdir, payload, concurrency, rounds, args.fsync))
+                wall = time.perf_counter() - wall
+                cpu = time.process_time() - cpu
+                results[name, concurrency] = (moved / wall / 1e6, cpu / moved * 1e9)
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f"{args.size} MB per transfer, fsync={args.fsync}, {os.cpu_count()} CPUs")
+    print(f"{'backend':>9} {'conc':>5} {'MB/s':>9} {'CPU s/GB':>9}")
+    for (name, concurrency), (rate, cpu) in results.items():
+        print(f"{name:>9} {concurrency:>5} {rate:9.1f} {cpu:9.2f}")
+    for concurrency in args.concurrency:
+        if ("threads", concurrency) in results and ("io_uring", concurrency) in results:
+            speedup = (
+                results["io_uring", concurrency][0] / results["threads", concurrency][0]
+            )
+            print(f"io_uring vs threads at {concurrency}: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
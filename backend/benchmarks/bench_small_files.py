@@ -0,0 +1,98 @@
+"""
+Small-file upload throughput per server profile.
+
+    python benchmarks/bench_small_files.py --files 2000 --size 16384 --concurrency 32
+
+Each profile gets a fresh server; files are sent as host uploads so they
+land in the server's temp working directory.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+from _server import local_server, pair, require_httpx
+
+PROFILES = ["default", "tuned", "h2"]
+
+
+async def run(base_url, profile, files, size, concurrency, keepalive):
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=concurrency,
+        max_keepalive_connections=concurrency if keepalive else 0,
+    )
+    http2 = profile == "h2"
+    payload = os.urandom(size)
+
+    async with httpx.AsyncClient(
+        base_url=base_url, verify=False, http2=http2, limits=limits, timeout=60
+    ) as client:
+        session_id = await pair(client)
+        queue = asyncio.Queue()
+        for i in range(files):
+            queue.put_nowait(i)
+
+        async def worker():
+            while not queue.empty():
+                i = queue.get_nowait()
+                r = await client.post(
+                    "/api/files/upload",
+                    content=payload,
+                    headers={
+                        "x-filename": f"file_{i}.bin",
+                        "x-filesize": str(size),
+                        "x-session-id": session_id,
+                        "x-is-host": "true",
+                    },
+                )
+                r.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - start
+
+
+def main():
+    require_httpx()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=16 * 1024)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--profiles", nargs="+", default=PROFILES, choices=PROFILES)
+    parser.add_argument(
+        "--no-keepalive", action="store_true", help="New TLS connection per request"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for profile in args.profiles:
+        with local_server(profile) as base_url:
+            elapsed = asyncio.run(
+                run(
+                    base_url,
+                    profile,
+                    args.files,
+                    args.size,
+                    args.concurrency,
+                    not args.no_keepalive,
+                )
+            )
+        results[profile] = elapsed
+        print(
+            f"{profile:>8}: {args.files / elapsed:8.1f} files/s "
+            f"{args.files * args.size / elapsed / 1e6:8.2f} MB/s ({elapsed:.2f}s)"
+        )
+
+    if "default" in results:
+        base = results["default"]
+        for profile, elapsed in results.items():
+            if profile != "default":
+                print(f"{profile} vs default: {base / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
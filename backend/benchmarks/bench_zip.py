@@ -0,0 +1,107 @@
+"""
+Folder archive build time: shutil.make_archive vs the parallel ArchiveService.
+
+    python benchmarks/bench_zip.py --size 512 --files 64 --level 6
+
+Generates a folder of log-like text (compressible, like the logs and source
+trees people zip up) plus a few already-compressed files, then archives it
+both ways. Sizes are in MB.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from _server import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_corpus(root, files, size, media):
+    rng = random.Random(0)
+    words = [
+        "".join(
+            rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9))
+        )
+        for _ in range(2000)
+    ]
+    per_file = size // files
+    for i in range(files):
+        folder = os.path.join(root, f"dir_{i % 8}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"app_{i}.log"), "w") as f:
+            written = 0
+            while written < per_file:
+                line = f"2024-05-0{i % 9 + 1} INFO " + " ".join(
+                    rng.choices(words, k=12)
+                )
+                written += f.write(line + "\n")
+    for i in range(media):
+        with open(os.path.join(root, f"clip_{i}.mp4"), "wb") as f:
+            f.write(os.urandom(per_file))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--size", type=int, default=256, help="total MB of text")
+    parser.add_argument("--media", type=int, default=2, help="incompressible files")
+    parser.add_argument("--level", type=int, default=6, help="parallel side only")
+    parser.add_argument("--threads", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    from services.archive_service import ArchiveService
+
+    ArchiveService.THREADS = args.threads
+    workdir = tempfile.mkdtemp(prefix="turbo_bench_")
+    try:
+        corpus = os.path.join(workdir, "corpus")
+        make_corpus(corpus, args.files, args.size * 1024 * 1024, args.media)
+        total = sum(
+            os.path.getsize(os.path.join(d, f))
+            for d, _, files in os.walk(corpus)
+            for f in files
+        )
+
+        import zlib
+        import zipfile
+
+        # make_archive has no level argument: always zlib's default (6)
+        base = os.path.join(workdir, "make_archive")
+        serial = timed(lambda: shutil.make_archive(base, "zip", corpus))
+
+        dest = os.path.join(workdir, "parallel.zip")
+        parallel = timed(
+            lambda: ArchiveService.write_directory(dest, corpus, args.level)
+        )
+        with zipfile.ZipFile(dest) as z:
+            assert z.testzip() is None
+
+        print(
+            f"Input: {total / 1e6:.1f} MB, level {args.level}, zlib {zlib.ZLIB_VERSION}"
+        )
+        for label, elapsed, path in [
+            ("make_archive", serial, base + ".zip"),
+            (f"parallel x{args.threads}", parallel, dest),
+        ]:
+            print(
+                f"{label:>14}: {total / elapsed / 1e6:8.1f} MB/s ({elapsed:.2f}s), "
+                f"{os.path.getsize(path) / 1e6:.1f} MB"
+            )
+        print(f"Speedup: {serial / parallel:.2f}x")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Control-plane load: many devices pairing at once, then polling like the app.
+
+    python benchmarks/loadgen.py --devices 200 --duration 30
+    python benchmarks/loadgen.py --server https://127.0.0.1:8000 --devices 50
+
+Every simulated device pairs at the same moment (init + verify, like a room
+scanning the QR code), then until --duration runs out polls session status
+and the file list every --poll seconds, the clipboard every --clipboard
+seconds and uploads a --upload-size byte file every --upload-every seconds
+(0 turns any of them off). Timers are jittered so devices drift apart.
+Sessions are disconnected at the end; uploads stay in the devices' received
+folders, which with --server are the real ones.
+
+Reports latency percentiles per endpoint and the server's event-loop lag
+for the pairing and polling phases (from /api/admin/loop-lag, so the server
+has to be on this machine). The generator shares the CPU with a local
+server, so compare runs on the same box, not absolute numbers.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+
+from _server import local_server, require_httpx
+
+ENDPOINTS = ["init", "verify", "status", "files", "clipboard", "upload"]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, label, request):
+        """Awaits request(), recording its latency; None if it failed"""
+        import httpx
+
+        start = time.perf_counter()
+        try:
+            r = await request()
+            r.raise_for_status()
+        except httpx.HTTPError:
+            self.errors[label] += 1
+            return None
+        self.latencies[label].append(time.perf_counter() - start)
+        return r
+
+    def report(self) -> dict:
+        report = {}
+        for label in ENDPOINTS:
+            values = sorted(self.latencies.get(label, []))
+            if not values and not self.errors.get(label):
+                continue
+            row = {"count": len(values), "errors": self.errors.get(label, 0)}
+            for name, p in [("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1)]:
+                row[f"{name}_ms"] = (
+                    round(values[min(int(len(values) * p), len(values) - 1)] * 1000, 2)
+                    if values
+                    else None
+                )
+            report[label] = row
+        return report
+
+
+async def pair_device(client, stats, i):
+    r = await stats.call(
+        "init",
+        lambda: client.get("/api/session/init", params={"device_name": f"load-{i}"}),
+    )
+    if r is None:
+        return None
+    session = r.json()
+    r = await stats.call(
+        "verify",
+        lambda: client.post("/api/session/verify", json={"pin": session["pin"]}),
+    )
+    return session if r is not None else None
+
+
+async def poll_device(client, stats, session, args, deadline):
+    headers = {"x-session-id": session["session_id"]}
+    payload = os.urandom(args.upload_size)
+    uploads = 0
+
+    def upload():
+        nonlocal uploads
+        uploads += 1
+        return client.post(
+            "/api/files/upload",
+            content=payload,
+            headers={
+                **headers,
+                "x-filename": f"load_{uploads}.bin",
+                "x-filesize": str(len(payload)),
+                "x-device-name": session["device_name"],
+            },
+        )
+
+    async def every(period, label, request):
+        if not period:
+            return
+        await asyncio.sleep(random.uniform(0, period))
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            await stats.call(label, request)
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(period * random.uniform(0.8, 1.2) - elapsed, 0))
+
+    await asyncio.gather(
+        every(args.poll, "status", lambda: client.get("/api/session/status")),
+        every(args.poll, "files", lambda: client.get("/api/files/", headers=headers)),
+        every(args.clipboard, "clipboard", lambda: client.get("/api/host/clipboard")),
+        every(args.upload_every, "upload", upload),
+    )
+
+
+async def loop_lag(admin, reset=True):
+    import httpx
+
+    try:
+        r = await admin.get("/api/admin/loop-lag", params={"reset": reset})
+        r.raise_for_status()
+        return r.json()
+    except httpx.HTTPError:
+        return None  # Not a local server (or an older one)
+
+
+async def run(base_url, args):
+    import httpx
+
+    stats = Stats()
+    # One connection pool per device, as real phones would have
+    clients = [
+        httpx.AsyncClient(
+            base_url=base_url,
+            verify=False,
+            timeout=args.timeout,
+            limits=httpx.Limits(max_connections=4),
+        )
+        for _ in range(args.devices)
+    ]
+    admin = httpx.AsyncClient(base_url=base_url, verify=False, timeout=args.timeout)
+    try:
+        await loop_lag(admin)
+        start = time.perf_counter()
+        sessions = await asyncio.gather(
+            *(pair_device(c, stats, i) for i, c in enumerate(clients))
+        )
+        pairing = time.perf_counter() - start
+        lag = {"pairing": await loop_lag(admin)}
+
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(
+            *(
+                poll_device(c, stats, s, args, deadline)
+                for c, s in zip(clients, sessions)
+                if s is not None
+            )
+        )
+        lag["polling"] = await loop_lag(admin)
+
+        for s in sessions:
+            if s is not None:
+                await admin.post(f"/api/session/disconnect/{s['session_id']}")
+    finally:
+        for c in clients:
+            await c.aclose()
+        await admin.aclose()
+
+    return {
+        "devices": args.devices,
+        "paired": sum(s is not None for s in sessions),
+        "pairing_s": round(pairing, 3),
+        "endpoints": stats.report(),
+        "loop_lag": lag,
+    }
+
+
+def print_report(result):
+    print(
+        f"Paired {result['paired']}/{result['devices']} devices "
+        f"in {result['pairing_s']:.2f}s"
+    )
+    print(
+        f"{'endpoint':>10} {'count':>7} {'errors':>6} "
+        f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    )
+    for label, row in result["endpoints"].items():
+        values = [
+            f"{row[k]:8.1f}" if row[k] is not None else f"{'-':>8}"
+            for k in ("p50_ms", "p90_ms", "p99_ms", "max_ms")
+        ]
+        print(f"{label:>10} {row['count']:>7} {row['errors']:>6} {' '.join(values)}")
+    for phase, lag in result["loop_lag"].items():
+        if lag is None or not lag["samples"]:
+            print(f"Loop lag ({phase}): not available")
+            continue
+        print(
+            f"Loop lag ({phase}): p50 {lag['p50_ms']:.1f} ms, "
+            f"p99 {lag['p99_ms']:.1f} ms, max {lag['max_ms']:.1f} ms"
+        )
+
+
+def main():
+    require_httpx()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--server", help="existing server URL (default: start one)")
+    parser.add_argument("--profile", default="default")
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--poll", type=float, default=2, help="seconds")
+    parser.add_argument("--clipboard", type=float, default=3, help="seconds")
+    parser.add_argument("--upload-every", type=float, default=10, help="seconds")
+    parser.add_argument("--upload-size", type=int, default=16 * 1024, help="bytes")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--json", action="store_true", help="print JSON only")
+    args = parser.parse_args()
+
+    if args.server:
+        result = asyncio.run(run(args.server.rstrip("/"), args))
+    else:
+        with local_server(args.profile) as base_url:
+            result = asyncio.run(run(base_url, args))
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,14 @@ import sys
 
 # Constants
 CHUNK_SIZE = 1024 * 1024  # 1MB buffer
+WRITER_THREADS = 4  # Threads of the default file I/O backend
+IO_BACKEND = os.environ.get("TURBO_IO_BACKEND", "threads")  # threads | io_uring
+FSYNC_POLICY = os.environ.get("TURBO_FSYNC", "none")  # none | close | periodic
+FSYNC_INTERVAL = 64 * CHUNK_SIZE  # Bytes between fsyncs in "periodic" mode
+AEAD_PORT = int(os.environ.get("TURBO_AEAD_PORT", "0"))  # e.g. 8001; 0 = disabled
+AEAD_CIPHER = os.environ.get("TURBO_AEAD_CIPHER", "aesgcm")  # aesgcm | chacha20
+H3_PORT = int(os.environ.get("TURBO_H3_PORT", "0"))  # UDP; 0 = disabled
+ZIP_LEVEL = int(os.environ.get("TURBO_ZIP_LEVEL", "6"))  # 0 (store) - 9
 UPLOAD_DIR = "uploads"
 STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static_app")
 
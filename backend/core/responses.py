@@ -0,0 +1,60 @@
+import os
+from contextlib import asynccontextmanager
+from fastapi.responses import FileResponse, JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class _BackendFile:
+    """The slice of anyio's AsyncFile that FileResponse uses, over pread"""
+
+    def __init__(self, io, fd: int):
+        self._io = io
+        self._fd = fd
+        self._pos = 0
+
+    async def seek(self, offset: int):
+        self._pos = offset
+
+    async def read(self, size: int) -> bytes:
+        data = await self._io.pread(self._fd, size, self._pos)
+        self._pos += len(data)
+        return data
+
+    async def aclose(self):
+        await self._io.close(self._fd)
+
+
+class BackendFileResponse(FileResponse):
+    """
+    FileResponse (ranges, conditional headers and all) reading the body
+    through the file I/O backend. Hooks Starlette's _open_file; versions
+    without it keep reading through anyio's threads.
+    """
+
+    @asynccontextmanager
+    async def _open_file(self):
+        import anyio
+        from services.io_backend import IOBackend
+
+        io = IOBackend.get()
+        flags = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+        file = _BackendFile(io, await io.open(str(self.path), flags))
+        try:
+            yield file
+        finally:
+            # Closing must finish even when the transfer is cancelled
+            with anyio.CancelScope(shield=True):
+                await file.aclose()
@@ -0,0 +1,19 @@
+import time
+import logging
+
+# Import this module first so STARTED_AT is as close to process start as possible
+STARTED_AT = time.perf_counter()
+
+_marks = {}
+
+
+def mark(name: str) -> float:
+    """Records seconds since startup for a milestone (first call wins)"""
+    elapsed = time.perf_counter() - STARTED_AT
+    _marks.setdefault(name, round(elapsed, 4))
+    logging.info(f"Startup: {name} after {elapsed * 1000:.0f} ms")
+    return elapsed
+
+
+def report() -> dict:
+    return dict(sorted(_marks.items(), key=lambda item: item[1]))
@@ -1,3 +1,4 @@
+from core import startup  # First, so the startup clock starts here
 import os
 import sys
 import asyncio
@@ -11,17 +12,40 @@ from contextlib import asynccontextmanager
 from core.config import STATIC_DIR
 from services.file_service import FileService
 from services.mdns_service import MDNSService  # I will create this next
-from ssl_gen import generate_self_signed_cert
-from api import session_routes, file_routes, host_routes
+from services.network_service import NetworkService
+from services.journal_service import JournalService
+from services.trash_service import TrashService
+from services.secure_transport import SecureTransport
+from services.profiler_service import ProfilerService, ProfilerMiddleware
+from services.http3_service import Http3Service, AltSvcMiddleware
+from api import session_routes, file_routes, host_routes, secure_routes, admin_routes
+
+startup.mark("imports")
+
+
+async def deferred_startup():
+    # Everything here runs after the server is already accepting connections
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, FileService.start_sync_watcher)
+    startup.mark("sync_watcher")
+    await NetworkService.start()
+    startup.mark("network")
+    await MDNSService.start(8000)
+    startup.mark("mdns")
+    await SecureTransport.start(secure_app)
+    await Http3Service.start(app)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    mdns = MDNSService()
-    await mdns.start(8000)
-    FileService.start_sync_watcher()
+    # Startup: only cheap work before serving, the rest runs in background
+    # Resolve jobs a crash left half-done before any new transfer starts
+    JournalService.replay()
+    startup.mark("journal")
+    startup_task = asyncio.create_task(deferred_startup())
     watchdog_task = asyncio.create_task(FileService.watchdog_loop())
+    reclaim_task = asyncio.create_task(TrashService.reclaim_loop())
+    lag_task = asyncio.create_task(ProfilerService.lag_loop())
 
     if not os.path.exists("/.dockerenv") and os.environ.get("VITE_DEV") != "true":
 
@@ -31,10 +55,20 @@ async def lifespan(app: FastAPI):
 
         asyncio.create_task(open_browser())
 
+    startup.mark("accepting_connections")
     yield
     # Shutdown
-    await mdns.stop()
+    startup_task.cancel()
+    await MDNSService.stop()
+    await SecureTransport.stop()
+    await Http3Service.stop()
+    await NetworkService.stop()
+    FileService.stop_sync_watcher()
     watchdog_task.cancel()
+    reclaim_task.cancel()
+    lag_task.cancel()
+    # Queued journal records die with the writer thread otherwise
+    await asyncio.get_running_loop().run_in_executor(None, JournalService.flush, 10)
 
 
 app = FastAPI(title="TurboTransfer")
@@ -44,6 +78,16 @@ app.router.lifespan_context = lifespan
 app.include_router(session_routes.router)
 app.include_router(file_routes.router)
 app.include_router(host_routes.router)
+app.include_router(secure_routes.router)
+app.include_router(admin_routes.router)
+# Per-request stage timings for the slow-request log
+app.add_middleware(ProfilerMiddleware)
+# Points HTTP/3-capable clients at the QUIC listener, when enabled
+app.add_middleware(AltSvcMiddleware)
+
+# Plain-HTTP listener for the AEAD transport: encrypted bodies only
+secure_app = FastAPI(title="TurboTransfer AEAD")
+secure_app.include_router(secure_routes.router)
 
 # Static Files
 if os.path.exists(STATIC_DIR):
@@ -58,14 +102,17 @@ else:
 
 
 if __name__ == "__main__":
-    import uvicorn
+    from server_profiles import serve
+    from ssl_gen import generate_self_signed_cert
 
+    # TURBO_TLS_KEY_TYPE=ec generates a much cheaper P-256 key on first run
     generate_self_signed_cert()
-    uvicorn.run(
-        "main:app",
+    startup.mark("tls_material")
+    # TURBO_SERVER_PROFILE=default|tuned|h2 (see server_profiles.py)
+    serve(
         host="0.0.0.0",
         port=8000,
-        ssl_keyfile="key.pem",
-        ssl_certfile="cert.pem",
+        certfile="cert.pem",
+        keyfile="key.pem",
         reload=not hasattr(sys, "_MEIPASS"),
     )
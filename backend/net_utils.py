@@ -1,5 +1,4 @@
 import socket
-import psutil
 
 
 def get_smart_ips():
@@ -7,6 +6,8 @@ def get_smart_ips():
     Returns a list of IP addresses, ignoring 127.x.x.x and 172.x.x.x (Docker bridge).
     Prioritizes 192.168.x.x and 10.x.x.x.
     """
+    import psutil
+
     all_ips = []
     prioritized_ips = []
 
@@ -1,20 +1,59 @@
-import qrcode
 import io
-from net_utils import get_primary_ip
+import hashlib
+from collections import OrderedDict
 
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+MAX_CACHED_CODES = 32
+
+# (data, format, box_size) -> (payload bytes, etag)
+_qr_cache = OrderedDict()
+
+
+def _render(data: str, fmt: str, box_size: int) -> bytes:
+    import qrcode
 
-def generate_qr_code_buffer(data: str):
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
+        box_size=box_size,
         border=4,
     )
     qr.add_data(data)
     qr.make(fit=True)
 
-    img = qr.make_image(fill_color="black", back_color="white")
     buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
+    if fmt == "svg":
+        from qrcode.image.svg import SvgPathImage
+
+        qr.make_image(image_factory=SvgPathImage).save(buf)
+    else:
+        img = qr.make_image(fill_color="black", back_color="white")
+        img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def render_qr_code(data: str, fmt: str = "png", box_size: int = 10):
+    """Returns (payload, media_type, etag), rendering only on a cache miss"""
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+    key = (data, fmt, box_size)
+    cached = _qr_cache.get(key)
+    if cached is None:
+        payload = _render(data, fmt, box_size)
+        cached = (payload, f'"{hashlib.sha1(payload).hexdigest()}"')
+        _qr_cache[key] = cached
+        if len(_qr_cache) > MAX_CACHED_CODES:
+            _qr_cache.popitem(last=False)
+    else:
+        _qr_cache.move_to_end(key)
+    return cached[0], QR_FORMATS[fmt], cached[1]
+
+
+def clear_qr_cache(*_):
+    """Drops every cached code (hooked to network address changes)"""
+    _qr_cache.clear()
+
+
+def generate_qr_code_buffer(data: str):
+    payload, _, _ = render_qr_code(data)
+    return io.BytesIO(payload)
@@ -0,0 +1,98 @@
+import os
+import ssl
+import asyncio
+import logging
+
+# default: uvicorn as before (HTTP/1.1, stock settings)
+# tuned:   uvicorn with long keep-alive, deep backlog, larger h11 buffers
+# h2:      hypercorn with HTTP/2 multiplexing and TLS session tickets
+PROFILES = ("default", "tuned", "h2")
+SERVER_PROFILE = os.environ.get("TURBO_SERVER_PROFILE", "default")
+
+KEEP_ALIVE_TIMEOUT = 75  # Browsers keep idle connections around for ~60-120s
+KEEP_ALIVE_MAX_REQUESTS = 10000
+BACKLOG = 2048  # Absorb bursts of new connections from many devices
+H11_MAX_INCOMPLETE_EVENT_SIZE = 64 * 1024
+H2_MAX_CONCURRENT_STREAMS = 256  # Parallel uploads over one connection
+TLS_SESSION_TICKETS = 4  # TLS 1.3 tickets issued per handshake for resumption
+
+
+def run_uvicorn(host, port, certfile, keyfile, reload=False, tuned=False):
+    import uvicorn
+
+    options = {}
+    if tuned:
+        options = {
+            "timeout_keep_alive": KEEP_ALIVE_TIMEOUT,
+            "backlog": BACKLOG,
+            # Only honoured by the h11 protocol implementation
+            "h11_max_incomplete_event_size": H11_MAX_INCOMPLETE_EVENT_SIZE,
+        }
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        ssl_keyfile=keyfile,
+        ssl_certfile=certfile,
+        reload=reload,
+        **options,
+    )
+
+
+def build_hypercorn_config(host, port, certfile, keyfile):
+    from hypercorn.config import Config
+
+    class TunedConfig(Config):
+        def create_ssl_context(self):
+            context = super().create_ssl_context()
+            if context is not None:
+                # Let returning devices resume instead of a full handshake
+                context.options &= ~ssl.OP_NO_TICKET
+                context.num_tickets = TLS_SESSION_TICKETS
+            return context
+
+    config = TunedConfig()
+    config.bind = [f"{host}:{port}"]
+    config.certfile = certfile
+    config.keyfile = keyfile
+    config.alpn_protocols = ["h2", "http/1.1"]
+    config.keep_alive_timeout = KEEP_ALIVE_TIMEOUT
+    config.keep_alive_max_requests = KEEP_ALIVE_MAX_REQUESTS
+    config.backlog = BACKLOG
+    config.h11_max_incomplete_size = H11_MAX_INCOMPLETE_EVENT_SIZE
+    config.h2_max_concurrent_streams = H2_MAX_CONCURRENT_STREAMS
+    return config
+
+
+def run_hypercorn(host, port, certfile, keyfile):
+    from hypercorn.asyncio import serve
+    from main import app
+
+    config = build_hypercorn_config(host, port, certfile, keyfile)
+    asyncio.run(serve(app, config))
+
+
+def serve(
+    profile=None,
+    host="0.0.0.0",
+    port=8000,
+    certfile="cert.pem",
+    keyfile="key.pem",
+    reload=False,
+):
+    """Starts the server using one of PROFILES (default: TURBO_SERVER_PROFILE)"""
+    profile = profile or SERVER_PROFILE
+    if profile not in PROFILES:
+        logging.warning(f"Unknown server profile '{profile}', using default")
+        profile = "default"
+
+    if profile == "h2":
+        try:
+            import hypercorn  # noqa: F401
+        except ImportError:
+            logging.warning("h2 profile needs 'pip install hypercorn'; using tuned")
+            profile = "tuned"
+        else:
+            return run_hypercorn(host, port, certfile, keyfile)
+
+    run_uvicorn(host, port, certfile, keyfile, reload=reload, tuned=profile == "tuned")
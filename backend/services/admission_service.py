@@ -0,0 +1,278 @@
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from fastapi import HTTPException
+from fastapi.responses import FileResponse
+from core.responses import BackendFileResponse
+from services.profiler_service import ProfilerService
+
+
+class AdmissionPool:
+    """
+    FIFO gate for one kind of heavy work. A request runs once both a slot
+    and its declared memory cost fit; otherwise it queues (up to max_queue)
+    and can be located by its ticket while it waits.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int,
+        memory_budget: Optional[int] = None,
+        max_request_memory: Optional[int] = None,
+    ):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.memory_budget = memory_budget
+        self.max_request_memory = max_request_memory
+        self.active = 0
+        self.memory = 0
+        self.served = 0
+        self.rejected = 0
+        # ticket -> (future, cost, queued_at), in arrival order
+        self._waiters: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _fits(self, cost: int) -> bool:
+        if self.active >= self.limit:
+            return False
+        if self.memory_budget is None or self.active == 0:
+            return True  # An idle pool always admits one request
+        return self.memory + cost <= self.memory_budget
+
+    def _take(self, cost: int):
+        self.active += 1
+        self.memory += cost
+        self.served += 1
+
+    def _wake(self):
+        while self._waiters:
+            ticket, (future, cost, _) = next(iter(self._waiters.items()))
+            if future.done():  # Timed out or cancelled
+                del self._waiters[ticket]
+                continue
+            if not self._fits(cost):
+                return  # Strict FIFO keeps queue positions meaningful
+            del self._waiters[ticket]
+            self._take(cost)
+            future.set_result(True)
+
+    def position(self, ticket: str) -> int:
+        """1-based place in the queue, 0 if not waiting"""
+        for i, waiting in enumerate(self._waiters):
+            if waiting == ticket:
+                return i + 1
+        return 0
+
+    def retry_after(self) -> int:
+        """Rough hint: one second per queued request per slot, at least 1"""
+        return max(1, len(self._waiters) // max(self.limit, 1))
+
+    def _reject(self, status_code: int, detail: str):
+        self.rejected += 1
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def acquire(self, cost: int = 0, ticket: str = None, timeout: float = None):
+        if self.max_request_memory is not None and cost > self.max_request_memory:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=413, detail=f"Request too large for {self.name} pool"
+            )
+        if not self._waiters and self._fits(cost):
+            self._take(cost)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject(503, f"Host busy ({self.name} queue full), retry later")
+
+        if ticket in self._waiters:
+            # Replacing the entry would orphan the other request's future
+            self.rejected += 1
+            raise HTTPException(
+                status_code=409, detail=f"Ticket already queued for {self.name}"
+            )
+        ticket = ticket or uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[ticket] = (future, cost, time.time())
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._waiters.pop(ticket, None)
+            self._reject(503, f"Host busy ({self.name}), retry later")
+        except BaseException:
+            self._waiters.pop(ticket, None)
+            if future.done() and not future.cancelled():
+                self.release(cost)  # Granted just as we were cancelled
+            raise
+
+    def release(self, cost: int = 0):
+        self.active = max(self.active - 1, 0)
+        self.memory = max(self.memory - cost, 0)
+        self._wake()
+
+    def status(self) -> dict:
+        now = time.time()
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "memory_budget": self.memory_budget,
+            "max_request_memory": self.max_request_memory,
+            "active": self.active,
+            "memory": self.memory,
+            "queued": len(self._waiters),
+            "oldest_wait": max(
+                (now - queued_at for _, _, queued_at in self._waiters.values()),
+                default=0,
+            ),
+            "served": self.served,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionService:
+    """
+    Concurrency and memory limits for heavy operations (ZIP builds,
+    thumbnail bursts, large downloads), so a crowd of devices queues up
+    instead of thrashing the host.
+    """
+
+    QUEUE_TIMEOUT = 120  # Seconds a request may wait before a 503
+    LARGE_DOWNLOAD_BYTES = 64 * 1024 * 1024  # Smaller downloads skip the gate
+    DOWNLOAD_BUFFER = 64 * 1024  # FileResponse chunk held per download
+
+    DEFAULTS = {
+        "zip": {"limit": 2, "max_queue": 32},
+        "thumbnail": {
+            "limit": 2,
+            "max_queue": 256,
+            "memory_budget": 512 * 1024 * 1024,
+            "max_request_memory": 256 * 1024 * 1024,  # Decoded image size
+        },
+        "download": {"limit": 8, "max_queue": 64},
+    }
+    _pools: Dict[str, AdmissionPool] = {}
+
+    @classmethod
+    def pool(cls, name: str) -> AdmissionPool:
+        if name not in cls._pools:
+            if name not in cls.DEFAULTS:
+                raise KeyError(name)
+            cls._pools[name] = AdmissionPool(name, **cls.DEFAULTS[name])
+        return cls._pools[name]
+
+    @classmethod
+    @asynccontextmanager
+    async def slot(cls, name: str, cost: int = 0, ticket: str = None):
+        pool = cls.pool(name)
+        with ProfilerService.stage(f"{name}_queue"):
+            await pool.acquire(cost, ticket, cls.QUEUE_TIMEOUT)
+        try:
+            yield pool
+        finally:
+            pool.release(cost)
+
+    @classmethod
+    async def file_response(
+        cls, path: str, ticket: str = None, **kwargs
+    ) -> FileResponse:
+        """
+        FileResponse that holds a download slot until the body has been
+        sent (or the client went away). Small files are not gated.
+        """
+        if os.path.getsize(path) < cls.LARGE_DOWNLOAD_BYTES:
+            return BackendFileResponse(path, **kwargs)
+        pool = cls.pool("download")
+        await pool.acquire(cls.DOWNLOAD_BUFFER, ticket, cls.QUEUE_TIMEOUT)
+        return AdmittedFileResponse(
+            path, release=lambda: pool.release(cls.DOWNLOAD_BUFFER), **kwargs
+        )
+
+    @classmethod
+    def get_status(cls, ticket: str = None) -> dict:
+        pools = {name: cls.pool(name) for name in cls.DEFAULTS}
+        status = {
+            "pools": {name: pool.status() for name, pool in pools.items()},
+            "queue_timeout": cls.QUEUE_TIMEOUT,
+        }
+        if ticket:
+            status["ticket"] = {
+                name: pool.position(ticket)
+                for name, pool in pools.items()
+                if pool.position(ticket)
+            }
+        return status
+
+    # Pool setting -> (minimum, nullable)
+    SETTINGS = {
+        "limit": (1, False),
+        "max_queue": (0, False),
+        "memory_budget": (0, True),
+        "max_request_memory": (0, True),
+    }
+
+    @classmethod
+    def _setting(cls, name: str, field: str, value):
+        if field not in cls.SETTINGS:
+            raise HTTPException(status_code=400, detail=f"Unknown setting: {field}")
+        minimum, nullable = cls.SETTINGS[field]
+        if value is None and nullable:
+            return None
+        try:
+            if isinstance(value, bool) or value is None:
+                raise ValueError
+            parsed = int(value)
+            if isinstance(value, float) and value != parsed:
+                raise ValueError
+        except (TypeError, ValueError, OverflowError):
+            parsed = None
+        if parsed is None or parsed < minimum:
+            raise HTTPException(status_code=400, detail=f"Invalid {name}.{field}")
+        return parsed
+
+    @classmethod
+    def update(cls, data: dict):
+        """
+        data: {pool_name: {"limit", "max_queue", "memory_budget", ...}}.
+        Everything is validated first, so a bad request changes nothing.
+        """
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="Expected a JSON object")
+        updates = {}
+        for name, settings in data.items():
+            if name not in cls.DEFAULTS:
+                raise HTTPException(status_code=400, detail=f"Unknown pool: {name}")
+            if not isinstance(settings or {}, dict):
+                raise HTTPException(status_code=400, detail=f"Invalid {name}")
+            updates[name] = {
+                field: cls._setting(name, field, value)
+                for field, value in (settings or {}).items()
+            }
+        for name, settings in updates.items():
+            pool = cls.pool(name)
+            for field, value in settings.items():
+                setattr(pool, field, value)
+            pool._wake()  # A raised limit may admit queued requests
+
+
+class AdmittedFileResponse(BackendFileResponse):
+    """FileResponse that calls release() once the transfer ends"""
+
+    def __init__(self, *args, release=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if self._release:
+                self._release()
+                self._release = None
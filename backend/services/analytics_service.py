@@ -2,6 +2,7 @@ import os
 import json
 import time
 from typing import List, Dict
+from services.profiler_service import ProfilerService
 
 
 class AnalyticsService:
@@ -20,19 +21,33 @@ class AnalyticsService:
         direction: str,
         status: str = "success",
     ):
-        cls._ensure_metadata_dir()
+        cls.log_transfers([(device_name, filename, size, direction, status)])
 
-        entry = {
-            "timestamp": time.time(),
-            "device": device_name,
-            "filename": filename,
-            "size": size,
-            "direction": direction,  # 'sent' or 'received'
-            "status": status,
-        }
+    @classmethod
+    def log_transfers(cls, transfers: List[tuple]):
+        """Logs many (device, filename, size, direction[, status]) with one write"""
+        if not transfers:
+            return
+        with ProfilerService.stage("analytics"):
+            cls._write_transfers(transfers)
+
+    @classmethod
+    def _write_transfers(cls, transfers: List[tuple]):
+        cls._ensure_metadata_dir()
 
+        now = time.time()
         history = cls.get_history()
-        history.append(entry)
+        for device_name, filename, size, direction, *status in transfers:
+            history.append(
+                {
+                    "timestamp": now,
+                    "device": device_name,
+                    "filename": filename,
+                    "size": size,
+                    "direction": direction,  # 'sent' or 'received'
+                    "status": status[0] if status else "success",
+                }
+            )
 
         # Keep only last 100 entries for performance
         if len(history) > 100:
@@ -0,0 +1,356 @@
+import os
+import time
+import zlib
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+from core.config import ZIP_LEVEL
+from services.io_backend import IOBackend
+
+ZIP64_LIMIT = 0xFFFFFFFF
+WINDOW_SIZE = 32 * 1024  # Deflate history that primes the next block
+
+# Local header, central header, end records (same layout as zipfile's)
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+END_RECORD64 = struct.Struct("<4sQ2H2L4Q")
+END_LOCATOR64 = struct.Struct("<4sLQL")
+
+
+def _deflate_block(data: bytes, history: bytes, level: int, last: bool) -> bytes:
+    """
+    Raw-deflates one block of a larger stream (the pigz scheme): primed with
+    the previous block's tail and ended on a byte boundary with a sync
+    flush, so independently compressed blocks concatenate into one valid
+    deflate stream. zlib releases the GIL, so blocks run truly in parallel.
+    """
+    if history:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=history)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _dos_time(mtime: float) -> Tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1  # 1980-01-01 00:00
+    date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), date
+
+
+class _Entry:
+    __slots__ = (
+        "path",
+        "name",
+        "is_dir",
+        "mode",
+        "mtime",
+        "size",
+        "method",
+        "zip64",
+        "offset",
+        "crc",
+        "compressed",
+        "written",
+    )
+
+    def __init__(self, path: str, name: str, st, method: int):
+        self.path = path
+        self.is_dir = os.path.isdir(path)
+        self.name = name + "/" if self.is_dir else name
+        self.mode = st.st_mode
+        self.mtime = st.st_mtime
+        self.size = 0 if self.is_dir else st.st_size
+        self.method = 0 if self.is_dir else method
+        # Same margin as zipfile: deflate can grow incompressible data
+        self.zip64 = self.size * 1.05 > ZIP64_LIMIT
+        self.offset = 0
+        self.crc = 0
+        self.compressed = 0
+        self.written = 0
+
+
+class ArchiveService:
+    """
+    ZIP (with ZIP64) writer for folder and batch downloads that deflates on
+    all cores. Files are cut into BLOCK_SIZE blocks that a thread pool
+    compresses independently, while this thread reads ahead and writes the
+    results strictly in order, so the archive is identical in layout to a
+    serial one. Already-compressed media is stored as-is.
+    """
+
+    LEVEL = ZIP_LEVEL  # 0 stores everything
+    THREADS = os.cpu_count() or 4
+    BLOCK_SIZE = 1024 * 1024
+    READ_AHEAD = 4  # Blocks in flight per thread
+    # fmt: off
+    STORE_EXTENSIONS = {
+        # Images
+        ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".heif", ".avif",
+        # Audio / video
+        ".mp3", ".aac", ".m4a", ".ogg", ".opus", ".flac",
+        ".mp4", ".m4v", ".mkv", ".mov", ".avi", ".webm", ".3gp",
+        # Archives / packages
+        ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+        ".apk", ".jar", ".docx", ".xlsx", ".pptx", ".epub",
+    }
+    # fmt: on
+
+    _pool: Optional[ThreadPoolExecutor] = None
+    _pool_lock = threading.Lock()
+
+    @classmethod
+    def _executor(cls) -> ThreadPoolExecutor:
+        with cls._pool_lock:
+            if cls._pool is None:
+                cls._pool = ThreadPoolExecutor(
+                    max_workers=cls.THREADS, thread_name_prefix="zip"
+                )
+            return cls._pool
+
+    @classmethod
+    def method_for(cls, name: str, level: int) -> int:
+        if level == 0 or os.path.splitext(name)[1].lower() in cls.STORE_EXTENSIONS:
+            return 0  # ZIP_STORED
+        return 8  # ZIP_DEFLATED
+
+    @staticmethod
+    def _unique(name: str, taken: set) -> str:
+        """name, or "name (n).ext" for the first n not already in the archive"""
+        if name not in taken:
+            return name
+        stem, ext = os.path.splitext(name)
+        n = 1
+        while f"{stem} ({n}){ext}" in taken:
+            n += 1
+        return f"{stem} ({n}){ext}"
+
+    @classmethod
+    def collect(cls, sources: Iterable[Tuple[str, str]], level: int) -> List[_Entry]:
+        """
+        (path, arcname) pairs -> entries, folders expanded in walk order.
+        Folders with the same name merge; a file whose name is taken gets a
+        " (n)" suffix, so no two members share a name.
+        """
+        entries, files_taken, dirs_taken = [], set(), set()
+
+        def add_file(fp, name):
+            name = cls._unique(name, files_taken | dirs_taken)
+            files_taken.add(name)
+            entries.append(_Entry(fp, name, os.stat(fp), cls.method_for(fp, level)))
+
+        for path, arcname in sources:
+            arcname = arcname.replace(os.sep, "/").strip("/")
+            if not os.path.isdir(path):
+                add_file(path, arcname)
+                continue
+            for dirpath, dirs, files in os.walk(path):
+                dirs.sort()
+                rel = os.path.relpath(dirpath, path).replace(os.sep, "/")
+                prefix = arcname if rel == "." else f"{arcname}/{rel}".lstrip("/")
+                if prefix and prefix not in dirs_taken:
+                    if prefix in files_taken:
+                        # A file already has this name; nest under a free one
+                        prefix = cls._unique(prefix, files_taken | dirs_taken)
+                    dirs_taken.add(prefix)
+                    entries.append(_Entry(dirpath, prefix, os.stat(dirpath), 0))
+                for f in sorted(files):
+                    add_file(os.path.join(dirpath, f), f"{prefix}/{f}" if prefix else f)
+        return entries
+
+    # --- Writing ---
+
+    @classmethod
+    def _blocks(cls, entries: List[_Entry], level: int):
+        """
+        Yields (entry, raw, compressed future or None, last) in file order.
+        Reads go through the I/O backend, READ_AHEAD blocks deep.
+        """
+        pool = cls._executor()
+        io = IOBackend.get()
+        for entry in entries:
+            if entry.is_dir:
+                yield entry, b"", None, True
+                continue
+            reader = io.read_blocks(entry.path, cls.BLOCK_SIZE, cls.READ_AHEAD)
+            try:
+                history = b""
+                block = next(reader, b"")
+                while True:
+                    following = next(reader, b"") if block else b""
+                    last = not following
+                    future = None
+                    if entry.method:
+                        future = pool.submit(
+                            _deflate_block, block, history, level, last
+                        )
+                        history = block[-WINDOW_SIZE:]
+                    yield entry, block, future, last
+                    if last:
+                        break
+                    block = following
+            finally:
+                reader.close()
+
+    @staticmethod
+    def _local_header(entry: _Entry) -> bytes:
+        name = entry.name.encode("utf-8")
+        flags = 0x800 if not entry.name.isascii() else 0
+        mod_time, mod_date = _dos_time(entry.mtime)
+        if entry.zip64:
+            # Real sizes go in the ZIP64 extra once known
+            sizes, extra = (ZIP64_LIMIT, ZIP64_LIMIT), struct.pack("<2H2Q", 1, 16, 0, 0)
+        else:
+            sizes, extra = (0, 0), b""
+        return (
+            LOCAL_HEADER.pack(
+                b"PK\x03\x04",
+                45 if entry.zip64 else 20,
+                flags,
+                entry.method,
+                mod_time,
+                mod_date,
+                0,
+                *sizes,
+                len(name),
+                len(extra),
+            )
+            + name
+            + extra
+        )
+
+    @staticmethod
+    def _patch_header(f, entry: _Entry):
+        """Fills in the CRC and sizes once the entry's data is written"""
+        end = f.tell()
+        f.seek(entry.offset + 14)
+        if entry.zip64:
+            f.write(struct.pack("<L", entry.crc))
+            f.seek(entry.offset + 30 + len(entry.name.encode("utf-8")) + 4)
+            f.write(struct.pack("<2Q", entry.written, entry.compressed))
+        else:
+            if max(entry.written, entry.compressed) > ZIP64_LIMIT:
+                raise OSError(f"{entry.path} grew past 4 GiB while being archived")
+            f.write(struct.pack("<3L", entry.crc, entry.compressed, entry.written))
+        f.seek(end)
+
+    @staticmethod
+    def _central_header(entry: _Entry) -> bytes:
+        name = entry.name.encode("utf-8")
+        flags = 0x800 if not entry.name.isascii() else 0
+        mod_time, mod_date = _dos_time(entry.mtime)
+        zip64 = [
+            v
+            for v in (entry.written, entry.compressed, entry.offset)
+            if v >= ZIP64_LIMIT
+        ]
+        extra = (
+            struct.pack(f"<2H{len(zip64)}Q", 1, 8 * len(zip64), *zip64)
+            if zip64
+            else b""
+        )
+        attrs = (entry.mode & 0xFFFF) << 16 | (0x10 if entry.is_dir else 0)
+        version = 45 if zip64 or entry.zip64 else 20
+        return (
+            CENTRAL_HEADER.pack(
+                b"PK\x01\x02",
+                (3 << 8) | version,  # Made by: Unix
+                version,
+                flags,
+                entry.method,
+                mod_time,
+                mod_date,
+                entry.crc,
+                min(entry.compressed, ZIP64_LIMIT),
+                min(entry.written, ZIP64_LIMIT),
+                len(name),
+                len(extra),
+                0,
+                0,
+                0,
+                attrs,
+                min(entry.offset, ZIP64_LIMIT),
+            )
+            + name
+            + extra
+        )
+
+    @classmethod
+    def _write_end(cls, f, entries: List[_Entry], cd_offset: int):
+        cd_size = f.tell() - cd_offset
+        count = len(entries)
+        if count >= 0xFFFF or cd_size >= ZIP64_LIMIT or cd_offset >= ZIP64_LIMIT:
+            end64 = f.tell()
+            f.write(
+                END_RECORD64.pack(
+                    b"PK\x06\x06", 44, 45, 45, 0, 0, count, count, cd_size, cd_offset
+                )
+            )
+            f.write(END_LOCATOR64.pack(b"PK\x06\x07", 0, end64, 1))
+        f.write(
+            END_RECORD.pack(
+                b"PK\x05\x06",
+                0,
+                0,
+                min(count, 0xFFFF),
+                min(count, 0xFFFF),
+                min(cd_size, ZIP64_LIMIT),
+                min(cd_offset, ZIP64_LIMIT),
+                0,
+            )
+        )
+
+    @classmethod
+    def write(
+        cls, dest: str, sources: Iterable[Tuple[str, str]], level: int = None
+    ) -> str:
+        """
+        Blocking. Archives (path, arcname) sources into dest: folders
+        recursively, files as named. Returns dest.
+        """
+        level = cls.LEVEL if level is None else level
+        entries = cls.collect(sources, level)
+        window = deque()
+        current = None
+
+        def emit(block):
+            nonlocal current
+            entry, raw, future, last = block
+            if entry is not current:
+                current = entry
+                entry.offset = f.tell()
+                f.write(cls._local_header(entry))
+            data = future.result() if future is not None else raw
+            entry.crc = zlib.crc32(raw, entry.crc)
+            entry.written += len(raw)
+            entry.compressed += len(data)
+            f.write(data)
+            if last:
+                cls._patch_header(f, entry)
+
+        with open(dest, "wb") as f:
+            try:
+                for block in cls._blocks(entries, level):
+                    window.append(block)
+                    if len(window) >= cls.THREADS * cls.READ_AHEAD:
+                        emit(window.popleft())
+                while window:
+                    emit(window.popleft())
+            finally:
+                for _, _, future, _ in window:
+                    if future is not None:
+                        future.cancel()
+            cd_offset = f.tell()
+            for entry in entries:
+                f.write(cls._central_header(entry))
+            cls._write_end(f, entries, cd_offset)
+        return dest
+
+    @classmethod
+    def write_directory(cls, dest: str, directory: str, level: int = None) -> str:
+        """Same layout as shutil.make_archive(..., root_dir=directory)"""
+        return cls.write(dest, [(directory, "")], level)
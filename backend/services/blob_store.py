@@ -0,0 +1,93 @@
+import os
+import shutil
+import time
+import logging
+from core.config import UPLOAD_DIR
+
+
+class BlobStore:
+    """
+    Shared payload area for broadcast sends. A file is stored once under
+    BLOB_DIR and hardlinked into each target session's outgoing folder, so
+    the inode's link count is the reference count: when only the store's
+    own link is left (st_nlink == 1) nobody references the blob any more.
+    """
+
+    BLOB_DIR = os.path.join(UPLOAD_DIR, ".blobs")
+    TEMP_TTL = 60  # Matches RetentionService.TEMP_TTL for interrupted uploads
+
+    _paths = {}  # blob id -> path in BLOB_DIR, for blobs this run has seen
+
+    @classmethod
+    def blob_id(cls, path: str) -> str:
+        st = os.stat(path)
+        blob = f"{st.st_dev}:{st.st_ino}"
+        cls._paths[blob] = path
+        return blob
+
+    @classmethod
+    def release(cls, blob: str) -> bool:
+        """
+        Deletes one blob if only the store's own link is left. Only that
+        inode is checked; blobs this run never saw wait for collect().
+        """
+        path = cls._paths.get(blob)
+        if path is None:
+            return False
+        try:
+            if os.stat(path).st_nlink > 1:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.error(f"Blob GC failed for {path}: {e}")
+            return False
+        del cls._paths[blob]
+        return True
+
+    @classmethod
+    def link(cls, blob_path: str, dst: str) -> bool:
+        """
+        Exposes the blob at dst. Returns True for a hardlink, False when the
+        filesystem can't link and a full copy had to be made instead.
+        """
+        try:
+            os.link(blob_path, dst)
+            return True
+        except OSError as e:
+            logging.warning(f"Blob hardlink failed ({e}); copying {dst}")
+            shutil.copyfile(blob_path, dst)
+            return False
+
+    @classmethod
+    def collect(cls) -> int:
+        """
+        Deletes blobs no session links to any more by listing the whole
+        store. Returns the count. Run on reconcile and after trash reclaim;
+        single deletes go through release().
+        """
+        if not os.path.isdir(cls.BLOB_DIR):
+            return 0
+        count = 0
+        cls._paths = {}
+        now = time.time()
+        for f in os.listdir(cls.BLOB_DIR):
+            path = os.path.join(cls.BLOB_DIR, f)
+            try:
+                st = os.stat(path)
+                if f.endswith(".tmp"):
+                    # Interrupted broadcast from a previous run
+                    if now - st.st_mtime > cls.TEMP_TTL:
+                        os.remove(path)
+                    continue
+                if st.st_nlink <= 1:
+                    os.remove(path)
+                    count += 1
+                else:
+                    cls._paths[f"{st.st_dev}:{st.st_ino}"] = path
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logging.error(f"Blob GC failed for {path}: {e}")
+        return count
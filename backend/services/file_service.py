@@ -1,11 +1,24 @@
 import os
 import shutil
 import uuid
-import asyncio
 import time
+import asyncio
 import re
 from core.config import UPLOAD_DIR
 from fastapi import HTTPException
+from services.retention_service import RetentionService
+from services.index_service import IndexService
+from services.blob_store import BlobStore
+from services.journal_service import JournalService
+from services.trash_service import TrashService
+from services.profiler_service import ProfilerService
+
+# Keep the catalog and sync tree cache in step with age/quota eviction
+RetentionService.add_removal_listener(IndexService.remove)
+RetentionService.add_removal_listener(IndexService.update_tree)
+RetentionService.add_release_listener(BlobStore.release)
+# An expired archive closes the zip job that produced it
+RetentionService.add_removal_listener(JournalService.finish_artifact)
 
 
 class FileService:
@@ -15,6 +28,7 @@ class FileService:
     BLOCK_EXTENSIONS = [".exe", ".bat", ".cmd", ".msi", ".sh", ".vbs", ".scr"]
     SAFETY_FILTER_ENABLED = True
     OVERWRITE_DUPLICATES = True
+    MAX_MANIFEST = 100_000  # Entries per sync manifest request
     AUTOSYNC_PATH = os.path.join(
         os.path.expanduser("~"), "Downloads", "TurboSync", "Sync"
     )
@@ -24,6 +38,8 @@ class FileService:
     def set_save_path(cls, path: str):
         cls.SAVE_PATH = path
         os.makedirs(cls.SAVE_PATH, exist_ok=True)
+        # Pick up files already in the new location on the next watchdog tick
+        RetentionService.request_reconcile()
 
     @staticmethod
     def sanitize_filename(filename: str):
@@ -46,73 +62,559 @@ class FileService:
         return ext not in cls.BLOCK_EXTENSIONS
 
     @classmethod
-    async def save_stream(cls, request, session_id: str = None, is_host: bool = False):
+    def _resolve_target(cls, request, session_id: str = None, is_host: bool = False):
+        """Returns (target_dir, device_name, owner) for an upload request"""
+        if is_host:
+            # Host uploads to a device (OUTGOING)
+            if not session_id:
+                raise HTTPException(
+                    status_code=400, detail="Session ID required for host uploads"
+                )
+            return os.path.join(UPLOAD_DIR, session_id, "outgoing"), "Host", session_id
+
+        # Client uploads to host (INCOMING)
+        device_name = request.headers.get("x-device-name", "Unknown_Device")
+        device_name = cls.sanitize_filename(device_name)
+        return os.path.join(cls.SAVE_PATH, device_name), device_name, device_name
+
+    @classmethod
+    def _relative_dir(cls, value: str) -> str:
+        """Sanitized relative folder from an x-relative-dir header ('' if none)"""
+        if not value:
+            return ""
+        parts = [
+            cls.sanitize_filename(p)
+            for p in value.replace("\\", "/").split("/")
+            if p not in ("", ".")
+        ]
+        return os.path.join(*parts) if parts else ""
+
+    @classmethod
+    def _commit_upload(
+        cls,
+        temp_path: str,
+        target_dir: str,
+        filename: str,
+        file_id: str,
+        owner: str,
+        size: int,
+        mtime: float = None,
+    ) -> str:
+        """
+        Moves a completed temp file into place and records it. mtime, if
+        given, is stamped first so the file never shows up with another.
+        """
+        if mtime is not None:
+            # Lets sync clients compare by size + mtime later
+            os.utime(temp_path, (time.time(), mtime))
+        final_path = os.path.join(target_dir, filename)
+        # Avoid overwrites if disabled - append unique ID if exists
+        if os.path.exists(final_path) and not cls.OVERWRITE_DUPLICATES:
+            name, ext = os.path.splitext(filename)
+            final_path = os.path.join(target_dir, f"{name}_{file_id[:8]}{ext}")
+
+        shutil.move(temp_path, final_path)
+        JournalService.finish(file_id)
+        RetentionService.discard(temp_path)
+        RetentionService.add_transfer(final_path, owner, size)
+        return final_path
+
+    @classmethod
+    async def save_stream(
+        cls, request, session_id: str = None, is_host: bool = False, body=None
+    ):
+        """
+        Streams a raw upload body to disk. body, if given, replaces
+        request.stream() (e.g. the decrypted frames of the AEAD transport).
+        """
         filename = cls.sanitize_filename(
             request.headers.get("x-filename", "unnamed_file")
         )
         expected_size = int(request.headers.get("x-filesize", 0))
+        try:
+            mtime = request.headers.get("x-file-mtime")
+            mtime = float(mtime) if mtime else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid x-file-mtime")
 
         if not cls.is_safe(filename):
             raise HTTPException(
                 status_code=403, detail="File type blocked for security"
             )
 
-        if is_host:
-            # Host uploads to a device (OUTGOING)
-            if not session_id:
-                raise HTTPException(
-                    status_code=400, detail="Session ID required for host uploads"
-                )
-            target_dir = os.path.join(UPLOAD_DIR, session_id, "outgoing")
-            device_name = "Host"
-        else:
-            # Client uploads to host (INCOMING)
-            device_name = request.headers.get("x-device-name", "Unknown_Device")
-            device_name = cls.sanitize_filename(device_name)
-            target_dir = os.path.join(cls.SAVE_PATH, device_name)
-
+        target_dir, device_name, owner = cls._resolve_target(
+            request, session_id, is_host
+        )
+        # Tree uploads (CLI client) keep their folder structure
+        subdir = cls._relative_dir(request.headers.get("x-relative-dir"))
+        index_path = None
+        if subdir:
+            index_path = os.path.join(target_dir, subdir.split(os.sep)[0])
+            target_dir = os.path.join(target_dir, subdir)
         os.makedirs(target_dir, exist_ok=True)
+        # Reject early (quota / disk space) before streaming anything
+        with ProfilerService.stage("admit"):
+            reservation = await RetentionService.admit(owner, expected_size, target_dir)
 
         file_id = str(uuid.uuid4())
         temp_path = os.path.join(target_dir, f"{file_id}.tmp")
+        RetentionService.schedule(temp_path, "temp", RetentionService.TEMP_TTL)
 
-        import aiofiles
+        from services.write_pipeline import UploadWriter
         from services.analytics_service import AnalyticsService
         from services.thumbnail_service import ThumbnailService
 
         try:
-            async with aiofiles.open(temp_path, "wb") as f:
-                async for chunk in request.stream():
-                    # Optimization: Using larger chunking isn't strictly necessary here
-                    # as request.stream() handles it, but we can ensure efficiency
-                    await f.write(chunk)
-
-            actual_size = os.path.getsize(temp_path)
+            # On disk before the temp file exists, so replay can remove it
+            await JournalService.begin_async("upload", [temp_path], job_id=file_id)
+            # Chunks are coalesced into large buffers and written off-loop
+            with ProfilerService.stage("receive"):
+                async with UploadWriter(temp_path, expected_size) as writer:
+                    async for chunk in body if body is not None else request.stream():
+                        if (
+                            expected_size > 0
+                            and writer.written + len(chunk) > expected_size
+                        ):
+                            # Don't let a lying x-filesize overrun its reservation
+                            raise HTTPException(
+                                status_code=400, detail="File size mismatch"
+                            )
+                        # Unsized uploads grow their reservation (or abort)
+                        await RetentionService.extend(
+                            reservation, writer.written + len(chunk)
+                        )
+                        await writer.write(chunk)
+
+            actual_size = writer.written
             if expected_size > 0 and actual_size != expected_size:
                 os.remove(temp_path)
                 raise HTTPException(status_code=400, detail="File size mismatch")
 
-            final_path = os.path.join(target_dir, filename)
-            # Avoid overwrites if disabled - append unique ID if exists
-            if os.path.exists(final_path) and not cls.OVERWRITE_DUPLICATES:
-                name, ext = os.path.splitext(filename)
-                final_path = os.path.join(target_dir, f"{name}_{file_id[:8]}{ext}")
-
-            shutil.move(temp_path, final_path)
+            with ProfilerService.stage("commit"):
+                final_path = cls._commit_upload(
+                    temp_path, target_dir, filename, file_id, owner, actual_size, mtime
+                )
+            direction = "sent" if is_host else "received"
+            with ProfilerService.stage("index"):
+                # The catalog holds top-level entries only (like the scans)
+                await IndexService.add_files_async(
+                    [(index_path or final_path, owner, direction)]
+                )
+                await IndexService.update_tree_async([final_path])
 
             # Analytics & Thumbnails
-            direction = "sent" if is_host else "received"
             AnalyticsService.log_transfer(device_name, filename, actual_size, direction)
 
-            # Generate thumbnail if image
-            ThumbnailService.generate_thumbnail(final_path)
+            # Generate thumbnail if image (queued behind other renders)
+            ThumbnailService.schedule([final_path])
 
             return os.path.basename(final_path)
 
         except Exception as e:
+            RetentionService.discard(temp_path)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            JournalService.finish(file_id)
+            raise e
+        finally:
+            RetentionService.release(reservation)
+
+    @classmethod
+    async def save_broadcast(cls, request, session_ids: list) -> list:
+        """
+        Host fan-out send: the body is stored once in the blob area and
+        hardlinked into every target session's outgoing folder.
+        Returns the final path for each session, in order.
+        """
+        filename = cls.sanitize_filename(
+            request.headers.get("x-filename", "unnamed_file")
+        )
+        expected_size = int(request.headers.get("x-filesize", 0))
+
+        if not cls.is_safe(filename):
+            raise HTTPException(
+                status_code=403, detail="File type blocked for security"
+            )
+
+        os.makedirs(BlobStore.BLOB_DIR, exist_ok=True)
+        # Every target's quota must hold the payload; the disk holds it once
+        reservation = await RetentionService.admit(
+            session_ids, expected_size, BlobStore.BLOB_DIR
+        )
+
+        file_id = str(uuid.uuid4())
+        temp_path = os.path.join(BlobStore.BLOB_DIR, f"{file_id}.tmp")
+        blob_path = os.path.join(BlobStore.BLOB_DIR, file_id)
+        RetentionService.schedule(temp_path, "temp", RetentionService.TEMP_TTL)
+
+        from services.write_pipeline import UploadWriter
+        from services.analytics_service import AnalyticsService
+
+        try:
+            await JournalService.begin_async(
+                "broadcast",
+                [temp_path],
+                job_id=file_id,
+                filename=filename,
+                sessions=session_ids,
+            )
+            async with UploadWriter(temp_path, expected_size) as writer:
+                async for chunk in request.stream():
+                    if (
+                        expected_size > 0
+                        and writer.written + len(chunk) > expected_size
+                    ):
+                        raise HTTPException(
+                            status_code=400, detail="File size mismatch"
+                        )
+                    await RetentionService.extend(
+                        reservation, writer.written + len(chunk)
+                    )
+                    await writer.write(chunk)
+
+            actual_size = writer.written
+            if expected_size > 0 and actual_size != expected_size:
+                raise HTTPException(status_code=400, detail="File size mismatch")
+            os.replace(temp_path, blob_path)
+            # Once this is on disk a crash is rolled forward by re-linking
+            await JournalService.commit_async(file_id, blob=blob_path)
+            RetentionService.discard(temp_path)
+        except Exception as e:
+            RetentionService.discard(temp_path)
+            for path in (temp_path, blob_path):  # No link points at the blob yet
+                if os.path.exists(path):
+                    os.remove(path)
+            JournalService.finish(file_id)
+            raise e
+        finally:
+            RetentionService.release(reservation)
+
+        finals = []
+        try:
+            for session_id in session_ids:
+                target_dir = os.path.join(UPLOAD_DIR, session_id, "outgoing")
+                os.makedirs(target_dir, exist_ok=True)
+                final_path = os.path.join(target_dir, filename)
+                if os.path.exists(final_path) and not cls.OVERWRITE_DUPLICATES:
+                    name, ext = os.path.splitext(filename)
+                    final_path = os.path.join(target_dir, f"{name}_{file_id[:8]}{ext}")
+                elif os.path.exists(final_path):
+                    os.remove(final_path)
+                linked = BlobStore.link(blob_path, final_path)
+                RetentionService.add_transfer(
+                    final_path,
+                    session_id,
+                    actual_size,
+                    blob=BlobStore.blob_id(blob_path) if linked else None,
+                )
+                finals.append(final_path)
+        finally:
+            JournalService.finish(file_id)
+            # Drops the blob right away if no link could be made
+            BlobStore.release(BlobStore.blob_id(blob_path))
+
+        await IndexService.add_files_async(
+            [(path, sid, "sent") for path, sid in zip(finals, session_ids)]
+        )
+        AnalyticsService.log_transfers(
+            [("Host", filename, actual_size, "sent") for _ in finals]
+        )
+        return finals
+
+    @classmethod
+    async def relay_stream(cls, relay_id: str, request) -> int:
+        """
+        Pipes a relay sender's body straight to the waiting receiver. With
+        persist set on the offer, a copy is also written to the receiver's
+        outgoing folder as if it had been uploaded normally.
+        Returns bytes relayed.
+        """
+        from services.relay_service import RelayService
+        from services.analytics_service import AnalyticsService
+
+        relay = RelayService.get(relay_id)
+        RelayService.check_sender(relay, request)  # Before reserving any space
+        if not relay["persist"]:
+            size = await RelayService.send(relay_id, request)
+            AnalyticsService.log_transfer(
+                relay["sender"], relay["filename"], size, "relayed"
+            )
+            return size
+
+        from services.write_pipeline import UploadWriter
+
+        owner = relay["target_session"]
+        target_dir = os.path.join(UPLOAD_DIR, owner, "outgoing")
+        os.makedirs(target_dir, exist_ok=True)
+        reservation = await RetentionService.admit(owner, relay["size"], target_dir)
+
+        file_id = str(uuid.uuid4())
+        temp_path = os.path.join(target_dir, f"{file_id}.tmp")
+        RetentionService.schedule(temp_path, "temp", RetentionService.TEMP_TTL)
+        try:
+            await JournalService.begin_async("upload", [temp_path], job_id=file_id)
+            async with UploadWriter(temp_path, relay["size"]) as writer:
+
+                async def tee(chunk):
+                    await RetentionService.extend(
+                        reservation, writer.written + len(chunk)
+                    )
+                    await writer.write(chunk)
+
+                size = await RelayService.send(relay_id, request, tee=tee)
+            final_path = cls._commit_upload(
+                temp_path, target_dir, relay["filename"], file_id, owner, size
+            )
+            await IndexService.add_files_async([(final_path, owner, "sent")])
+            AnalyticsService.log_transfer(
+                relay["sender"], relay["filename"], size, "relayed"
+            )
+            return size
+        except Exception as e:
+            RetentionService.discard(temp_path)
             if os.path.exists(temp_path):
                 os.remove(temp_path)
+            JournalService.finish(file_id)
             raise e
+        finally:
+            RetentionService.release(reservation)
+
+    @classmethod
+    async def save_multipart(
+        cls, request, session_id: str = None, is_host: bool = False
+    ):
+        """
+        Streams a multipart/form-data body carrying many files. Each file part
+        is parsed incrementally straight into its own temp file (nothing is
+        spooled), and analytics are written once for the whole batch.
+        Returns (results, saved_paths); results has one entry per file part.
+        """
+        try:
+            import python_multipart as multipart
+            from python_multipart.exceptions import FormParserError
+            from python_multipart.multipart import parse_options_header
+        except ModuleNotFoundError:
+            import multipart
+            from multipart.exceptions import FormParserError
+            from multipart.multipart import parse_options_header
+        from services.write_pipeline import UploadWriter
+        from services.analytics_service import AnalyticsService
+
+        content_type, params = parse_options_header(
+            request.headers.get("content-type", "")
+        )
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise HTTPException(
+                status_code=400, detail="Expected a multipart/form-data body"
+            )
+
+        target_dir, device_name, owner = cls._resolve_target(
+            request, session_id, is_host
+        )
+        os.makedirs(target_dir, exist_ok=True)
+
+        # The parser is synchronous; queue its events and replay them async
+        events = []
+        field, value = bytearray(), bytearray()
+
+        def on_header_end():
+            events.append(("header", (bytes(field).lower(), bytes(value))))
+            field.clear()
+            value.clear()
+
+        parser = multipart.MultipartParser(
+            boundary,
+            {
+                "on_part_begin": lambda: events.append(("begin", None)),
+                "on_header_field": lambda d, s, e: field.extend(d[s:e]),
+                "on_header_value": lambda d, s, e: value.extend(d[s:e]),
+                "on_header_end": on_header_end,
+                "on_headers_finished": lambda: events.append(("headers", None)),
+                "on_part_data": lambda d, s, e: events.append(("data", bytes(d[s:e]))),
+                "on_part_end": lambda: events.append(("end", None)),
+            },
+        )
+
+        results, saved, log_entries = [], [], []
+        part = None
+
+        async def discard_part(detail: str):
+            if part["writer"] is not None:
+                await part["writer"].abort()
+                part["writer"] = None
+            if part["temp_path"]:
+                RetentionService.discard(part["temp_path"])
+                if os.path.exists(part["temp_path"]):
+                    os.remove(part["temp_path"])
+                JournalService.finish(part["file_id"])
+            if part["reservation"]:
+                RetentionService.release(part["reservation"])
+                part["reservation"] = None
+            part["error"] = detail
+
+        async def begin_part():
+            disposition, options = parse_options_header(
+                part["headers"].get(b"content-disposition", b"")
+            )
+            raw_name = options.get(b"filename")
+            if raw_name is None:
+                part["skip"] = True  # Plain form field, not a file
+                return
+            filename = cls.sanitize_filename(raw_name.decode("utf-8", "replace"))
+            part["filename"] = filename or "unnamed_file"
+            try:
+                part["expected"] = int(part["headers"].get(b"x-filesize", b"0") or 0)
+            except ValueError:
+                part["error"] = "Invalid x-filesize"
+                return
+            if not cls.is_safe(part["filename"]):
+                part["error"] = "File type blocked for security"
+                return
+            try:
+                part["reservation"] = await RetentionService.admit(
+                    owner, part["expected"], target_dir
+                )
+            except HTTPException as e:
+                part["error"] = e.detail
+                return
+            part["file_id"] = str(uuid.uuid4())
+            part["temp_path"] = os.path.join(target_dir, f"{part['file_id']}.tmp")
+            try:
+                await JournalService.begin_async(
+                    "upload", [part["temp_path"]], job_id=part["file_id"]
+                )
+            except OSError:
+                await discard_part("Could not journal the upload")
+                return
+            RetentionService.schedule(
+                part["temp_path"], "temp", RetentionService.TEMP_TTL
+            )
+            part["writer"] = await UploadWriter(
+                part["temp_path"], part["expected"]
+            ).open()
+
+        async def end_part():
+            if part["skip"]:
+                return
+            if part["error"] is None:
+                writer = part["writer"]
+                part["writer"] = None
+                size = await writer.close()
+                if part["expected"] > 0 and size != part["expected"]:
+                    await discard_part("File size mismatch")
+                else:
+                    final_path = cls._commit_upload(
+                        part["temp_path"],
+                        target_dir,
+                        part["filename"],
+                        part["file_id"],
+                        owner,
+                        size,
+                    )
+                    RetentionService.release(part["reservation"])
+                    saved.append(final_path)
+                    log_entries.append((part["filename"], size))
+                    results.append(
+                        {
+                            "filename": os.path.basename(final_path),
+                            "status": "success",
+                            "size": size,
+                        }
+                    )
+                    return
+            results.append(
+                {
+                    "filename": part["filename"],
+                    "status": "error",
+                    "detail": part["error"],
+                }
+            )
+
+        try:
+            async for chunk in request.stream():
+                try:
+                    parser.write(chunk)
+                    malformed = False
+                except FormParserError:
+                    malformed = True  # Still commit the parts parsed before it
+                for kind, data in events:
+                    if kind == "begin":
+                        part = {
+                            "headers": {},
+                            "filename": None,
+                            "expected": 0,
+                            "file_id": None,
+                            "temp_path": None,
+                            "writer": None,
+                            "reservation": None,
+                            "skip": False,
+                            "error": None,
+                        }
+                    elif kind == "header":
+                        part["headers"][data[0]] = data[1]
+                    elif kind == "headers":
+                        await begin_part()
+                    elif kind == "data":
+                        if part["writer"] is None:
+                            continue  # Skipped or failed part: drain it
+                        writer = part["writer"]
+                        if (
+                            part["expected"] > 0
+                            and writer.written + len(data) > part["expected"]
+                        ):
+                            await discard_part("File size mismatch")
+                            continue
+                        try:
+                            await RetentionService.extend(
+                                part["reservation"], writer.written + len(data)
+                            )
+                        except HTTPException as e:
+                            await discard_part(e.detail)
+                            continue
+                        await writer.write(data)
+                    elif kind == "end":
+                        await end_part()
+                        part = None
+                events.clear()
+                if malformed:
+                    raise HTTPException(
+                        status_code=400, detail="Malformed multipart body"
+                    )
+            try:
+                parser.finalize()
+            except FormParserError:
+                raise HTTPException(status_code=400, detail="Malformed multipart body")
+        finally:
+            # Client went away mid-part: drop the partial file
+            if part is not None and not part["skip"] and part["error"] is None:
+                await discard_part("Upload interrupted")
+
+            # Commit catalog and analytics once for the whole batch, or for
+            # the files that made it before the batch failed
+            direction = "sent" if is_host else "received"
+            await IndexService.add_files_async([(p, owner, direction) for p in saved])
+            await IndexService.update_tree_async(saved)
+            AnalyticsService.log_transfers(
+                [(device_name, name, size, direction) for name, size in log_entries]
+            )
+        return results, saved
+
+    @classmethod
+    def resolve_path(cls, filename: str, session_id: str = None):
+        """Finds a downloadable file/folder by relative name, or None"""
+        search_paths = []
+        if session_id and session_id != "null":
+            search_paths.append(
+                os.path.join(UPLOAD_DIR, session_id, "outgoing", filename)
+            )
+        search_paths.append(os.path.join(UPLOAD_DIR, filename))
+        search_paths.append(os.path.join(cls.SAVE_PATH, filename))
+
+        for path in search_paths:
+            if os.path.exists(path):
+                return path
+        return None
 
     @classmethod
     def list_files(cls, session_id: str = None, device_name: str = None):
@@ -174,7 +676,8 @@ class FileService:
             if os.path.exists(cls.SAVE_PATH):
                 for d in os.listdir(cls.SAVE_PATH):
                     path = os.path.join(cls.SAVE_PATH, d)
-                    if os.path.isdir(path):
+                    # Skips .trash and other internal folders
+                    if os.path.isdir(path) and not d.startswith("."):
                         scan(path, "received", d)
 
             # Scan ALL outgoing folders in UPLOAD_DIR
@@ -186,43 +689,138 @@ class FileService:
 
         return files
 
+    @classmethod
+    def list_tree(
+        cls, session_id: str, device_name: str, direction: str, subdir: str = ""
+    ) -> dict:
+        """
+        Every file under a session's received (SAVE_PATH/<device>) or sent
+        (outgoing) folder, recursively, as relative paths with size and
+        mtime. download_prefix + path is the name /download resolves.
+        """
+        if direction == "sent":
+            root, prefix = os.path.join(UPLOAD_DIR, session_id, "outgoing"), ""
+        else:
+            device = cls.sanitize_filename(device_name)
+            root, prefix = os.path.join(cls.SAVE_PATH, device), f"{device}/"
+        subdir = cls._relative_dir(subdir)
+        base = os.path.join(root, subdir) if subdir else root
+
+        files = []
+        for dirpath, dirs, names in os.walk(base):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for f in names:
+                if f.endswith(".tmp") or f.startswith("."):
+                    continue
+                path = os.path.join(dirpath, f)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append(
+                    {
+                        "path": os.path.relpath(path, root).replace(os.sep, "/"),
+                        "size": st.st_size,
+                        "mtime": st.st_mtime,
+                    }
+                )
+        return {"download_prefix": prefix, "files": files}
+
+    @classmethod
+    def diff_manifest(cls, device_name: str, manifest: list) -> dict:
+        """
+        Sync negotiation for a device's received folder: manifest entries are
+        [path, size, mtime] or [path, size, mtime, sha256], paths relative
+        like list_tree's. Returns the paths worth uploading. Blocking.
+        """
+        if len(manifest) > cls.MAX_MANIFEST:
+            raise HTTPException(
+                status_code=413, detail=f"At most {cls.MAX_MANIFEST} entries"
+            )
+        entries = []
+        for item in manifest:
+            try:
+                path, size, mtime, *digest = item
+                rel = cls._relative_dir(os.path.dirname(path))
+                name = cls.sanitize_filename(path)
+                if not name:
+                    raise ValueError("no file name")
+                entries.append(
+                    (
+                        path,
+                        os.path.join(rel, name),
+                        int(size),
+                        float(mtime),
+                        str(digest[0]) if digest and digest[0] else None,
+                    )
+                )
+            except (TypeError, ValueError):
+                raise HTTPException(
+                    status_code=400, detail=f"Bad manifest entry: {item!r}"[:200]
+                )
+        root = os.path.join(cls.SAVE_PATH, cls.sanitize_filename(device_name))
+        return IndexService.diff_manifest(root, entries)
+
     @staticmethod
     def delete_session_files(session_id: str):
         """Strict cleanup: Remove outgoing files for this session"""
         path = os.path.join(UPLOAD_DIR, session_id)
-        if os.path.exists(path):
-            shutil.rmtree(path)
+        job_id = JournalService.begin("delete", [path])
+        RetentionService.remove_tree(path)
+        IndexService.remove(path)
+        # Nothing to undo after a disconnect: reclaimed on the next pass
+        TrashService.move([(path, session_id, "sent")], hold=0)
+        JournalService.finish(job_id)
 
     @classmethod
-    def batch_delete(
+    async def batch_delete(
         cls, filenames: list[str], session_id: str = None, device_name: str = None
     ):
-        """Deletes multiple files from either session outgoing or device incoming"""
+        """
+        Deletes multiple files from either session outgoing or device incoming.
+        Returns the trash batch id, restorable for TrashService.UNDO_WINDOW.
+        """
+        items = []
         for filename in filenames:
-            paths = []
             if session_id:
-                paths.append(os.path.join(UPLOAD_DIR, session_id, "outgoing", filename))
+                path = os.path.join(UPLOAD_DIR, session_id, "outgoing", filename)
+                items.append((path, session_id, "sent"))
             if device_name:
-                paths.append(os.path.join(cls.SAVE_PATH, device_name, filename))
-
-            for p in paths:
-                if os.path.exists(p):
-                    if os.path.isfile(p):
-                        os.remove(p)
-                    elif os.path.isdir(p):
-                        shutil.rmtree(p)
+                path = os.path.join(cls.SAVE_PATH, device_name, filename)
+                items.append((path, device_name, "received"))
+        items = [i for i in items if os.path.exists(i[0])]
+        if not items:
+            return None
+
+        # Journaled first, so a crash part-way still deletes the whole batch
+        job_id = await JournalService.begin_async("delete", [i[0] for i in items])
+        for p, _, _ in items:
+            RetentionService.remove_tree(p)
+        await IndexService.remove_async([i[0] for i in items])
+        batch_id = TrashService.move(items, session_id=session_id)
+        JournalService.finish(job_id)
+        return batch_id
 
     @classmethod
     async def zip_files(
-        cls, filenames: list[str], session_id: str = None, device_name: str = None
+        cls,
+        filenames: list[str],
+        session_id: str = None,
+        device_name: str = None,
+        ticket: str = None,
     ) -> str:
         """Zips multiple files and returns the path to the zip."""
-        import tempfile
+        from services.admission_service import AdmissionService
 
-        temp_dir = tempfile.mkdtemp()
-        bundle_dir = os.path.join(temp_dir, "transfer_bundle")
-        os.makedirs(bundle_dir, exist_ok=True)
+        async with AdmissionService.slot("zip", ticket=ticket):
+            return await cls._zip_files(filenames, session_id, device_name)
 
+    @classmethod
+    async def _zip_files(
+        cls, filenames: list[str], session_id: str = None, device_name: str = None
+    ) -> str:
+        # Archived straight from where they are, no staging copy
+        sources = []
         for filename in filenames:
             src = None
             if session_id:
@@ -235,15 +833,9 @@ class FileService:
                     src = p
 
             if src:
-                target = os.path.join(bundle_dir, filename)
-                if os.path.isdir(src):
-                    shutil.copytree(src, target)
-                else:
-                    shutil.copy2(src, target)
+                sources.append((src, filename))
 
-        zip_path = await cls.zip_directory(bundle_dir)
-        shutil.rmtree(temp_dir)
-        return zip_path
+        return await cls._make_zip("transfer_bundle", sources=sources)
 
     @classmethod
     def start_sync_watcher(cls):
@@ -251,8 +843,27 @@ class FileService:
         from watchdog.observers import Observer
         from watchdog.events import FileSystemEventHandler
 
+        # The Sync folder normally sits inside SAVE_PATH as its own "device"
+        sync_parent = os.path.dirname(os.path.abspath(cls.AUTOSYNC_PATH))
+        indexed = sync_parent == os.path.abspath(cls.SAVE_PATH)
+        sync_folder = os.path.basename(os.path.abspath(cls.AUTOSYNC_PATH))
+
         class SyncHandler(FileSystemEventHandler):
+            def on_deleted(self, event):
+                if indexed:
+                    IndexService.remove(event.src_path)
+                    IndexService.update_tree(event.src_path)
+
+            def on_modified(self, event):
+                # Keep size/mtime current while a synced file is being written
+                if indexed and not event.is_directory:
+                    IndexService.add_files([(event.src_path, sync_folder, "received")])
+                    IndexService.update_tree(event.src_path)
+
             def on_created(self, event):
+                if indexed and not os.path.basename(event.src_path).endswith(".tmp"):
+                    IndexService.add_files([(event.src_path, sync_folder, "received")])
+                    IndexService.update_tree(event.src_path)
                 if not event.is_directory:
                     # New file added to Sync folder
                     # In a real app, we might trigger a broadcast here
@@ -269,76 +880,71 @@ class FileService:
         cls._sync_observer.start()
 
     @classmethod
-    def cleanup_transfers(cls, max_age_hours: int = 24):
-        """Removes files older than max_age_hours from UPLOAD_DIR and SAVE_PATH"""
-        now = time.time()
-        max_age = max_age_hours * 3600
-        count = 0
-
-        for base_dir in [UPLOAD_DIR, cls.SAVE_PATH]:
-            if not os.path.exists(base_dir):
-                continue
-            for root, dirs, files in os.walk(base_dir):
-                for f in files:
-                    path = os.path.join(root, f)
-                    if now - os.path.getmtime(path) > max_age:
-                        try:
-                            if os.path.isfile(path):
-                                os.remove(path)
-                            elif os.path.isdir(path):
-                                shutil.rmtree(path)
-                            count += 1
-                        except Exception:
-                            pass
-        return count
+    def stop_sync_watcher(cls):
+        if cls._sync_observer is not None:
+            cls._sync_observer.stop()
+            cls._sync_observer = None
+
+    @classmethod
+    def cleanup_transfers(cls, max_age_hours: int = 24, device_name: str = None):
+        """Removes tracked transfers older than max_age_hours (0 = everything)"""
+        owner = cls.sanitize_filename(device_name) if device_name else None
+        return RetentionService.expire_transfers(max_age_hours * 3600, owner)
 
     @staticmethod
     async def watchdog_loop():
-        # Clean .tmp files and old ZIPs recursively
-        import tempfile
+        from core import startup
 
+        # Sweep only what is due; fall back to a full rescan infrequently
         while True:
             try:
-                now = time.time()
-                # 1. Project UPLOAD_DIR
-                for root, dirs, files in os.walk(UPLOAD_DIR):
-                    for f in files:
-                        path = os.path.join(root, f)
-                        if f.endswith(".tmp") and os.path.getmtime(path) < now - 60:
-                            os.remove(path)
-
-                # 2. Configured SAVE_PATH
-                if os.path.exists(FileService.SAVE_PATH):
-                    for root, dirs, files in os.walk(FileService.SAVE_PATH):
-                        for f in files:
-                            path = os.path.join(root, f)
-                            if f.endswith(".tmp") and os.path.getmtime(path) < now - 60:
-                                os.remove(path)
-
-                # 3. System TEMP (Batch ZIPs)
-                sys_temp = tempfile.gettempdir()
-                for f in os.listdir(sys_temp):
-                    if f.endswith(".zip") and "transfer_bundle" in f:
-                        path = os.path.join(sys_temp, f)
-                        if os.path.getmtime(path) < now - 3600:  # 1 hour
-                            os.remove(path)
-
+                if RetentionService.reconcile_due():
+                    await RetentionService.reconcile(UPLOAD_DIR, FileService.SAVE_PATH)
+                    await IndexService.reconcile(UPLOAD_DIR, FileService.SAVE_PATH)
+                    BlobStore.collect()
+                    startup.mark("index")
+                RetentionService.sweep()
             except Exception as e:
                 print(f"Watchdog Error: {e}")
-            await asyncio.sleep(60)  # Check every minute
+            await asyncio.sleep(RetentionService.seconds_until_next())
 
     @classmethod
-    async def zip_directory(cls, directory_path: str) -> str:
+    async def zip_directory(cls, directory_path: str, ticket: str = None) -> str:
         """Zips a directory and returns the path to the zip file. Zip is saved in a temp location."""
+        from services.admission_service import AdmissionService
+
+        # At most a few archive builds run at once; the rest queue up
+        async with AdmissionService.slot("zip", ticket=ticket):
+            return await cls._make_zip(directory_path)
+
+    @classmethod
+    async def _make_zip(cls, directory_path: str, sources: list = None) -> str:
+        """
+        Builds the archive (of directory_path, or of (path, arcname) sources
+        named after it) under a zip job, which stays open until retention
+        removes the archive; a crash in between rolls the artifact back.
+        """
         import tempfile
+        from services.archive_service import ArchiveService
 
         temp_dir = tempfile.gettempdir()
         base_name = os.path.basename(directory_path)
-        zip_path = os.path.join(temp_dir, f"{base_name}_{uuid.uuid4().hex}")
+        zip_path = os.path.join(temp_dir, f"{base_name}_{uuid.uuid4().hex}.zip")
+        job_id = await JournalService.begin_async("zip", [zip_path])
+        if sources is None:
+            sources = [(directory_path, "")]
 
-        # Run shutil.make_archive in a thread to keep FastAPI alive
+        # Compression runs on ArchiveService's pool; keep FastAPI alive
         loop = asyncio.get_event_loop()
-        final_zip = await loop.run_in_executor(
-            None, lambda: shutil.make_archive(zip_path, "zip", directory_path)
-        )
+        try:
+            with ProfilerService.stage("make_archive"):
+                final_zip = await loop.run_in_executor(
+                    None, ArchiveService.write, zip_path, sources
+                )
+        except Exception:
+            if os.path.exists(zip_path):
+                os.remove(zip_path)
+            JournalService.finish(job_id)
+            raise
+        RetentionService.schedule(final_zip, "archive", RetentionService.ARCHIVE_TTL)
         return final_zip
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from core.config import H3_PORT
+
+
+class Http3Service:
+    """
+    Optional HTTP/3 (QUIC) listener serving the main app next to the TCP
+    server. QUIC recovers from loss per stream and without TCP's
+    head-of-line blocking, which helps on congested Wi-Fi. Runs hypercorn
+    (with aioquic) UDP-only inside the running event loop, with the same
+    certificate as the TLS listener, and is advertised through Alt-Svc.
+    """
+
+    PORT = H3_PORT  # UDP port; 0 disables the listener
+    CERTFILE = "cert.pem"  # Written by ssl_gen next to main.py
+    KEYFILE = "key.pem"
+    ALT_SVC_MAX_AGE = 86400
+
+    _task = None
+    _shutdown = None
+
+    @classmethod
+    def running(cls) -> bool:
+        return cls._task is not None and not cls._task.done()
+
+    @classmethod
+    def alt_svc(cls) -> str:
+        return f'h3=":{cls.PORT}"; ma={cls.ALT_SVC_MAX_AGE}'
+
+    @staticmethod
+    def _without_lifespan(app):
+        """The TCP server already ran the app's startup; don't run it twice"""
+
+        async def wrapper(scope, receive, send):
+            if scope["type"] != "lifespan":
+                return await app(scope, receive, send)
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        return wrapper
+
+    @classmethod
+    async def start(cls, app, host: str = "0.0.0.0"):
+        if not cls.PORT or cls._task is not None:
+            return
+        try:
+            from hypercorn.asyncio import serve
+            from hypercorn.config import Config
+            import aioquic  # noqa: F401
+        except ImportError:
+            logging.warning("HTTP/3 needs 'pip install hypercorn aioquic'; disabled")
+            return
+
+        config = Config()
+        config.bind = []  # UDP only: TCP stays with the main server
+        config.quic_bind = [f"{host}:{cls.PORT}"]
+        config.certfile = cls.CERTFILE
+        config.keyfile = cls.KEYFILE
+        config.loglevel = "WARNING"
+        cls._shutdown = asyncio.Event()
+        # An explicit shutdown trigger also keeps hypercorn off the signals
+        cls._task = asyncio.create_task(
+            serve(
+                cls._without_lifespan(app),
+                config,
+                shutdown_trigger=cls._shutdown.wait,
+            )
+        )
+        logging.info(f"HTTP/3 listening on udp://{host}:{cls.PORT}")
+
+    @classmethod
+    async def stop(cls):
+        if cls._task is not None:
+            cls._shutdown.set()
+            try:
+                await asyncio.wait_for(cls._task, timeout=5)
+            except Exception:
+                cls._task.cancel()
+        cls._task, cls._shutdown = None, None
+
+
+class AltSvcMiddleware:
+    """Pure ASGI middleware advertising the HTTP/3 listener on TCP responses"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("http_version") == "3":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and Http3Service.running():
+                headers = list(message.get("headers", []))
+                headers.append((b"alt-svc", Http3Service.alt_svc().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,697 @@
+import os
+import re
+import json
+import time
+import base64
+import hashlib
+import sqlite3
+import asyncio
+import logging
+import mimetypes
+import threading
+from typing import List, Optional
+from core.config import UPLOAD_DIR
+
+
+class IndexService:
+    """
+    SQLite catalog of every entry list_files can show: the top level of
+    SAVE_PATH/<device> (received) and UPLOAD_DIR/<session>/outgoing (sent).
+
+    Rows are written by the upload/delete paths as they happen and the
+    catalog is reconciled against disk infrequently, so searching never
+    needs a directory scan. Filenames are full-text indexed with FTS5 when
+    the SQLite build has it (LIKE matching otherwise).
+
+    Separately, the full trees of device folders are cached for sync
+    manifests (tree_dirs/tree_files), validated by folder mtimes.
+    """
+
+    DB_FILE = os.path.join(UPLOAD_DIR, ".metadata", "index.db")
+    EXIF_EXTENSIONS = [".jpg", ".jpeg", ".tif", ".tiff", ".webp", ".heic"]
+    SORT_FIELDS = {
+        "name": "name COLLATE NOCASE",
+        "size": "size",
+        "mtime": "mtime",
+        "exif_date": "COALESCE(exif_date, mtime)",
+    }
+    TYPE_PREFIXES = {
+        "image": "image/",
+        "video": "video/",
+        "audio": "audio/",
+        "text": "text/",
+        "application": "application/",
+    }
+    MAX_PAGE = 500
+    HASH_BUDGET = 512 * 1024 * 1024  # Host bytes one manifest may hash
+    MTIME_TOLERANCE = 2.0  # Seconds; FAT and some network filesystems round mtimes
+    RACY_WINDOW = 2.0  # Folders changed this recently are always listed again
+    HASH_CHUNK = 1024 * 1024
+
+    _conn: sqlite3.Connection = None
+    _lock = threading.Lock()
+    _fts = False
+
+    # --- Connection ---
+
+    @classmethod
+    def _db(cls) -> sqlite3.Connection:
+        if cls._conn is None:
+            os.makedirs(os.path.dirname(cls.DB_FILE), exist_ok=True)
+            conn = sqlite3.connect(cls.DB_FILE, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    direction TEXT NOT NULL,
+                    is_dir INTEGER NOT NULL DEFAULT 0,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    mtime REAL NOT NULL,
+                    mime TEXT,
+                    exif_date REAL
+                );
+                CREATE INDEX IF NOT EXISTS files_folder
+                    ON files (direction, folder);
+                CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime);
+                CREATE TABLE IF NOT EXISTS tree_dirs (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS tree_dirs_parent ON tree_dirs (parent);
+                CREATE TABLE IF NOT EXISTS tree_files (
+                    dir TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    hash TEXT,
+                    PRIMARY KEY (dir, name)
+                );
+                """)
+            try:
+                conn.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                        name, folder, content='files', content_rowid='rowid'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+                        INSERT INTO files_fts (rowid, name, folder)
+                        VALUES (new.rowid, new.name, new.folder);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+                        INSERT INTO files_fts (files_fts, rowid, name, folder)
+                        VALUES ('delete', old.rowid, old.name, old.folder);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE ON files BEGIN
+                        INSERT INTO files_fts (files_fts, rowid, name, folder)
+                        VALUES ('delete', old.rowid, old.name, old.folder);
+                        INSERT INTO files_fts (rowid, name, folder)
+                        VALUES (new.rowid, new.name, new.folder);
+                    END;
+                    """)
+                cls._fts = True
+            except sqlite3.OperationalError:
+                logging.warning("SQLite has no FTS5; search falls back to LIKE")
+            conn.commit()
+            cls._conn = conn
+        return cls._conn
+
+    # --- Row helpers ---
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normpath(os.path.abspath(path))
+
+    @staticmethod
+    def _read_exif_date(path: str) -> Optional[float]:
+        try:
+            from PIL import Image
+
+            with Image.open(path) as img:
+                exif = img.getexif()
+                # DateTimeOriginal lives in the Exif IFD; DateTime in IFD0
+                value = exif.get_ifd(0x8769).get(36867) or exif.get(306)
+            if value:
+                return time.mktime(time.strptime(value.strip(), "%Y:%m:%d %H:%M:%S"))
+        except Exception:
+            pass
+        return None
+
+    @classmethod
+    def _entry(cls, path: str, folder: str, direction: str, st=None) -> dict:
+        st = st or os.stat(path)
+        is_dir = os.path.isdir(path)
+        name = os.path.basename(path)
+        exif_date = None
+        if not is_dir and os.path.splitext(name)[1].lower() in cls.EXIF_EXTENSIONS:
+            exif_date = cls._read_exif_date(path)
+        return {
+            "path": cls._key(path),
+            "name": name,
+            "folder": folder,
+            "direction": direction,
+            "is_dir": int(is_dir),
+            "size": 0 if is_dir else st.st_size,
+            "mtime": st.st_mtime,
+            "mime": None if is_dir else mimetypes.guess_type(name)[0],
+            "exif_date": exif_date,
+        }
+
+    @classmethod
+    def _upsert(cls, conn, entries: List[dict]):
+        conn.executemany(
+            """
+            INSERT INTO files
+                (path, name, folder, direction, is_dir, size, mtime, mime, exif_date)
+            VALUES
+                (:path, :name, :folder, :direction, :is_dir, :size, :mtime, :mime,
+                 :exif_date)
+            ON CONFLICT(path) DO UPDATE SET
+                size = excluded.size, mtime = excluded.mtime,
+                mime = excluded.mime, exif_date = excluded.exif_date,
+                is_dir = excluded.is_dir
+            """,
+            entries,
+        )
+
+    # --- Write path ---
+
+    @classmethod
+    def add_files(cls, items: List[tuple]):
+        """Indexes (path, folder, direction) items in one transaction"""
+        entries = []
+        for path, folder, direction in items:
+            try:
+                entries.append(cls._entry(path, folder, direction))
+            except OSError:
+                continue
+        with cls._lock:
+            conn = cls._db()
+            cls._upsert(conn, entries)
+            conn.commit()
+
+    @classmethod
+    async def add_files_async(cls, items: List[tuple]):
+        """add_files off the event loop (EXIF reads touch the disk)"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, cls.add_files, items)
+
+    @classmethod
+    def remove(cls, *paths: str):
+        """Drops each path and, if it was a folder root, everything below it"""
+        rows = []
+        for path in paths:
+            key = cls._key(path)
+            # [key/, key0) is exactly the subtree, and a range on the primary
+            # key is an index seek where LIKE would scan the whole table
+            rows.append((key, key + os.sep, key + chr(ord(os.sep) + 1)))
+        with cls._lock:
+            conn = cls._db()
+            conn.executemany(
+                "DELETE FROM files WHERE path = ? OR (path >= ? AND path < ?)", rows
+            )
+            conn.commit()
+
+    @classmethod
+    async def remove_async(cls, paths: List[str]):
+        """remove off the event loop, in one transaction"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: cls.remove(*paths))
+
+    @staticmethod
+    def _escape_like(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    # --- Reconciliation ---
+
+    @classmethod
+    def _scan(cls, upload_dir: str, save_path: str) -> dict:
+        """Blocking: stats the top level of every transfer folder"""
+        found = {}
+
+        def scan(directory, folder, direction):
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                return
+            for f in names:
+                if f.endswith(".tmp") or f.startswith("."):
+                    continue
+                path = os.path.join(directory, f)
+                try:
+                    found[cls._key(path)] = (path, folder, direction, os.stat(path))
+                except OSError:
+                    continue
+
+        if os.path.isdir(save_path):
+            for d in os.listdir(save_path):
+                path = os.path.join(save_path, d)
+                if os.path.isdir(path) and not d.startswith("."):
+                    scan(path, d, "received")
+        if os.path.isdir(upload_dir):
+            for d in os.listdir(upload_dir):
+                path = os.path.join(upload_dir, d, "outgoing")
+                if os.path.isdir(path):
+                    scan(path, d, "sent")
+        return found
+
+    @classmethod
+    def _apply_scan(cls, found: dict, started: float) -> tuple:
+        """Blocking: diffs a scan against the catalog and applies it"""
+        with cls._lock:
+            conn = cls._db()
+            known = {
+                row["path"]: (row["size"], row["mtime"])
+                for row in conn.execute("SELECT path, size, mtime FROM files")
+            }
+
+        changed = []
+        for key, (path, folder, direction, st) in found.items():
+            size = 0 if os.path.isdir(path) else st.st_size
+            if known.get(key) != (size, st.st_mtime):
+                try:
+                    changed.append(cls._entry(path, folder, direction, st))
+                except OSError:
+                    continue
+        # Rows written after the scan started are newer than the scan
+        gone = [
+            key for key, (_, mtime) in known.items()
+            if key not in found and mtime < started
+        ]  # fmt: skip
+
+        with cls._lock:
+            conn = cls._db()
+            cls._upsert(conn, changed)
+            conn.executemany("DELETE FROM files WHERE path = ?", [(k,) for k in gone])
+            conn.commit()
+        return len(changed), len(gone)
+
+    @classmethod
+    async def reconcile(cls, upload_dir: str, save_path: str):
+        started = time.time()
+        loop = asyncio.get_running_loop()
+        found = await loop.run_in_executor(None, cls._scan, upload_dir, save_path)
+        changed, gone = await loop.run_in_executor(
+            None, cls._apply_scan, found, started
+        )
+        logging.info(
+            f"Index: reconciled {len(found)} entries ({changed} updated, {gone} removed)"
+        )
+
+    # --- Queries ---
+
+    @classmethod
+    def _match_expr(cls, q: str) -> str:
+        # Every word must prefix-match a token of the name or folder
+        terms = re.findall(r"\w+", q)
+        return " ".join(f'"{t}"*' for t in terms)
+
+    @classmethod
+    def _build_filters(
+        cls,
+        q: str = None,
+        device: str = None,
+        direction: str = None,
+        file_type: str = None,
+        since: float = None,
+        session_id: str = None,
+        session_device: str = None,
+    ):
+        where, params = [], []
+        if q:
+            if cls._fts:
+                match = cls._match_expr(q)
+                if match:
+                    where.append(
+                        "rowid IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)"
+                    )
+                    params.append(match)
+            else:
+                where.append("name LIKE ? ESCAPE '\\'")
+                params.append(f"%{cls._escape_like(q)}%")
+        if device:
+            where.append("folder = ?")
+            params.append(device)
+        if direction:
+            where.append("direction = ?")
+            params.append(direction)
+        if file_type:
+            if file_type == "folder":
+                where.append("is_dir = 1")
+            elif file_type in cls.TYPE_PREFIXES:
+                where.append("mime LIKE ?")
+                params.append(cls.TYPE_PREFIXES[file_type] + "%")
+            else:
+                where.append("mime IS NULL AND is_dir = 0")
+        if since:
+            where.append("mtime >= ?")
+            params.append(since)
+        if session_id:
+            # A device only sees its own received folder and its outgoing files
+            where.append(
+                "((direction = 'received' AND folder = ?) "
+                "OR (direction = 'sent' AND folder = ?))"
+            )
+            params.extend([session_device or "", session_id])
+        return where, params
+
+    @classmethod
+    def _to_item(cls, row) -> dict:
+        from services.thumbnail_service import ThumbnailService
+
+        has_thumb = False
+        if not row["is_dir"]:
+            has_thumb = os.path.exists(ThumbnailService.get_thumbnail_path(row["path"]))
+        return {
+            "name": row["name"],
+            "size": row["size"],
+            "modified": row["mtime"],
+            "direction": row["direction"],
+            "session_id": row["folder"],
+            "is_dir": bool(row["is_dir"]),
+            "has_thumbnail": has_thumb,
+            "mime": row["mime"],
+            "exif_date": row["exif_date"],
+        }
+
+    @staticmethod
+    def _encode_cursor(value, rowid: int) -> str:
+        raw = json.dumps([value, rowid], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            value, rowid = json.loads(base64.urlsafe_b64decode(padded))
+            return value, int(rowid)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid cursor")
+
+    @classmethod
+    def list_page(
+        cls,
+        cursor: str = None,
+        sort: str = "name",
+        order: str = "asc",
+        limit: int = 100,
+        q: str = None,
+        **filters,
+    ) -> dict:
+        """
+        Keyset-paginated listing: the cursor carries the last row's sort key
+        and rowid, so each page costs the same no matter how deep it is.
+        """
+        where, params = cls._build_filters(q, **filters)
+        sort_expr = cls.SORT_FIELDS.get(sort, cls.SORT_FIELDS["name"])
+        ascending = order != "desc"
+        limit = max(1, min(limit, cls.MAX_PAGE))
+        if cursor:
+            value, rowid = cls._decode_cursor(cursor)
+            where.append(f"({sort_expr}, rowid) {'>' if ascending else '<'} (?, ?)")
+            params.extend([value, rowid])
+
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        direction = "ASC" if ascending else "DESC"
+        sort_value = sort_expr.replace(" COLLATE NOCASE", "")
+        with cls._lock:
+            conn = cls._db()
+            rows = conn.execute(
+                f"SELECT *, rowid, {sort_value} AS sort_key FROM files {clause} "
+                f"ORDER BY {sort_expr} {direction}, rowid {direction} LIMIT ?",
+                [*params, limit + 1],
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = cls._encode_cursor(rows[-1]["sort_key"], rows[-1]["rowid"])
+        return {
+            "items": [cls._to_item(row) for row in rows],
+            "next_cursor": next_cursor,
+        }
+
+    @classmethod
+    def search(
+        cls,
+        q: str = None,
+        sort: str = "mtime",
+        order: str = "desc",
+        limit: int = 50,
+        offset: int = 0,
+        **filters,
+    ) -> dict:
+        """Filtered, sorted, paginated query over the catalog"""
+        where, params = cls._build_filters(q, **filters)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        sort_expr = cls.SORT_FIELDS.get(sort, cls.SORT_FIELDS["mtime"])
+        direction = "ASC" if order == "asc" else "DESC"
+        limit = max(1, min(limit, cls.MAX_PAGE))
+        offset = max(offset, 0)
+
+        with cls._lock:
+            conn = cls._db()
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM files {clause}", params
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM files {clause} "
+                f"ORDER BY {sort_expr} {direction}, path {direction} "
+                f"LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+
+        next_offset = offset + len(rows)
+        return {
+            "total": total,
+            "items": [cls._to_item(row) for row in rows],
+            "next_offset": next_offset if next_offset < total else None,
+        }
+
+    # --- Sync manifests ---
+
+    @classmethod
+    def _list_dir(cls, conn, directory: str, mtime_ns: int) -> List[str]:
+        """Re-reads one folder into the tree cache; returns its subfolders"""
+        files, subdirs = [], []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif not entry.name.endswith(".tmp"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    files.append((directory, entry.name, st.st_size, st.st_mtime))
+
+        # A cached hash survives only while the size and mtime do
+        conn.executemany(
+            """
+            INSERT INTO tree_files (dir, name, size, mtime) VALUES (?, ?, ?, ?)
+            ON CONFLICT(dir, name) DO UPDATE SET
+                hash = CASE WHEN size = excluded.size AND mtime = excluded.mtime
+                       THEN hash END,
+                size = excluded.size, mtime = excluded.mtime
+            """,
+            files,
+        )
+        names = {f[1] for f in files}
+        conn.executemany(
+            "DELETE FROM tree_files WHERE dir = ? AND name = ?",
+            [
+                (directory, row[0])
+                for row in conn.execute(
+                    "SELECT name FROM tree_files WHERE dir = ?", (directory,)
+                )
+                if row[0] not in names
+            ],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO tree_dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+            (directory, os.path.dirname(directory), mtime_ns),
+        )
+        return subdirs
+
+    @classmethod
+    def update_tree(cls, *paths: str):
+        """
+        Write-path hook for the sync tree cache: re-reads each file's size
+        and mtime, or forgets it (and anything below it) once it is gone.
+        Rewriting a file in place doesn't move its folder's mtime, so this
+        is what lets diff_manifest answer from the cache. Folders not cached
+        yet are skipped; they are listed in full on first use.
+        """
+        files, gone = [], []
+        for path in paths:
+            key = cls._key(path)
+            folder, name = os.path.split(key)
+            try:
+                st = os.stat(key)
+            except OSError:
+                below = (key + os.sep, key + chr(ord(os.sep) + 1))
+                gone.append((folder, name, key, *below))
+                continue
+            if os.path.isdir(key) or name.startswith(".") or name.endswith(".tmp"):
+                continue
+            files.append((folder, name, st.st_size, st.st_mtime, folder))
+        if not files and not gone:
+            return
+        with cls._lock:
+            conn = cls._db()
+            conn.executemany(
+                """
+                INSERT INTO tree_files (dir, name, size, mtime)
+                SELECT ?, ?, ?, ? WHERE EXISTS (
+                    SELECT 1 FROM tree_dirs WHERE path = ?
+                )
+                ON CONFLICT(dir, name) DO UPDATE SET
+                    hash = CASE WHEN size = excluded.size AND mtime = excluded.mtime
+                           THEN hash END,
+                    size = excluded.size, mtime = excluded.mtime
+                """,
+                files,
+            )
+            conn.executemany(
+                "DELETE FROM tree_files WHERE (dir = ? AND name = ?) "
+                "OR dir = ? OR (dir >= ? AND dir < ?)",
+                gone,
+            )
+            conn.executemany(
+                "DELETE FROM tree_dirs WHERE path = ? OR (path >= ? AND path < ?)",
+                [g[2:] for g in gone],
+            )
+            conn.commit()
+
+    @classmethod
+    async def update_tree_async(cls, paths: List[str]):
+        """update_tree off the event loop, in one transaction"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: cls.update_tree(*paths))
+
+    @classmethod
+    def _refresh_tree(cls, conn, root: str):
+        """
+        Blocking, under the lock. Brings the cached tree under root up to
+        date. Adding, removing or renaming an entry bumps its folder's mtime
+        (uploads always rename into place), so only folders whose mtime
+        moved are listed again; an unchanged library costs a stat per folder.
+        Editing a file in place leaves its folder alone; the write paths
+        report those through update_tree.
+        """
+        like = (root, cls._escape_like(root + os.sep) + "%")
+        cached = dict(
+            conn.execute(
+                "SELECT path, mtime_ns FROM tree_dirs "
+                "WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                like,
+            ).fetchall()
+        )
+        racy = time.time_ns() - int(cls.RACY_WINDOW * 1e9)
+        seen, stack = set(), [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                # Stat before listing: a change mid-listing shows up next time
+                mtime_ns = os.stat(directory).st_mtime_ns
+                if cached.get(directory) == mtime_ns and mtime_ns < racy:
+                    subdirs = [
+                        row[0]
+                        for row in conn.execute(
+                            "SELECT path FROM tree_dirs WHERE parent = ?", (directory,)
+                        )
+                    ]
+                else:
+                    subdirs = cls._list_dir(conn, directory, mtime_ns)
+            except OSError:
+                continue
+            seen.add(directory)
+            stack.extend(subdirs)
+
+        gone = [(d,) for d in cached if d not in seen]
+        conn.executemany("DELETE FROM tree_dirs WHERE path = ?", gone)
+        conn.executemany("DELETE FROM tree_files WHERE dir = ?", gone)
+        conn.commit()
+
+    @classmethod
+    def _hash_file(cls, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(cls.HASH_CHUNK):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def diff_manifest(cls, root: str, entries: List[tuple]) -> dict:
+        """
+        Blocking. Compares a client manifest of (path, rel, size, mtime,
+        sha256 or None) against the files under root, where rel is path as
+        it would be stored. Returns the client paths the host is missing
+        and those it holds a different copy of, answered from the tree
+        cache. When sizes match but mtimes don't, a client hash settles it:
+        the host side is hashed lazily and cached, up to HASH_BUDGET bytes
+        per call. Past that, entries count as changed (the answer a manifest
+        without hashes gets) and later calls pick up where this one stopped.
+        """
+        root = cls._key(root)
+        with cls._lock:
+            conn = cls._db()
+            cls._refresh_tree(conn, root)
+            known = {
+                os.path.relpath(os.path.join(row["dir"], row["name"]), root): row
+                for row in conn.execute(
+                    "SELECT * FROM tree_files WHERE dir = ? OR dir LIKE ? ESCAPE '\\'",
+                    (root, cls._escape_like(root + os.sep) + "%"),
+                )
+            }
+
+        missing, changed, hashed = [], [], []
+        budget = cls.HASH_BUDGET
+        for path, rel, size, mtime, digest in entries:
+            row = known.get(rel)
+            if row is None:
+                missing.append(path)
+            elif row["size"] != size:
+                changed.append(path)
+            elif abs(row["mtime"] - mtime) <= cls.MTIME_TOLERANCE:
+                continue
+            elif digest is None:
+                changed.append(path)
+            else:
+                if row["hash"] is None:
+                    if row["size"] > budget:
+                        changed.append(path)
+                        continue
+                    full = os.path.join(row["dir"], row["name"])
+                    try:
+                        st = os.stat(full)
+                        if (st.st_size, st.st_mtime) != (row["size"], row["mtime"]):
+                            raise OSError("changed since listed")
+                        row = {**row, "hash": cls._hash_file(full)}
+                    except OSError:
+                        changed.append(path)
+                        continue
+                    budget -= row["size"]
+                    hashed.append((row["hash"], row["dir"], row["name"], row["mtime"]))
+                if row["hash"] != digest.lower():
+                    changed.append(path)
+
+        if hashed:
+            with cls._lock:
+                conn = cls._db()
+                conn.executemany(
+                    "UPDATE tree_files SET hash = ? "
+                    "WHERE dir = ? AND name = ? AND mtime = ?",
+                    hashed,
+                )
+                conn.commit()
+        return {
+            "missing": missing,
+            "changed": changed,
+            "unchanged": len(entries) - len(missing) - len(changed),
+        }
@@ -0,0 +1,564 @@
+import os
+import sys
+import mmap
+import ctypes
+import asyncio
+import logging
+import platform
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+from core.config import IO_BACKEND, WRITER_THREADS
+
+
+def _pread(fd: int, size: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    os.lseek(fd, offset, os.SEEK_SET)  # Windows: one request per fd at a time
+    return os.read(fd, size)
+
+
+def _pwrite_all(fd: int, data, offset: int) -> int:
+    view = memoryview(data)
+    total = len(view)
+    while view:
+        if hasattr(os, "pwrite"):
+            n = os.pwrite(fd, view, offset)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            n = os.write(fd, view)
+        view, offset = view[n:], offset + n
+    return total
+
+
+class ThreadFileIO:
+    """
+    Default backend: every call is the blocking os.* call, run on a
+    dedicated thread pool. Works everywhere.
+    """
+
+    name = "threads"
+
+    def __init__(self, threads: int = WRITER_THREADS):
+        self._executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="file-io"
+        )
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def open(self, path: str, flags: int, mode: int = 0o644) -> int:
+        return await self._run(os.open, path, flags, mode)
+
+    async def pread(self, fd: int, size: int, offset: int) -> bytes:
+        return await self._run(_pread, fd, size, offset)
+
+    async def pwrite(self, fd: int, data, offset: int) -> int:
+        """Writes all of data at offset"""
+        return await self._run(_pwrite_all, fd, data, offset)
+
+    async def fsync(self, fd: int):
+        await self._run(os.fsync, fd)
+
+    async def fallocate(self, fd: int, offset: int, length: int):
+        await self._run(os.posix_fallocate, fd, offset, length)
+
+    async def ftruncate(self, fd: int, length: int):
+        await self._run(os.ftruncate, fd, length)
+
+    async def close(self, fd: int):
+        await self._run(os.close, fd)
+
+    def read_blocks(self, path: str, size: int, depth: int = 4) -> Iterator[bytes]:
+        """Blocking: the file as non-empty blocks of size (the last may be short)"""
+        with open(path, "rb") as f:
+            while block := f.read(size):
+                yield block
+
+
+# --- io_uring (Linux 5.6+, raw syscalls through ctypes) ---
+
+SYS_IO_URING_SETUP = 425  # x86_64 numbers
+SYS_IO_URING_ENTER = 426
+SYS_IO_URING_REGISTER = 427
+IORING_OFF_SQ_RING = 0
+IORING_OFF_CQ_RING = 0x8000000
+IORING_OFF_SQES = 0x10000000
+IORING_FEAT_SINGLE_MMAP = 1 << 0
+IORING_ENTER_GETEVENTS = 1 << 0
+IORING_SQ_CQ_OVERFLOW = 1 << 1
+IORING_REGISTER_EVENTFD = 4
+AT_FDCWD = -100
+
+IORING_OP_FSYNC = 3
+IORING_OP_FALLOCATE = 17
+IORING_OP_OPENAT = 18
+IORING_OP_CLOSE = 19
+IORING_OP_READ = 22
+IORING_OP_WRITE = 23
+IORING_OP_FTRUNCATE = 55  # Linux 6.9+
+
+
+class _SQOffsets(ctypes.Structure):
+    _fields_ = [
+        (n, ctypes.c_uint32)
+        for n in ("head", "tail", "ring_mask", "ring_entries", "flags", "dropped")
+    ] + [
+        ("array", ctypes.c_uint32),
+        ("resv1", ctypes.c_uint32),
+        ("user_addr", ctypes.c_uint64),
+    ]
+
+
+class _CQOffsets(ctypes.Structure):
+    _fields_ = [
+        (n, ctypes.c_uint32)
+        for n in ("head", "tail", "ring_mask", "ring_entries", "overflow", "cqes")
+    ] + [
+        ("flags", ctypes.c_uint32),
+        ("resv1", ctypes.c_uint32),
+        ("user_addr", ctypes.c_uint64),
+    ]
+
+
+class _Params(ctypes.Structure):
+    _fields_ = [
+        (n, ctypes.c_uint32)
+        for n in (
+            "sq_entries",
+            "cq_entries",
+            "flags",
+            "sq_thread_cpu",
+            "sq_thread_idle",
+            "features",
+            "wq_fd",
+        )
+    ] + [
+        ("resv", ctypes.c_uint32 * 3),
+        ("sq_off", _SQOffsets),
+        ("cq_off", _CQOffsets),
+    ]
+
+
+class _SQE(ctypes.Structure):
+    _fields_ = [
+        ("opcode", ctypes.c_uint8),
+        ("flags", ctypes.c_uint8),
+        ("ioprio", ctypes.c_uint16),
+        ("fd", ctypes.c_int32),
+        ("off", ctypes.c_uint64),
+        ("addr", ctypes.c_uint64),
+        ("len", ctypes.c_uint32),
+        ("op_flags", ctypes.c_uint32),
+        ("user_data", ctypes.c_uint64),
+        ("buf_index", ctypes.c_uint16),
+        ("personality", ctypes.c_uint16),
+        ("splice_fd_in", ctypes.c_int32),
+        ("addr3", ctypes.c_uint64),
+        ("pad", ctypes.c_uint64),
+    ]
+
+
+class _CQE(ctypes.Structure):
+    _fields_ = [
+        ("user_data", ctypes.c_uint64),
+        ("res", ctypes.c_int32),
+        ("flags", ctypes.c_uint32),
+    ]
+
+
+_libc = None
+
+
+def _syscall(number: int, *args) -> int:
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.syscall.restype = ctypes.c_long
+    while True:
+        res = _libc.syscall(ctypes.c_long(number), *(ctypes.c_long(a) for a in args))
+        if res >= 0:
+            return res
+        err = ctypes.get_errno()
+        if err != 4:  # EINTR
+            raise OSError(err, os.strerror(err))
+
+
+def _address(data, keep: list) -> int:
+    """Address of a bytes-like object's memory, without copying if possible"""
+    if isinstance(data, bytes):
+        keep.append(data)
+        return ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value
+    view = memoryview(data).cast("B")
+    if view.readonly:
+        view = memoryview(bytearray(view))
+    buf = (ctypes.c_char * view.nbytes).from_buffer(view)
+    keep.append(buf)
+    return ctypes.addressof(buf)
+
+
+class _Ring:
+    """One io_uring instance: submission/completion rings mapped into memory"""
+
+    def __init__(self, entries: int):
+        params = _Params()
+        self.fd = _syscall(SYS_IO_URING_SETUP, entries, ctypes.addressof(params))
+        try:
+            sq, cq = params.sq_off, params.cq_off
+            sq_size = sq.array + params.sq_entries * 4
+            cq_size = cq.cqes + params.cq_entries * ctypes.sizeof(_CQE)
+            if params.features & IORING_FEAT_SINGLE_MMAP:
+                sq_size = cq_size = max(sq_size, cq_size)
+            self._maps = [self._map(sq_size, IORING_OFF_SQ_RING)]
+            if params.features & IORING_FEAT_SINGLE_MMAP:
+                cq_map = self._maps[0]
+            else:
+                cq_map = self._map(cq_size, IORING_OFF_CQ_RING)
+                self._maps.append(cq_map)
+            sqe_map = self._map(params.sq_entries * 64, IORING_OFF_SQES)
+            self._maps.append(sqe_map)
+        except Exception:
+            os.close(self.fd)
+            raise
+
+        ring = self._maps[0]
+        self.entries = params.sq_entries
+        self._sq_head = ctypes.c_uint32.from_buffer(ring, sq.head)
+        self._sq_tail = ctypes.c_uint32.from_buffer(ring, sq.tail)
+        self._sq_flags = ctypes.c_uint32.from_buffer(ring, sq.flags)
+        self._sq_mask = ctypes.c_uint32.from_buffer(ring, sq.ring_mask).value
+        array = (ctypes.c_uint32 * params.sq_entries).from_buffer(ring, sq.array)
+        for i in range(params.sq_entries):
+            array[i] = i  # Slot i always holds SQE i
+        del array
+        self._sqes = (_SQE * params.sq_entries).from_buffer(sqe_map)
+        self._cq_head = ctypes.c_uint32.from_buffer(cq_map, cq.head)
+        self._cq_tail = ctypes.c_uint32.from_buffer(cq_map, cq.tail)
+        self._cq_mask = ctypes.c_uint32.from_buffer(cq_map, cq.ring_mask).value
+        self._cqes = (_CQE * params.cq_entries).from_buffer(cq_map, cq.cqes)
+        self.unsubmitted = 0
+
+    def _map(self, size: int, offset: int) -> mmap.mmap:
+        return mmap.mmap(
+            self.fd,
+            size,
+            flags=mmap.MAP_SHARED,
+            prot=mmap.PROT_READ | mmap.PROT_WRITE,
+            offset=offset,
+        )
+
+    def space(self) -> int:
+        return self.entries - (self._sq_tail.value - self._sq_head.value) % (1 << 32)
+
+    def prep(self, opcode, fd, addr=0, length=0, offset=0, op_flags=0, user_data=0):
+        tail = self._sq_tail.value
+        sqe = self._sqes[tail & self._sq_mask]
+        ctypes.memset(ctypes.addressof(sqe), 0, 64)
+        sqe.opcode = opcode
+        sqe.fd = fd
+        sqe.addr = addr
+        sqe.len = length
+        sqe.off = offset
+        sqe.op_flags = op_flags
+        sqe.user_data = user_data
+        self._sq_tail.value = (tail + 1) & 0xFFFFFFFF
+        self.unsubmitted += 1
+
+    def submit(self, wait: int = 0) -> int:
+        if not self.unsubmitted and not wait:
+            return 0
+        flags = IORING_ENTER_GETEVENTS if wait else 0
+        n = _syscall(SYS_IO_URING_ENTER, self.fd, self.unsubmitted, wait, flags, 0, 0)
+        self.unsubmitted -= n
+        return n
+
+    def reap(self) -> list:
+        """Completed (user_data, res) pairs"""
+        done = []
+        head, tail = self._cq_head.value, self._cq_tail.value
+        while head != tail:
+            cqe = self._cqes[head & self._cq_mask]
+            done.append((cqe.user_data, cqe.res))
+            head = (head + 1) & 0xFFFFFFFF
+        self._cq_head.value = head
+        if self._sq_flags.value & IORING_SQ_CQ_OVERFLOW:
+            # Completions the CQ had no room for are handed over on enter
+            _syscall(SYS_IO_URING_ENTER, self.fd, 0, 0, IORING_ENTER_GETEVENTS, 0, 0)
+            done.extend(self.reap())
+        return done
+
+    def register_eventfd(self, efd: int):
+        value = ctypes.c_int32(efd)
+        _syscall(
+            SYS_IO_URING_REGISTER,
+            self.fd,
+            IORING_REGISTER_EVENTFD,
+            ctypes.addressof(value),
+            1,
+        )
+
+    def close(self):
+        # Views into the maps must go before the maps can be closed
+        del self._sq_head, self._sq_tail, self._sq_flags, self._sqes
+        del self._cq_head, self._cq_tail, self._cqes
+        for m in self._maps:
+            m.close()
+        os.close(self.fd)
+
+
+class UringFileIO:
+    """
+    io_uring backend. Requests from every task go into one ring per event
+    loop and are submitted together once per loop iteration (one syscall
+    for the lot); completions arrive through an eventfd the loop watches,
+    so no thread hand-off is involved. Buffered file I/O that would block
+    is finished by the kernel's own workers.
+    """
+
+    name = "io_uring"
+    ENTRIES = 256
+    # The ring head/tail are read and written as plain ctypes loads and
+    # stores, with no acquire/release barriers. That is only sound on x86's
+    # strongly ordered memory model, so other CPUs fall back to threads.
+    ARCHITECTURES = ("x86_64", "amd64")
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("io_uring needs Linux")
+        if platform.machine().lower() not in self.ARCHITECTURES:
+            raise OSError(f"io_uring syscalls not mapped for {platform.machine()}")
+        if not hasattr(os, "eventfd"):
+            raise OSError("io_uring completions need os.eventfd (Python 3.10+)")
+        _Ring(2).close()  # Fails early on old kernels and seccomp filters
+        self._loop = None
+        self._local = threading.local()
+        self._no_ftruncate = False
+
+    # --- Event loop side ---
+
+    def _attach(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return loop
+        self._detach()
+        self._ring = _Ring(self.ENTRIES)
+        self._efd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        self._ring.register_eventfd(self._efd)
+        loop.add_reader(self._efd, self._complete)
+        self._loop = loop
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._slots = asyncio.Semaphore(self.ENTRIES)
+        self._flush_scheduled = False
+        return loop
+
+    def _detach(self):
+        if self._loop is None:
+            return
+        try:
+            self._loop.remove_reader(self._efd)
+        except Exception:
+            pass  # The old loop is already closed
+        os.close(self._efd)
+        # Requests still in flight would write into freed buffers otherwise
+        while self._pending:
+            self._ring.submit(wait=1)
+            for user_data, _ in self._ring.reap():
+                self._pending.pop(user_data, None)
+        self._ring.close()
+        self._loop = None
+
+    def _flush(self):
+        self._flush_scheduled = False
+        try:
+            self._ring.submit()
+        except OSError as e:  # EAGAIN/EBUSY: the kernel is short on resources
+            logging.debug(f"io_uring submit deferred: {e}")
+        if self._ring.unsubmitted:
+            self._flush_scheduled = True
+            self._loop.call_later(0.001, self._flush)
+
+    def _complete(self):
+        try:
+            os.eventfd_read(self._efd)
+        except BlockingIOError:
+            pass
+        for user_data, res in self._ring.reap():
+            future, _ = self._pending.pop(user_data, (None, None))
+            if future is not None and not future.done():
+                future.set_result(res)
+
+    async def _op(self, opcode, fd, addr=0, length=0, offset=0, op_flags=0, keep=None):
+        loop = self._attach()
+        async with self._slots:
+            if not self._ring.space():
+                self._ring.submit()
+            user_data = next(self._ids)
+            future = loop.create_future()
+            # keep pins buffers until the kernel is done with them, even if
+            # the awaiting task is cancelled first
+            self._pending[user_data] = (future, keep)
+            self._ring.prep(opcode, fd, addr, length, offset, op_flags, user_data)
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                loop.call_soon(self._flush)
+            res = await future
+        if res < 0:
+            raise OSError(-res, os.strerror(-res))
+        return res
+
+    async def open(self, path: str, flags: int, mode: int = 0o644) -> int:
+        keep = []
+        addr = _address(os.fsencode(path) + b"\0", keep)
+        return await self._op(
+            IORING_OP_OPENAT,
+            AT_FDCWD,
+            addr,
+            mode,
+            op_flags=flags | os.O_CLOEXEC,
+            keep=keep,
+        )
+
+    async def pread(self, fd: int, size: int, offset: int) -> bytes:
+        buf = bytearray(size)
+        keep = []
+        n = await self._op(
+            IORING_OP_READ, fd, _address(buf, keep), size, offset, keep=keep
+        )
+        return bytes(buf) if n == size else bytes(memoryview(buf)[:n])
+
+    async def pwrite(self, fd: int, data, offset: int) -> int:
+        """Writes all of data at offset"""
+        keep = []
+        addr, total, done = _address(data, keep), len(memoryview(data).cast("B")), 0
+        while done < total:
+            done += await self._op(
+                IORING_OP_WRITE,
+                fd,
+                addr + done,
+                total - done,
+                offset + done,
+                keep=keep,
+            )
+        return total
+
+    async def fsync(self, fd: int):
+        await self._op(IORING_OP_FSYNC, fd)
+
+    async def fallocate(self, fd: int, offset: int, length: int):
+        # The mode goes in len and the length in addr
+        await self._op(IORING_OP_FALLOCATE, fd, length, 0, offset)
+
+    async def ftruncate(self, fd: int, length: int):
+        if not self._no_ftruncate:
+            try:
+                return await self._op(IORING_OP_FTRUNCATE, fd, 0, 0, length)
+            except OSError as e:
+                if e.errno != 22:  # EINVAL: opcode unknown before Linux 6.9
+                    raise
+                self._no_ftruncate = True
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, os.ftruncate, fd, length)
+
+    async def close(self, fd: int):
+        await self._op(IORING_OP_CLOSE, fd)
+
+    # --- Blocking side (worker threads) ---
+
+    def read_blocks(self, path: str, size: int, depth: int = 4) -> Iterator[bytes]:
+        """
+        Blocking: the file as non-empty blocks of size, with depth reads
+        queued in the kernel at once (the caller's thread owns a ring).
+        """
+        ring = getattr(self._local, "ring", None)
+        if ring is None or ring.entries < depth:
+            ring = self._local.ring = _Ring(max(depth, 8))
+        fd = os.open(path, os.O_RDONLY)
+        buffers, done, in_flight = {}, {}, 0
+        next_offset = offset = 0
+
+        def queue():
+            nonlocal next_offset, in_flight
+            buf = bytearray(size)
+            keep = []
+            buffers[next_offset] = (buf, keep)
+            ring.prep(
+                IORING_OP_READ,
+                fd,
+                _address(buf, keep),
+                size,
+                next_offset,
+                0,
+                next_offset,
+            )
+            next_offset += size
+            in_flight += 1
+
+        try:
+            while True:
+                while in_flight < depth:
+                    queue()
+                if offset not in done:
+                    ring.submit(wait=1)
+                    for user_data, res in ring.reap():
+                        done[user_data] = res
+                        in_flight -= 1
+                    continue
+                res = done.pop(offset)
+                buf, _ = buffers.pop(offset)
+                if res < 0:
+                    raise OSError(-res, os.strerror(-res))
+                block = bytes(memoryview(buf)[:res])
+                if 0 < res < size:
+                    # Short read before EOF (rare): top it up the plain way
+                    block += _pread(fd, size - res, offset + res)
+                if block:
+                    yield block
+                if len(block) < size:
+                    return
+                offset += size
+        finally:
+            # Drain what is still queued before its buffers can be freed
+            while in_flight:
+                ring.submit(wait=1)
+                in_flight -= len(ring.reap())
+            os.close(fd)
+
+
+class IOBackend:
+    """
+    File I/O used by the upload, download and archive paths:
+    TURBO_IO_BACKEND=threads (default) or io_uring (Linux; falls back to
+    threads when the kernel or a seccomp filter doesn't allow it).
+    """
+
+    NAME = IO_BACKEND
+    THREADS = WRITER_THREADS
+
+    _instance = None
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            cls._instance = cls._create(cls.NAME)
+        return cls._instance
+
+    @classmethod
+    def _create(cls, name: str):
+        if name == "io_uring":
+            try:
+                return UringFileIO()
+            except OSError as e:
+                logging.warning(f"io_uring unavailable ({e}); using threads")
+        elif name != "threads":
+            logging.warning(f"Unknown I/O backend '{name}'; using threads")
+        return ThreadFileIO(cls.THREADS)
+
+    @classmethod
+    def use(cls, name: str):
+        """Switches backends; transfers already running keep the old one"""
+        cls.NAME = name
+        cls._instance = None
+        return cls.get()
@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+from core.config import UPLOAD_DIR, FSYNC_POLICY
+
+
+class JournalService:
+    """
+    Append-only write-ahead journal of transfer jobs (upload, zip,
+    broadcast, delete), one JSON record per line.
+
+    A job is opened with the temp artifacts it is about to create, may be
+    marked committed once its result is durable, and is closed when it
+    finishes or has been rolled back. Whatever is still open at startup was
+    interrupted by a crash and is replayed deterministically:
+
+      upload     roll back: remove its temp file
+      zip        roll back: remove its partial archive
+      broadcast  before commit roll back; after commit roll forward by
+                 re-linking the stored blob into any missing session folder
+      delete     roll forward: remove whatever is still listed
+    """
+
+    JOURNAL_PATH = os.path.join(UPLOAD_DIR, ".metadata", "journal.log")
+    COMPACT_BYTES = 1024 * 1024  # Rewrite the log once it grows past this
+    # Batches are flushed always; fsync'd when uploads are fsync'd too
+    DURABLE = FSYNC_POLICY in ("close", "periodic")
+
+    _jobs: Dict[str, dict] = {}  # Open jobs, rebuilt from the log on replay
+    _lock = threading.Lock()  # Guards the log file
+    _file = None
+    # Group commit: callers queue lines and a writer thread appends (and
+    # fsyncs) whatever has accumulated in one go, off the event loop. Every
+    # line in a batch shares one future, resolved once the batch is on disk.
+    _queue = threading.Condition()
+    _pending: List[str] = []
+    _pending_sync = False
+    _batch: Future = None
+    _queued = 0
+    _written = 0
+    _writer = None
+
+    # --- Log I/O ---
+
+    @classmethod
+    def _open(cls):
+        if cls._file is None:
+            os.makedirs(os.path.dirname(cls.JOURNAL_PATH), exist_ok=True)
+            cls._file = open(cls.JOURNAL_PATH, "a", encoding="utf-8")
+        return cls._file
+
+    @classmethod
+    def _append(cls, record: dict, sync: bool = False) -> Future:
+        """
+        Queues a record; sync asks for an fsync with the batch it lands in.
+        Returns the batch's future, done once the record is written.
+        """
+        record["ts"] = time.time()
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with cls._queue:
+            if cls._batch is None:
+                cls._batch = Future()
+            batch = cls._batch
+            cls._pending.append(line)
+            cls._pending_sync = cls._pending_sync or sync
+            cls._queued += 1
+            if cls._writer is None:
+                cls._writer = threading.Thread(
+                    target=cls._write_loop, name="journal", daemon=True
+                )
+                cls._writer.start()
+            cls._queue.notify_all()
+        return batch
+
+    @classmethod
+    def _write_loop(cls):
+        while True:
+            with cls._queue:
+                while not cls._pending:
+                    cls._queue.wait()
+                lines, sync, batch = cls._pending, cls._pending_sync, cls._batch
+                cls._pending, cls._pending_sync, cls._batch = [], False, None
+            try:
+                with cls._lock:
+                    f = cls._open()
+                    f.write("".join(lines))
+                    f.flush()
+                    if sync and cls.DURABLE:
+                        os.fsync(f.fileno())
+                    if f.tell() > cls.COMPACT_BYTES:
+                        cls._compact()
+                batch.set_result(None)
+            except Exception as e:
+                logging.error(f"Journal: append failed: {e}")
+                batch.set_exception(e)
+            with cls._queue:
+                cls._written += len(lines)
+                cls._queue.notify_all()
+
+    @classmethod
+    def flush(cls, timeout: float = None) -> bool:
+        """Blocks until every record queued so far is written"""
+        with cls._queue:
+            target = cls._queued
+            return cls._queue.wait_for(lambda: cls._written >= target, timeout)
+
+    @classmethod
+    def _compact(cls):
+        """Rewrites the log as one record per open job (lock held)"""
+        tmp = cls.JOURNAL_PATH + ".compact"
+        with open(tmp, "w", encoding="utf-8") as f:
+            # Records still queued replay harmlessly on top of the snapshot
+            for job_id, job in list(cls._jobs.items()):
+                f.write(json.dumps({"op": "snapshot", "job": job_id, **job}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if cls._file is not None:
+            cls._file.close()
+            cls._file = None
+        os.replace(tmp, cls.JOURNAL_PATH)
+
+    # --- Job lifecycle ---
+
+    @classmethod
+    def _begin(
+        cls, kind: str, artifacts: List[str], job_id: str, data: dict
+    ) -> Tuple[str, Future]:
+        job_id = job_id or uuid.uuid4().hex
+        job = {
+            "kind": kind,
+            "artifacts": [os.path.abspath(p) for p in artifacts],
+            "committed": False,
+            "data": data,
+        }
+        cls._jobs[job_id] = job
+        return job_id, cls._append({"op": "begin", "job": job_id, **job}, sync=True)
+
+    @classmethod
+    def begin(
+        cls, kind: str, artifacts: List[str] = (), job_id: str = None, **data
+    ) -> str:
+        """
+        Opens a job before any of its artifacts exist. Blocks until the
+        record is on disk (raises if it could not be written). Returns its id.
+        """
+        job_id, batch = cls._begin(kind, artifacts, job_id, data)
+        batch.result()
+        return job_id
+
+    @classmethod
+    async def begin_async(
+        cls, kind: str, artifacts: List[str] = (), job_id: str = None, **data
+    ) -> str:
+        """begin that waits for its batch without blocking the event loop"""
+        job_id, batch = cls._begin(kind, artifacts, job_id, data)
+        await asyncio.wrap_future(batch)
+        return job_id
+
+    @classmethod
+    def add_artifact(cls, job_id: str, path: str):
+        job = cls._jobs.get(job_id)
+        if job is None:
+            return
+        path = os.path.abspath(path)
+        job["artifacts"].append(path)
+        cls._append({"op": "artifact", "job": job_id, "path": path})
+
+    @classmethod
+    def _commit(cls, job_id: str, data: dict) -> Future:
+        job = cls._jobs.get(job_id)
+        if job is None:
+            done = Future()
+            done.set_result(None)
+            return done
+        job["committed"] = True
+        job["data"].update(data)
+        return cls._append({"op": "commit", "job": job_id, "data": data}, sync=True)
+
+    @classmethod
+    def commit(cls, job_id: str, **data):
+        """
+        Marks the job's result durable; replay now rolls it forward. Blocks
+        until the record is on disk.
+        """
+        cls._commit(job_id, data).result()
+
+    @classmethod
+    async def commit_async(cls, job_id: str, **data):
+        """commit that waits for its batch without blocking the event loop"""
+        await asyncio.wrap_future(cls._commit(job_id, data))
+
+    @classmethod
+    def finish(cls, job_id: str):
+        """Closes a job that completed or was rolled back by its owner"""
+        if cls._jobs.pop(job_id, None) is not None:
+            cls._append({"op": "finish", "job": job_id})
+
+    @classmethod
+    def finish_artifact(cls, path: str):
+        """Closes every job owning path (retention listener for archives)"""
+        path = os.path.abspath(path)
+        for job_id, job in list(cls._jobs.items()):
+            if path in job["artifacts"]:
+                cls.finish(job_id)
+
+    @classmethod
+    def get_jobs(cls) -> dict:
+        return {job_id: dict(job) for job_id, job in cls._jobs.items()}
+
+    # --- Recovery ---
+
+    @classmethod
+    def _read(cls) -> Dict[str, dict]:
+        jobs: Dict[str, dict] = {}
+        if not os.path.exists(cls.JOURNAL_PATH):
+            return jobs
+        with open(cls.JOURNAL_PATH, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn final write from the crash
+                op, job_id = record.get("op"), record.get("job")
+                if op in ("begin", "snapshot"):
+                    jobs[job_id] = {
+                        "kind": record["kind"],
+                        "artifacts": record.get("artifacts", []),
+                        "committed": record.get("committed", False),
+                        "data": record.get("data", {}),
+                    }
+                elif job_id not in jobs:
+                    continue
+                elif op == "artifact":
+                    jobs[job_id]["artifacts"].append(record["path"])
+                elif op == "commit":
+                    jobs[job_id]["committed"] = True
+                    jobs[job_id]["data"].update(record.get("data", {}))
+                elif op == "finish":
+                    del jobs[job_id]
+        return jobs
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.lexists(path):
+                os.remove(path)
+        except OSError as e:
+            logging.error(f"Journal: could not remove {path}: {e}")
+
+    @classmethod
+    def _recover(cls, job: dict):
+        kind, data = job["kind"], job["data"]
+        if kind == "delete":
+            for path in job["artifacts"]:
+                cls._remove(path)
+            return
+        if kind == "broadcast" and job["committed"]:
+            from services.blob_store import BlobStore
+
+            blob = data.get("blob")
+            for session_id in data.get("sessions", []) if blob else []:
+                session_dir = os.path.join(UPLOAD_DIR, session_id)
+                dst = os.path.join(session_dir, "outgoing", data["filename"])
+                if os.path.isdir(session_dir) and not os.path.exists(dst):
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    BlobStore.link(blob, dst)
+        # Everything else (and a broadcast's temp file) is rolled back
+        for path in job["artifacts"]:
+            cls._remove(path)
+
+    @classmethod
+    def replay(cls) -> int:
+        """
+        Resolves every job left open by a previous run, then starts a fresh
+        log. Must run before the server accepts transfers.
+        Returns the number of jobs recovered.
+        """
+        cls.flush()
+        jobs = cls._read()
+        for job_id, job in jobs.items():
+            logging.info(
+                f"Journal: recovering {job['kind']} job {job_id} "
+                f"({'committed' if job['committed'] else 'uncommitted'})"
+            )
+            try:
+                cls._recover(job)
+            except Exception as e:
+                logging.error(f"Journal: recovery of {job_id} failed: {e}")
+        with cls._lock:
+            cls._jobs = {}
+            if os.path.exists(cls.JOURNAL_PATH):
+                cls._compact()
+        return len(jobs)
@@ -1,46 +1,74 @@
 import socket
 import asyncio
-from zeroconf.asyncio import AsyncZeroconf
-from zeroconf import ServiceInfo
 import logging
+from services.network_service import NetworkService
 
 
 class MDNSService:
     _aio_zeroconf = None
     _info = None
+    _port = 8000
+
+    @staticmethod
+    def _fallback_ip(hostname: str) -> str:
+        # Robust IP discovery when no LAN interface is known
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.connect(("10.255.255.255", 1))
+            return s.getsockname()[0]
+        except Exception:
+            return socket.gethostbyname(hostname)
+        finally:
+            s.close()
+
+    @classmethod
+    def _build_info(cls, ips: list):
+        from zeroconf import ServiceInfo
+
+        hostname = socket.gethostname()
+        ips = ips or [cls._fallback_ip(hostname)]
+        return ServiceInfo(
+            "_http._tcp.local.",
+            f"TurboSync Host ({hostname})._http._tcp.local.",
+            addresses=[socket.inet_aton(ip) for ip in ips],
+            port=cls._port,
+            properties={"path": "/"},
+            server=f"{hostname}.local.",
+        )
 
     @classmethod
     async def start(cls, port: int = 8000):
         try:
-            cls._aio_zeroconf = AsyncZeroconf()
-            hostname = socket.gethostname()
+            from zeroconf.asyncio import AsyncZeroconf
 
-            # Robust IP discovery
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            try:
-                s.connect(("10.255.255.255", 1))
-                local_ip = s.getsockname()[0]
-            except Exception:
-                local_ip = socket.gethostbyname(hostname)
-            finally:
-                s.close()
-
-            cls._info = ServiceInfo(
-                "_http._tcp.local.",
-                f"TurboSync Host ({hostname})._http._tcp.local.",
-                addresses=[socket.inet_aton(local_ip)],
-                port=port,
-                properties={"path": "/"},
-                server=f"{hostname}.local.",
-            )
+            cls._port = port
+            cls._aio_zeroconf = AsyncZeroconf()
+            cls._info = cls._build_info(NetworkService.get_ips())
 
             await cls._aio_zeroconf.async_register_service(cls._info)
-            logging.info(f"mDNS Service started: {hostname}.local (IP: {local_ip})")
+            NetworkService.add_listener(cls.update)
+            logging.info(
+                f"mDNS Service started: {cls._info.server} "
+                f"(IPs: {cls._info.parsed_addresses()})"
+            )
         except Exception as e:
             logging.error(f"Failed to start mDNS service: {e}")
 
+    @classmethod
+    async def update(cls, ips: list):
+        """Re-announces the service with every current LAN address"""
+        if not cls._aio_zeroconf or not cls._info:
+            return
+        try:
+            cls._info = cls._build_info(ips)
+            await cls._aio_zeroconf.async_update_service(cls._info)
+            logging.info(f"mDNS Service updated: {cls._info.parsed_addresses()}")
+        except Exception as e:
+            logging.error(f"mDNS Update Error: {e}")
+
     @classmethod
     async def stop(cls):
+        NetworkService.remove_listener(cls.update)
         if cls._aio_zeroconf and cls._info:
             try:
                 await cls._aio_zeroconf.async_unregister_service(cls._info)
@@ -0,0 +1,238 @@
+import os
+import shutil
+import hashlib
+import asyncio
+import logging
+import subprocess
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException
+from core.config import UPLOAD_DIR
+
+
+class Transcoder:
+    """Pluggable backend for poster frames and low-bitrate previews"""
+
+    name = "none"
+
+    def available(self) -> bool:
+        return False
+
+    def poster(self, src: str, dst: str) -> bool:
+        """Writes a JPEG poster frame for src to dst (blocking)"""
+        return False
+
+    def preview(self, src: str, dst: str, height: int, bitrate: str) -> bool:
+        """Writes a small MP4 preview of src to dst (blocking)"""
+        return False
+
+
+class FFmpegTranscoder(Transcoder):
+    name = "ffmpeg"
+    TIMEOUT = 15 * 60
+
+    def __init__(self, binary: str = None):
+        self.binary = binary or shutil.which("ffmpeg")
+
+    def available(self) -> bool:
+        return bool(self.binary)
+
+    def _run(self, args: list, timeout: int) -> bool:
+        try:
+            subprocess.run(
+                [self.binary, "-hide_banner", "-loglevel", "error", "-y", *args],
+                check=True,
+                timeout=timeout,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+            return True
+        except (subprocess.SubprocessError, OSError) as e:
+            logging.error(f"ffmpeg failed: {e}")
+            return False
+
+    def poster(self, src: str, dst: str) -> bool:
+        frame = ["-frames:v", "1", "-vf", "scale=-2:480", "-f", "image2"]
+        # Seek a second in to skip black lead-in frames; short clips fall back
+        return self._run(["-ss", "1", "-i", src, *frame, dst], timeout=60) or (
+            self._run(["-i", src, *frame, dst], timeout=60)
+        )
+
+    def preview(self, src: str, dst: str, height: int, bitrate: str) -> bool:
+        return self._run(
+            [
+                "-i", src,
+                "-vf", f"scale=-2:{height}",
+                "-c:v", "libx264", "-preset", "veryfast", "-b:v", bitrate,
+                "-c:a", "aac", "-b:a", "96k",
+                "-movflags", "+faststart",
+                "-f", "mp4", dst,
+            ],
+            timeout=self.TIMEOUT,
+        )  # fmt: skip
+
+
+class MediaService:
+    """
+    Poster frames and cached low-bitrate previews for received videos.
+
+    Generated files live in CACHE_DIR under a key derived from the source
+    path, size and mtime, and the cache is trimmed (least recently used
+    first) to CACHE_BUDGET bytes.
+    """
+
+    VIDEO_EXTENSIONS = [".mp4", ".mov", ".m4v", ".mkv", ".webm", ".avi", ".3gp"]
+    CACHE_DIR = os.path.join(UPLOAD_DIR, ".previews")
+    CACHE_BUDGET = 2 * 1024 * 1024 * 1024  # 2GB of posters + previews
+    PREVIEW_HEIGHT = 480
+    PREVIEW_BITRATE = "800k"
+    MAX_TRANSCODES = 1  # Concurrent preview encodes
+    MAX_FAILURES = 1024  # Remembered failed renders (per source mtime)
+
+    _transcoder: Transcoder = FFmpegTranscoder()
+    _cache: "OrderedDict[str, int]" = None  # filename -> size, in LRU order
+    _cache_bytes = 0
+    _jobs = {}  # cache filename -> asyncio.Task
+    # Cache filenames whose render failed; the name changes with the source
+    # mtime, so an edited file gets another try
+    _failed: "OrderedDict[str, None]" = OrderedDict()
+    _transcode_slots = None
+
+    @classmethod
+    def set_transcoder(cls, transcoder: Transcoder):
+        cls._transcoder = transcoder
+
+    @classmethod
+    def get_status(cls) -> dict:
+        cls._load_cache()
+        return {
+            "transcoder": cls._transcoder.name,
+            "available": cls._transcoder.available(),
+            "cache_bytes": cls._cache_bytes,
+            "cache_budget": cls.CACHE_BUDGET,
+            "pending": len(cls._jobs),
+        }
+
+    @classmethod
+    def is_video(cls, path: str) -> bool:
+        return os.path.splitext(path)[1].lower() in cls.VIDEO_EXTENSIONS
+
+    # --- Cache bookkeeping ---
+
+    @classmethod
+    def _load_cache(cls):
+        if cls._cache is not None:
+            return
+        os.makedirs(cls.CACHE_DIR, exist_ok=True)
+        entries = []
+        for f in os.listdir(cls.CACHE_DIR):
+            path = os.path.join(cls.CACHE_DIR, f)
+            if f.endswith(".part"):
+                os.remove(path)  # Interrupted encode from a previous run
+                continue
+            st = os.stat(path)
+            entries.append((st.st_mtime, f, st.st_size))
+        cls._cache = OrderedDict((f, size) for _, f, size in sorted(entries))
+        cls._cache_bytes = sum(cls._cache.values())
+
+    @classmethod
+    def _cache_name(cls, src: str, kind: str) -> str:
+        st = os.stat(src)
+        ident = f"{os.path.abspath(src)}|{st.st_size}|{st.st_mtime_ns}"
+        digest = hashlib.sha1(ident.encode()).hexdigest()
+        return f"{digest}.{kind}"
+
+    @classmethod
+    def _hit(cls, name: str) -> Optional[str]:
+        if name not in cls._cache:
+            return None
+        path = os.path.join(cls.CACHE_DIR, name)
+        if not os.path.exists(path):
+            cls._cache_bytes -= cls._cache.pop(name)
+            return None
+        cls._cache.move_to_end(name)
+        return path
+
+    @classmethod
+    def _store(cls, name: str):
+        size = os.path.getsize(os.path.join(cls.CACHE_DIR, name))
+        cls._cache[name] = size
+        cls._cache_bytes += size
+        while cls._cache_bytes > cls.CACHE_BUDGET and len(cls._cache) > 1:
+            victim, victim_size = cls._cache.popitem(last=False)
+            cls._cache_bytes -= victim_size
+            try:
+                os.remove(os.path.join(cls.CACHE_DIR, victim))
+            except OSError:
+                pass
+
+    # --- Generation ---
+
+    @classmethod
+    async def _generate(cls, name: str, render) -> Optional[str]:
+        """Runs a blocking render(dst) into CACHE_DIR/name.part, then commits"""
+        path = os.path.join(cls.CACHE_DIR, name)
+        part = path + ".part"
+        loop = asyncio.get_running_loop()
+        ok = await loop.run_in_executor(None, render, part)
+        if not ok or not os.path.exists(part):
+            if os.path.exists(part):
+                os.remove(part)
+            cls._failed[name] = None
+            while len(cls._failed) > cls.MAX_FAILURES:
+                cls._failed.popitem(last=False)
+            return None
+        os.replace(part, path)
+        cls._store(name)
+        return path
+
+    @classmethod
+    async def get_poster(cls, src: str) -> Optional[str]:
+        """Returns a cached JPEG poster frame for a video, creating it if needed"""
+        if not cls.is_video(src) or not cls._transcoder.available():
+            return None
+        cls._load_cache()
+        name = cls._cache_name(src, "jpg")
+        cached = cls._hit(name)
+        if cached or name in cls._failed:
+            return cached
+
+        job = cls._jobs.get(name)
+        if job is None:
+            render = lambda dst: cls._transcoder.poster(src, dst)
+            job = asyncio.ensure_future(cls._generate(name, render))
+            cls._jobs[name] = job
+            job.add_done_callback(lambda _: cls._jobs.pop(name, None))
+        return await asyncio.shield(job)
+
+    @classmethod
+    def get_preview(cls, src: str) -> Optional[str]:
+        """
+        Returns the cached low-bitrate preview if it exists. Otherwise starts
+        a background encode (if a transcoder is available) and returns None.
+        Raises 404 once an encode of this version of src has failed.
+        """
+        if not cls.is_video(src) or not cls._transcoder.available():
+            return None
+        cls._load_cache()
+        name = cls._cache_name(src, "mp4")
+        cached = cls._hit(name)
+        if cached:
+            return cached
+        if name in cls._failed:
+            raise HTTPException(status_code=404, detail="Preview generation failed")
+
+        if name not in cls._jobs:
+            job = asyncio.ensure_future(cls._encode_preview(name, src))
+            cls._jobs[name] = job
+            job.add_done_callback(lambda _: cls._jobs.pop(name, None))
+        return None
+
+    @classmethod
+    async def _encode_preview(cls, name: str, src: str):
+        if cls._transcode_slots is None:
+            cls._transcode_slots = asyncio.Semaphore(cls.MAX_TRANSCODES)
+        height, bitrate = cls.PREVIEW_HEIGHT, cls.PREVIEW_BITRATE
+        render = lambda dst: cls._transcoder.preview(src, dst, height, bitrate)
+        async with cls._transcode_slots:
+            return await cls._generate(name, render)
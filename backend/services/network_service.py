@@ -0,0 +1,113 @@
+import asyncio
+import inspect
+import logging
+import time
+from typing import Callable, List, Optional
+
+
+class NetworkService:
+    """
+    Cached view of the host's LAN addresses and display name.
+
+    Request handlers only read the cached values; a background task polls
+    the interfaces and notifies listeners (mDNS, QR cache) when they change.
+    """
+
+    REFRESH_INTERVAL = 10  # Seconds between interface polls
+    HOST_NAME_TTL = 300  # `netsh` is slow, so the SSID is refreshed rarely
+
+    _ips: Optional[List[str]] = None  # None until first read; [] is offline
+    _host_name: str = None
+    _host_name_at = 0.0
+    _listeners: List[Callable] = []
+    _task = None
+
+    @classmethod
+    def _read_ips(cls) -> List[str]:
+        from net_utils import get_smart_ips
+
+        return get_smart_ips()
+
+    @classmethod
+    def _read_host_name(cls) -> str:
+        from services.host_service import HostService
+
+        return HostService.get_host_name()
+
+    @classmethod
+    def get_ips(cls) -> List[str]:
+        if cls._ips is None:
+            cls._ips = cls._read_ips()  # First use before the loop ran
+        return cls._ips
+
+    @classmethod
+    def get_primary_ip(cls) -> str:
+        ips = cls.get_ips()
+        return ips[0] if ips else "127.0.0.1"
+
+    @classmethod
+    def get_host_name(cls) -> str:
+        if cls._host_name is None:
+            cls._host_name = cls._read_host_name()
+            cls._host_name_at = time.time()
+        return cls._host_name
+
+    @classmethod
+    def add_listener(cls, callback: Callable):
+        """callback(ips) runs (sync or async) whenever the address set changes"""
+        if callback not in cls._listeners:
+            cls._listeners.append(callback)
+
+    @classmethod
+    def remove_listener(cls, callback: Callable):
+        if callback in cls._listeners:
+            cls._listeners.remove(callback)
+
+    @classmethod
+    async def refresh(cls, force_host_name: bool = False) -> bool:
+        """Re-reads interfaces off the event loop. Returns True on change."""
+        loop = asyncio.get_running_loop()
+        ips = await loop.run_in_executor(None, cls._read_ips)
+        changed = ips != (cls._ips or [])
+        cls._ips = ips
+
+        if (
+            changed
+            or force_host_name
+            or cls._host_name is None
+            or time.time() - cls._host_name_at > cls.HOST_NAME_TTL
+        ):
+            cls._host_name = await loop.run_in_executor(None, cls._read_host_name)
+            cls._host_name_at = time.time()
+
+        if changed:
+            logging.info(f"Network addresses changed: {ips}")
+            for callback in list(cls._listeners):
+                try:
+                    result = callback(ips)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    logging.error(f"Network listener failed: {e}")
+        return changed
+
+    @classmethod
+    async def _loop(cls):
+        while True:
+            await asyncio.sleep(cls.REFRESH_INTERVAL)
+            try:
+                await cls.refresh()
+            except Exception as e:
+                logging.error(f"Network refresh failed: {e}")
+
+    @classmethod
+    async def start(cls):
+        await cls.refresh(force_host_name=True)
+        if cls._task is None:
+            cls._task = asyncio.create_task(cls._loop())
+
+    @classmethod
+    async def stop(cls):
+        if cls._task is not None:
+            cls._task.cancel()
+            cls._task = None
@@ -0,0 +1,281 @@
+import os
+import sys
+import time
+import asyncio
+import itertools
+import threading
+import contextvars
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Optional
+from fastapi import HTTPException
+
+# The request being timed in the current task, if any
+_current = contextvars.ContextVar("profiled_request", default=None)
+
+
+class ProfilerService:
+    """
+    Runtime diagnostics that can be switched on without a restart.
+
+    A sampling profiler thread snapshots every thread's stack at a fixed
+    interval and aggregates them as folded stacks (the input format of
+    flamegraph.pl, speedscope and friends). Independently, every request
+    records named stage timings; requests slower than SLOW_REQUEST_MS are
+    kept (the last SLOW_KEEP of them) with their stages in the same format.
+    A lag monitor always runs on the event loop: how late a periodic wakeup
+    fires is how long anything else was blocking the loop.
+    """
+
+    SAMPLE_INTERVAL = 0.005  # 200 Hz
+    SLOW_REQUEST_MS = float(os.environ.get("TURBO_SLOW_MS", "1000"))
+    SLOW_KEEP = 50
+    LAG_INTERVAL = 0.1
+    LAG_KEEP = 3000  # Wakeups kept for percentiles (5 minutes)
+
+    _samples: Counter = Counter()
+    _sample_count = 0
+    _sampler: Optional[threading.Thread] = None
+    _stop = threading.Event()
+    _started_at = None
+    _slow: deque = deque(maxlen=SLOW_KEEP)
+    _ids = itertools.count(1)
+    _lags: deque = deque(maxlen=LAG_KEEP)
+    _lag_max = 0.0
+    _lag_since = time.time()
+
+    # --- Sampling profiler ---
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    @classmethod
+    def _sample_loop(cls, interval: float):
+        me = threading.get_ident()
+        names = {}
+        while not cls._stop.wait(interval):
+            names.update({t.ident: t.name for t in threading.enumerate()})
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(cls._frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                cls._samples[";".join(reversed(stack))] += 1
+            cls._sample_count += 1
+
+    @classmethod
+    def start(cls, interval: float = None) -> dict:
+        if cls._sampler is None:
+            cls._stop.clear()
+            cls._samples = Counter()
+            cls._sample_count = 0
+            cls._started_at = time.time()
+            cls._sampler = threading.Thread(
+                target=cls._sample_loop,
+                args=(interval or cls.SAMPLE_INTERVAL,),
+                name="profiler-sampler",
+                daemon=True,
+            )
+            cls._sampler.start()
+        return cls.status()
+
+    @classmethod
+    def stop(cls) -> dict:
+        if cls._sampler is not None:
+            cls._stop.set()
+            cls._sampler.join()
+            cls._sampler = None
+        return cls.status()
+
+    @classmethod
+    def status(cls) -> dict:
+        return {
+            "running": cls._sampler is not None,
+            "started_at": cls._started_at,
+            "samples": cls._sample_count,
+            "unique_stacks": len(cls._samples),
+            "slow_request_ms": cls.SLOW_REQUEST_MS,
+            "slow_keep": cls._slow.maxlen,
+            "slow_captured": len(cls._slow),
+        }
+
+    @classmethod
+    def folded(cls) -> str:
+        """Samples so far as folded stacks: 'root;caller;callee count' lines"""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in cls._samples.most_common()
+        )
+
+    # --- Event loop lag ---
+
+    @classmethod
+    async def lag_loop(cls):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + cls.LAG_INTERVAL
+            await asyncio.sleep(cls.LAG_INTERVAL)
+            lag = max(loop.time() - expected, 0.0)
+            cls._lags.append(lag)
+            cls._lag_max = max(cls._lag_max, lag)
+
+    @classmethod
+    def loop_lag(cls, reset: bool = False) -> dict:
+        """Lag percentiles in ms over the last LAG_KEEP wakeups"""
+        lags = sorted(cls._lags)
+
+        def pct(p):
+            return round(lags[min(int(len(lags) * p), len(lags) - 1)] * 1000, 2)
+
+        report = {
+            "since": cls._lag_since,
+            "samples": len(lags),
+            "interval_ms": cls.LAG_INTERVAL * 1000,
+            "p50_ms": pct(0.5) if lags else None,
+            "p99_ms": pct(0.99) if lags else None,
+            "max_ms": round(cls._lag_max * 1000, 2),
+        }
+        if reset:
+            cls._lags.clear()
+            cls._lag_max = 0.0
+            cls._lag_since = time.time()
+        return report
+
+    # --- Request stage timings ---
+
+    @classmethod
+    @contextmanager
+    def stage(cls, name: str):
+        """Times a named stage of the current request (no-op outside one)"""
+        record = _current.get()
+        if record is None:
+            yield
+            return
+        path = record["open"] + [name]
+        record["open"] = path
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            record["open"] = path[:-1]
+            record["stages"].append((";".join(path), elapsed))
+
+    @classmethod
+    def begin_request(cls, method: str, path: str):
+        record = {
+            "method": method,
+            "path": path,
+            "started": time.perf_counter(),
+            "stages": [],
+            "open": [],
+        }
+        return _current.set(record)
+
+    @classmethod
+    def end_request(cls, token, status: int = None):
+        record = _current.get()
+        _current.reset(token)
+        if record is None:
+            return
+        total = time.perf_counter() - record["started"]
+        if total * 1000 < cls.SLOW_REQUEST_MS:
+            return
+        cls._slow.append(
+            {
+                "id": next(cls._ids),
+                "method": record["method"],
+                "path": record["path"],
+                "status": status,
+                "at": time.time(),
+                "duration_ms": round(total * 1000, 2),
+                "stages": {
+                    name: round(elapsed * 1000, 2) for name, elapsed in record["stages"]
+                },
+                "_raw": (total, record["stages"]),
+            }
+        )
+
+    @classmethod
+    def slow_requests(cls) -> list:
+        return [
+            {k: v for k, v in entry.items() if k != "_raw"}
+            for entry in reversed(cls._slow)
+        ]
+
+    @classmethod
+    def slow_folded(cls, request_id: int) -> Optional[str]:
+        """One slow request as folded stacks of self time in microseconds"""
+        for entry in cls._slow:
+            if entry["id"] != request_id:
+                continue
+            total, stages = entry["_raw"]
+            root = f"{entry['method']} {entry['path']}"
+            inclusive = Counter({root: total})
+            for name, elapsed in stages:
+                inclusive[f"{root};{name}"] += elapsed
+            # Folded stacks carry self time, so subtract direct children
+            self_time = Counter(inclusive)
+            for path, elapsed in inclusive.items():
+                parent = path.rsplit(";", 1)[0]
+                if parent != path:
+                    self_time[parent] -= elapsed
+            return "".join(
+                f"{path} {max(int(t * 1e6), 0)}\n" for path, t in self_time.items()
+            )
+        return None
+
+    @staticmethod
+    def _parse(field: str, value, kind, minimum):
+        """Parses a number from JSON, or raises 400"""
+        try:
+            if isinstance(value, bool) or value is None:
+                raise ValueError
+            parsed = kind(value)
+            if kind is int and isinstance(value, float) and value != parsed:
+                raise ValueError
+        except (TypeError, ValueError, OverflowError):
+            parsed = None
+        if parsed is None or not minimum <= parsed < float("inf"):
+            raise HTTPException(status_code=400, detail=f"Invalid {field}")
+        return parsed
+
+    @classmethod
+    def configure(cls, slow_request_ms: float = None, keep: int = None):
+        """Both are validated first, so a bad request changes nothing"""
+        if slow_request_ms is not None:
+            slow_request_ms = cls._parse("threshold_ms", slow_request_ms, float, 0)
+        if keep is not None:
+            keep = cls._parse("keep", keep, int, 1)
+        if slow_request_ms is not None:
+            cls.SLOW_REQUEST_MS = slow_request_ms
+        if keep is not None and keep != cls._slow.maxlen:
+            cls._slow = deque(cls._slow, maxlen=keep)
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware that opens a stage-timing record per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = ProfilerService.begin_request(scope["method"], scope["path"])
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            ProfilerService.end_request(token, status.get("code"))
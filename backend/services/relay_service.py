@@ -0,0 +1,231 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Optional
+from fastapi import HTTPException
+
+
+class RelayPipe:
+    """Byte-bounded in-memory pipe: put() blocks while the reader lags"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._chunks = deque()
+        self._size = 0
+        self._closed = False
+        self._error: Optional[str] = None
+        self._cond = asyncio.Condition()
+
+    async def put(self, chunk: bytes):
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: self._size < self.capacity or self._error is not None
+            )
+            if self._error is not None:
+                raise ConnectionError(self._error)
+            self._chunks.append(chunk)
+            self._size += len(chunk)
+            self._cond.notify_all()
+
+    async def get(self) -> Optional[bytes]:
+        """Next chunk, or None at a clean end of stream"""
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: self._chunks or self._closed or self._error is not None
+            )
+            if self._error is not None:
+                raise ConnectionError(self._error)
+            if not self._chunks:
+                return None
+            chunk = self._chunks.popleft()
+            self._size -= len(chunk)
+            self._cond.notify_all()
+            return chunk
+
+    async def close(self, error: str = None):
+        async with self._cond:
+            self._closed = True
+            if error and self._error is None:
+                self._error = error
+            self._cond.notify_all()
+
+
+class RelayService:
+    """
+    Live device-to-device relay. A sender's upload is piped straight into
+    the waiting receiver's download through a RelayPipe, so the payload
+    never touches the host disk unless the sender asks to keep a copy.
+    """
+
+    BUFFER_BYTES = 8 * 1024 * 1024  # Max in-memory backlog per relay
+    OFFER_TTL = 120  # Seconds an offer waits for both sides to connect
+    _relays: Dict[str, dict] = {}
+
+    @classmethod
+    def _expire(cls):
+        now = time.time()
+        for relay_id, relay in list(cls._relays.items()):
+            stale = now - relay["created_at"] > cls.OFFER_TTL
+            if relay["state"] in ("waiting", "connected") and stale:
+                del cls._relays[relay_id]
+                asyncio.ensure_future(relay["pipe"].close("Relay offer expired"))
+
+    @classmethod
+    def create_offer(
+        cls,
+        sender: str,
+        sender_session: Optional[str],
+        target_session: str,
+        filename: str,
+        size: int = 0,
+        persist: bool = False,
+    ) -> dict:
+        cls._expire()
+        relay_id = uuid.uuid4().hex
+        relay = {
+            "relay_id": relay_id,
+            "sender": sender,
+            "sender_session": sender_session,
+            "target_session": target_session,
+            "filename": filename,
+            "size": size,
+            "persist": persist,
+            "state": "waiting",
+            "transferred": 0,
+            "created_at": time.time(),
+            "pipe": RelayPipe(cls.BUFFER_BYTES),
+            "receiver_attached": asyncio.Event(),
+            "sender_attached": False,
+        }
+        cls._relays[relay_id] = relay
+        return cls.describe(relay)
+
+    @staticmethod
+    def describe(relay: dict) -> dict:
+        return {
+            key: relay[key]
+            for key in (
+                "relay_id",
+                "sender",
+                "target_session",
+                "filename",
+                "size",
+                "persist",
+                "state",
+                "transferred",
+            )
+        }
+
+    @classmethod
+    def get(cls, relay_id: str) -> dict:
+        relay = cls._relays.get(relay_id)
+        if not relay:
+            raise HTTPException(status_code=404, detail="Relay not found")
+        return relay
+
+    @staticmethod
+    def check_sender(relay: dict, request):
+        """Only the session that made the offer (or the host) may upload"""
+        session_id = request.headers.get("x-session-id")
+        if relay["sender_session"] is None:
+            allowed = request.headers.get("x-is-host") == "true"
+        else:
+            allowed = session_id == relay["sender_session"]
+        if not allowed:
+            raise HTTPException(status_code=403, detail="Relay is from another device")
+
+    @classmethod
+    def pending_for(cls, session_id: str) -> list:
+        cls._expire()
+        return [
+            cls.describe(relay)
+            for relay in cls._relays.values()
+            if relay["target_session"] == session_id and relay["state"] == "waiting"
+        ]
+
+    @classmethod
+    def _finish(cls, relay: dict, state: str):
+        relay["state"] = state
+        cls._relays.pop(relay["relay_id"], None)
+
+    @classmethod
+    async def send(cls, relay_id: str, request, tee=None) -> int:
+        """
+        Pumps the request body into the pipe. tee, if given, is an async
+        callable fed every chunk (used to keep an on-disk copy).
+        Returns bytes relayed.
+        """
+        relay = cls.get(relay_id)
+        cls.check_sender(relay, request)
+        if relay["sender_attached"]:
+            raise HTTPException(status_code=409, detail="Relay already has a sender")
+        relay["sender_attached"] = True
+        pipe = relay["pipe"]
+        expected = relay["size"]
+
+        try:
+            # Don't hold the upload open forever if nobody picks it up
+            remaining = cls.OFFER_TTL - (time.time() - relay["created_at"])
+            await asyncio.wait_for(
+                relay["receiver_attached"].wait(), timeout=max(remaining, 1)
+            )
+        except asyncio.TimeoutError:
+            cls._finish(relay, "expired")
+            await pipe.close("Receiver never connected")
+            raise HTTPException(status_code=408, detail="Receiver never connected")
+
+        relay["state"] = "streaming"
+        try:
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                relay["transferred"] += len(chunk)
+                if expected and relay["transferred"] > expected:
+                    raise HTTPException(status_code=400, detail="File size mismatch")
+                await pipe.put(chunk)
+                if tee is not None:
+                    await tee(chunk)
+            if expected and relay["transferred"] != expected:
+                raise HTTPException(status_code=400, detail="File size mismatch")
+        except ConnectionError:
+            cls._finish(relay, "failed")
+            raise HTTPException(status_code=410, detail="Receiver disconnected")
+        except BaseException:
+            cls._finish(relay, "failed")
+            await pipe.close("Sender disconnected")
+            raise
+
+        await pipe.close()
+        cls._finish(relay, "done")
+        return relay["transferred"]
+
+    @classmethod
+    async def receive(cls, relay_id: str, session_id: str):
+        """Async iterator over the relayed bytes for the target session"""
+        relay = cls.get(relay_id)
+        if relay["target_session"] != session_id:
+            raise HTTPException(status_code=403, detail="Relay is for another device")
+        if relay["receiver_attached"].is_set():
+            raise HTTPException(status_code=409, detail="Relay already has a receiver")
+        relay["receiver_attached"].set()
+        if relay["state"] == "waiting":
+            relay["state"] = "connected"
+        pipe = relay["pipe"]
+
+        async def stream():
+            try:
+                while True:
+                    chunk = await pipe.get()
+                    if chunk is None:
+                        return
+                    yield chunk
+            except BaseException as e:
+                if not isinstance(e, ConnectionError):
+                    # Receiver went away: unblock and fail the sender
+                    await pipe.close("Receiver disconnected")
+                logging.warning(f"Relay {relay_id} aborted: {e!r}")
+                raise
+
+        return relay, stream()
@@ -0,0 +1,873 @@
+import os
+import bisect
+import heapq
+import itertools
+import shutil
+import tempfile
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Union
+from fastapi import HTTPException
+from core.config import UPLOAD_DIR
+
+
+class RetentionService:
+    """
+    Expiry queue for everything the server creates and later has to reclaim.
+
+    Temp uploads, ZIP artifacts and (optionally) completed transfers are
+    registered when they are created, so a sweep only touches entries that
+    are due. A full directory walk is kept as an infrequent reconciliation
+    step for files created while the server was down or changed externally.
+    Crash leftovers are resolved by JournalService; the walk also expires
+    stray temp files and bundles whose journal records never reached disk.
+
+    The transfer index doubles as incremental usage accounting, which backs
+    per-device/global quotas and the upload admission check.
+    """
+
+    TEMP_TTL = 60  # Idle seconds before a .tmp upload counts as abandoned
+    ARCHIVE_TTL = 3600  # Batch/folder ZIPs live for an hour
+    TRANSFER_MAX_AGE_HOURS: Optional[float] = None  # None = keep transfers
+    RECONCILE_INTERVAL = 6 * 3600  # Full rescan every 6 hours
+    MAX_SLEEP = 60
+
+    # Quotas (None = unlimited). Device limits apply to each SAVE_PATH/<device>
+    GLOBAL_MAX_BYTES: Optional[int] = None
+    GLOBAL_MAX_FILES: Optional[int] = None
+    DEVICE_MAX_BYTES: Optional[int] = None
+    DEVICE_MAX_FILES: Optional[int] = None
+    # Per-device overrides: {name: {"max_bytes", "max_files", "max_age_hours"}}
+    DEVICE_POLICIES: Dict[str, dict] = {}
+    EVICTION = "none"  # "none" rejects, "lru" / "age" evict oldest first
+    EVICTION_MODES = ("none", "lru", "age")
+    MIN_FREE_BYTES = 512 * 1024 * 1024  # Disk headroom kept free at all times
+    ADMISSION_WAIT = 10  # Seconds an upload may wait for in-flight ones
+    GROW_STEP = 64 * 1024 * 1024  # Unsized uploads reserve this much at a time
+
+    # Heap of (due, seq, path); stale entries are skipped lazily on pop
+    _queue = []
+    _seq = itertools.count()
+    # path -> (due, kind) for every live scheduled entry
+    _scheduled: Dict[str, tuple] = {}
+    # path -> {"owner", "size", "mtime", "atime"} for every completed transfer;
+    # "mtime" is when it arrived, which expiry and age eviction go by
+    _transfers: Dict[str, dict] = {}
+    # owner -> [bytes, files], plus the global total
+    _usage: Dict[str, list] = {}
+    _total = [0, 0]
+    # Hardlinked payloads (broadcasts): inode id -> link count, so the global
+    # byte total counts each shared blob once
+    _blob_refs: Dict[str, int] = {}
+    # Eviction order without sorting: heaps of (stamp, seq, path) for each
+    # ("mtime" | "atime", owner), owner None being every transfer. Entries
+    # of dropped or touched transfers go stale and are skipped lazily.
+    _heaps: Dict[tuple, list] = {}
+    # Every path in _transfers or _scheduled, sorted so a subtree is one
+    # bisect range. Paths that left both go stale until the next rebuild.
+    _paths: list = []
+    _indexed: set = set()
+    # Bytes/files promised to uploads that are still streaming: disk bytes,
+    # per owner, and against the global total
+    _reserved = 0
+    _inflight: Dict[str, list] = {}
+    _pending = [0, 0]
+    _removal_listeners = []
+    _release_listeners = []
+    _last_reconcile = 0.0
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normpath(os.path.abspath(path))
+
+    @classmethod
+    def _index(cls, key: str):
+        if key in cls._indexed:
+            return
+        cls._indexed.add(key)
+        bisect.insort(cls._paths, key)
+        if len(cls._paths) > 2 * (len(cls._transfers) + len(cls._scheduled)) + 1024:
+            cls._paths = [
+                p for p in cls._paths if p in cls._transfers or p in cls._scheduled
+            ]
+            cls._indexed = set(cls._paths)
+
+    # --- Scheduling ---
+
+    @classmethod
+    def schedule(cls, path: str, kind: str, ttl: float, start: float = None):
+        """Registers path for removal ttl seconds after start (default now)"""
+        key = cls._key(path)
+        due = (start if start is not None else time.time()) + ttl
+        cls._scheduled[key] = (due, kind)
+        cls._index(key)
+        heapq.heappush(cls._queue, (due, next(cls._seq), key))
+
+    @classmethod
+    def discard(cls, path: str):
+        """Drops a scheduled entry (e.g. a temp file that was renamed)"""
+        cls._scheduled.pop(cls._key(path), None)
+
+    @classmethod
+    def next_due(cls) -> Optional[float]:
+        while cls._queue:
+            due, _, key = cls._queue[0]
+            entry = cls._scheduled.get(key)
+            if entry and entry[0] == due:
+                return due
+            heapq.heappop(cls._queue)
+        return None
+
+    @classmethod
+    def seconds_until_next(cls) -> float:
+        due = cls.next_due()
+        if due is None:
+            return cls.MAX_SLEEP
+        return min(max(due - time.time(), 1), cls.MAX_SLEEP)
+
+    # --- Transfer accounting ---
+
+    @classmethod
+    def _push(cls, field: str, key: str, info: dict):
+        for owner, live in ((info["owner"], cls._usage), (None, None)):
+            heap = cls._heaps.setdefault((field, owner), [])
+            heapq.heappush(heap, (info[field], next(cls._seq), key))
+            count = live[owner][1] if live is not None else cls._total[1]
+            if len(heap) > 2 * count + 1024:
+                # Mostly stale (LRU touches); rebuild from the live entries
+                heap[:] = [e for e in heap if cls._current(field, owner, e[0], e[2])]
+                heapq.heapify(heap)
+
+    @classmethod
+    def _current(cls, field: str, owner: Optional[str], stamp: float, key: str):
+        info = cls._transfers.get(key)
+        return (
+            info is not None
+            and info[field] == stamp
+            and (owner is None or info["owner"] == owner)
+        )
+
+    @classmethod
+    def _put(cls, key: str, info: dict):
+        cls._drop(key)
+        cls._transfers[key] = info
+        cls._index(key)
+        usage = cls._usage.setdefault(info["owner"], [0, 0])
+        usage[0] += info["size"]
+        usage[1] += 1
+        blob = info.get("blob")
+        if blob:
+            cls._blob_refs[blob] = cls._blob_refs.get(blob, 0) + 1
+        if not blob or cls._blob_refs[blob] == 1:
+            cls._total[0] += info["size"]
+        cls._total[1] += 1
+        cls._push("mtime", key, info)
+        cls._push("atime", key, info)
+
+    @classmethod
+    def _drop(cls, key: str):
+        info = cls._transfers.pop(key, None)
+        if info:
+            usage = cls._usage.get(info["owner"])
+            if usage:
+                usage[0] -= info["size"]
+                usage[1] -= 1
+                if usage[1] <= 0:
+                    del cls._usage[info["owner"]]
+                    cls._heaps.pop(("mtime", info["owner"]), None)
+                    cls._heaps.pop(("atime", info["owner"]), None)
+            blob = info.get("blob")
+            if blob:
+                cls._blob_refs[blob] -= 1
+                if cls._blob_refs[blob] <= 0:
+                    del cls._blob_refs[blob]
+            if not blob or blob not in cls._blob_refs:
+                cls._total[0] -= info["size"]
+            cls._total[1] -= 1
+        return info
+
+    @classmethod
+    def _max_age_hours(cls, owner: str) -> Optional[float]:
+        policy = cls.DEVICE_POLICIES.get(owner, {})
+        return policy.get("max_age_hours", cls.TRANSFER_MAX_AGE_HOURS)
+
+    @classmethod
+    def add_transfer(
+        cls,
+        path: str,
+        owner: str,
+        size: int,
+        mtime: float = None,
+        blob: str = None,
+    ):
+        """blob identifies a payload shared by several hardlinked transfers"""
+        key = cls._key(path)
+        mtime = mtime if mtime is not None else time.time()
+        info = {"owner": owner, "size": size, "mtime": mtime, "atime": mtime}
+        if blob:
+            info["blob"] = blob
+        cls._put(key, info)
+        max_age = cls._max_age_hours(owner)
+        if max_age:
+            cls.schedule(key, "transfer", max_age * 3600, mtime)
+
+    @classmethod
+    def touch(cls, path: str):
+        """Marks a transfer as recently used (for LRU eviction)"""
+        key = cls._key(path)
+        info = cls._transfers.get(key)
+        if info:
+            info["atime"] = time.time()
+            cls._push("atime", key, info)
+
+    @classmethod
+    def remove_transfer(cls, path: str):
+        key = cls._key(path)
+        cls._scheduled.pop(key, None)
+        return cls._drop(key)
+
+    @classmethod
+    def remove_tree(cls, path: str):
+        """Forgets every entry at or below path (file or directory)"""
+        key = cls._key(path)
+        paths = cls._paths
+        # The path itself, then everything under key + os.sep (siblings such
+        # as "name.txt" sort between the two, so they are separate ranges)
+        start = bisect.bisect_left(paths, key + os.sep)
+        end = bisect.bisect_left(paths, key + chr(ord(os.sep) + 1), start)
+        found = bisect.bisect_left(paths, key)
+        ranges = [(start, end)]
+        if found < len(paths) and paths[found] == key:
+            ranges.append((found, found + 1))
+        for lo, hi in ranges:  # Later range first, so indices stay valid
+            for p in paths[lo:hi]:
+                cls._drop(p)
+                cls._scheduled.pop(p, None)
+                cls._indexed.discard(p)
+            del paths[lo:hi]
+
+    # --- Quotas & admission ---
+
+    @classmethod
+    def _limits(cls, owner: str):
+        policy = cls.DEVICE_POLICIES.get(owner, {})
+        return (
+            policy.get("max_bytes", cls.DEVICE_MAX_BYTES),
+            policy.get("max_files", cls.DEVICE_MAX_FILES),
+        )
+
+    @staticmethod
+    def _over(used: list, size: int, max_bytes, max_files, files: int = 1) -> bool:
+        return (max_bytes is not None and used[0] + size > max_bytes) or (
+            max_files is not None and used[1] + files > max_files
+        )
+
+    @staticmethod
+    def _outgoing(key: str) -> bool:
+        """Files waiting in a session's outgoing folder (gone on disconnect)"""
+        return key.startswith(os.path.abspath(UPLOAD_DIR) + os.sep)
+
+    @classmethod
+    def _expired(cls, key: str, now: float) -> bool:
+        entry = cls._scheduled.get(key)
+        return entry is not None and entry[0] <= now
+
+    @classmethod
+    def _expired_transfers(cls, now: float):
+        """Due transfers, read off the expiry heap without popping it"""
+        stack = [0] if cls._queue else []
+        while stack:
+            i = stack.pop()
+            due, _, key = cls._queue[i]
+            if due > now:
+                continue  # Nothing below this node is due either
+            stack.extend(c for c in (2 * i + 1, 2 * i + 2) if c < len(cls._queue))
+            entry = cls._scheduled.get(key)
+            if entry == (due, "transfer") and key in cls._transfers:
+                yield key
+
+    @classmethod
+    def _evict(
+        cls,
+        owner: Optional[str],
+        need_bytes: int,
+        need_files: int,
+        device: Optional[int] = None,
+    ) -> Optional[list]:
+        """
+        Picks transfers to free at least need_bytes/need_files from owner
+        (or globally when owner is None) in EVICTION order, popping the
+        owner's heap instead of sorting everything. Returns the victims'
+        (path, info), already dropped from the accounting and ready for
+        _dispose, or None (changing nothing) if the shortfall can't be
+        covered.
+
+        With device set (disk pressure) only files on that filesystem count:
+        expired transfers first, then, unless EVICTION is "none", the oldest
+        received ones. Outgoing files of live sessions are never touched.
+        """
+        if need_bytes <= 0 and need_files <= 0:
+            return []
+        if cls.EVICTION == "none" and device is None:
+            return None
+        field = "atime" if cls.EVICTION == "lru" else "mtime"
+        heap = cls._heaps.get((field, owner), [])
+        victims, popped, seen = [], [], set()
+        freed_bytes, freed_files = 0, 0
+        links_left = {}  # Shared blob -> tracked links after this pass
+
+        def covered():
+            return freed_bytes >= need_bytes and freed_files >= need_files
+
+        def candidates():
+            if device is not None:
+                yield from cls._expired_transfers(time.time())
+                if cls.EVICTION == "none":
+                    return
+            while heap:
+                entry = heapq.heappop(heap)
+                if not cls._current(field, owner, entry[0], entry[2]):
+                    continue  # Stale: dropped or touched since
+                popped.append(entry)
+                if device is None or not cls._outgoing(entry[2]):
+                    yield entry[2]
+
+        for key in candidates():
+            if key in seen:
+                continue
+            seen.add(key)
+            if device is not None:
+                try:
+                    if os.stat(key).st_dev != device:
+                        continue
+                except OSError:
+                    continue
+            victims.append(key)
+            size = cls._transfers[key]["size"]
+            blob = cls._transfers[key].get("blob")
+            if blob and owner is None:
+                # Disk and the global total only get the bytes back once
+                # the last link goes (owner usage counts every link)
+                links_left[blob] = links_left.get(blob, cls._blob_refs[blob]) - 1
+                if links_left[blob] > 0:
+                    size = 0
+            freed_bytes += size
+            freed_files += 1
+            if covered():
+                break
+
+        chosen = set(victims) if covered() else set()
+        for entry in popped:
+            if entry[2] not in chosen:
+                heapq.heappush(heap, entry)
+        if not chosen:
+            return None
+        reason = owner or ("free disk space" if device is not None else "global quota")
+        logging.info(
+            f"Retention: evicting {len(victims)} files ({freed_bytes} bytes) "
+            f"for {reason}"
+        )
+        return [(key, cls.remove_transfer(key)) for key in victims]
+
+    @classmethod
+    def _check_quota(
+        cls, owners: List[str], size: int, files: int = 1, evict: bool = True
+    ):
+        """
+        Raises 413 unless size bytes and files more fit for every owner
+        (evicting if allowed). Owners sharing one hardlinked payload each get
+        their own files, but the global total counts the bytes once.
+        """
+        victims = []
+        try:
+            for owner in owners:
+                max_bytes, max_files = cls._limits(owner)
+                stored = cls._usage.get(owner, [0, 0])
+                pending = cls._inflight.get(owner, [0, 0])
+                used = [stored[0] + pending[0], stored[1] + pending[1]]
+                if max_bytes is not None and size > max_bytes:
+                    raise HTTPException(
+                        status_code=413, detail="File exceeds device quota"
+                    )
+                if cls._over(used, size, max_bytes, max_files, files):
+                    need_bytes = (
+                        used[0] + size - max_bytes if max_bytes is not None else 0
+                    )
+                    need_files = (
+                        used[1] + files - max_files if max_files is not None else 0
+                    )
+                    found = cls._evict(owner, need_bytes, need_files) if evict else None
+                    if found is None:
+                        raise HTTPException(
+                            status_code=413, detail="Device quota exceeded"
+                        )
+                    victims += found
+
+            max_bytes, max_files = cls.GLOBAL_MAX_BYTES, cls.GLOBAL_MAX_FILES
+            used = [cls._total[0] + cls._pending[0], cls._total[1] + cls._pending[1]]
+            files *= len(owners)
+            if max_bytes is not None and size > max_bytes:
+                raise HTTPException(
+                    status_code=413, detail="File exceeds storage quota"
+                )
+            if cls._over(used, size, max_bytes, max_files, files):
+                need_bytes = used[0] + size - max_bytes if max_bytes is not None else 0
+                need_files = used[1] + files - max_files if max_files is not None else 0
+                found = cls._evict(None, need_bytes, need_files) if evict else None
+                if found is None:
+                    raise HTTPException(
+                        status_code=413, detail="Storage quota exceeded"
+                    )
+                victims += found
+        except HTTPException:
+            cls._restore(victims)  # Rejected after all: evict nothing
+            raise
+        cls._dispose(victims)
+
+    @classmethod
+    async def _fit_disk(cls, size: int, target_dir: str, evict: bool = True) -> bool:
+        """
+        True if size fits in target_dir's free space beyond MIN_FREE_BYTES
+        and what in-flight uploads hold, evicting when the disk itself is
+        short. False while only reservations are in the way. Raises 507 if
+        eviction can't make room.
+        """
+        from services.trash_service import TrashService
+
+        device = None
+        while True:
+            free = shutil.disk_usage(target_dir).free - cls.MIN_FREE_BYTES
+            if size <= free - cls._reserved:
+                return True
+            if size <= free or not evict:
+                return False
+            device = device or os.stat(target_dir).st_dev
+            victims = cls._evict(None, size - free, 0, device)
+            if victims is None:
+                raise HTTPException(
+                    status_code=507, detail="Not enough free disk space on host"
+                )
+            # The space is needed now, so skip the reclaimer's pacing
+            await TrashService.reclaim_now(cls._dispose(victims))
+            cls._release_blobs(victims)
+            # Deleted files may still be held open; stop instead of
+            # evicting everything when a pass frees nothing
+            if shutil.disk_usage(target_dir).free - cls.MIN_FREE_BYTES <= free:
+                raise HTTPException(
+                    status_code=507, detail="Not enough free disk space on host"
+                )
+
+    @classmethod
+    async def admit(
+        cls, owner: Union[str, List[str]], size: int, target_dir: str
+    ) -> list:
+        """
+        Admission check run before an upload streams a single byte.
+        Returns a reservation; feed it to extend() as bytes arrive and pass
+        it to release() once the upload is done. Rejects with 413 (quota) or
+        507 (disk full), and throttles for up to ADMISSION_WAIT seconds while
+        other in-flight uploads hold the space.
+
+        A list of owners admits one payload that will be hardlinked to each
+        of them (broadcasts): every owner's quota must hold it, while disk
+        space is taken once.
+        """
+        owners = [owner] if isinstance(owner, str) else list(owner)
+        size = max(size, 0)
+        cls._check_quota(owners, size)
+
+        deadline = time.time() + cls.ADMISSION_WAIT
+        while not await cls._fit_disk(size, target_dir):
+            if time.time() >= deadline:
+                raise HTTPException(
+                    status_code=507, detail="Host storage busy, retry later"
+                )
+            await asyncio.sleep(0.5)
+
+        cls._reserved += size
+        cls._pending[0] += size
+        cls._pending[1] += len(owners)
+        for owner in owners:
+            pending = cls._inflight.setdefault(owner, [0, 0])
+            pending[0] += size
+            pending[1] += 1
+        return [owners, size, target_dir]
+
+    @classmethod
+    async def extend(cls, reservation: list, written: int):
+        """
+        Keeps an upload whose size was not declared (or declared as 0)
+        inside its reservation. Once written passes it, more space goes
+        through the same quota and disk checks as admit: GROW_STEP bytes if
+        that fits without evicting, else exactly what is needed. Raises 413
+        or 507 to abort the upload.
+        """
+        owners, size, target_dir = reservation
+        need = written - size
+        if need <= 0:
+            return
+        for extra, evict in ((max(need, cls.GROW_STEP), False), (need, True)):
+            try:
+                cls._check_quota(owners, extra, files=0, evict=evict)
+                if await cls._fit_disk(extra, target_dir, evict):
+                    break
+            except HTTPException:
+                if evict:
+                    raise
+        else:
+            raise HTTPException(
+                status_code=507, detail="Not enough free disk space on host"
+            )
+        cls._reserved += extra
+        cls._pending[0] += extra
+        for owner in owners:
+            cls._inflight.setdefault(owner, [0, 1])[0] += extra
+        reservation[1] += extra
+
+    @classmethod
+    def release(cls, reservation: list):
+        owners, size = reservation[:2]
+        cls._reserved = max(cls._reserved - size, 0)
+        cls._pending[0] = max(cls._pending[0] - size, 0)
+        cls._pending[1] = max(cls._pending[1] - len(owners), 0)
+        for owner in owners:
+            pending = cls._inflight.get(owner)
+            if pending:
+                pending[0] -= size
+                pending[1] -= 1
+                if pending[1] <= 0:
+                    del cls._inflight[owner]
+
+    @classmethod
+    def get_usage(cls) -> dict:
+        return {
+            "total": {"bytes": cls._total[0], "files": cls._total[1]},
+            "reserved": cls._reserved,
+            "devices": {
+                owner: {"bytes": used[0], "files": used[1]}
+                for owner, used in cls._usage.items()
+            },
+        }
+
+    @classmethod
+    def get_policy(cls) -> dict:
+        return {
+            "max_age_hours": cls.TRANSFER_MAX_AGE_HOURS,
+            "global_max_bytes": cls.GLOBAL_MAX_BYTES,
+            "global_max_files": cls.GLOBAL_MAX_FILES,
+            "device_max_bytes": cls.DEVICE_MAX_BYTES,
+            "device_max_files": cls.DEVICE_MAX_FILES,
+            "device_policies": cls.DEVICE_POLICIES,
+            "eviction": cls.EVICTION,
+            "min_free_bytes": cls.MIN_FREE_BYTES,
+        }
+
+    # Policy field -> (class attribute, type, nullable)
+    POLICY_FIELDS = {
+        "max_age_hours": ("TRANSFER_MAX_AGE_HOURS", float, True),
+        "global_max_bytes": ("GLOBAL_MAX_BYTES", int, True),
+        "global_max_files": ("GLOBAL_MAX_FILES", int, True),
+        "device_max_bytes": ("DEVICE_MAX_BYTES", int, True),
+        "device_max_files": ("DEVICE_MAX_FILES", int, True),
+        "min_free_bytes": ("MIN_FREE_BYTES", int, False),
+    }
+    DEVICE_POLICY_FIELDS = {
+        "max_bytes": int,
+        "max_files": int,
+        "max_age_hours": float,
+    }
+
+    @staticmethod
+    def _coerce(field: str, value, kind, nullable: bool = True):
+        """Parses a non-negative limit from JSON, or raises 400"""
+        if value is None and nullable:
+            return None
+        try:
+            if isinstance(value, bool) or value is None:
+                raise ValueError
+            parsed = kind(value)
+            if kind is int and isinstance(value, float) and value != parsed:
+                raise ValueError
+        except (TypeError, ValueError, OverflowError):
+            raise HTTPException(status_code=400, detail=f"Invalid {field}")
+        if parsed < 0 or parsed != parsed or parsed == float("inf"):
+            raise HTTPException(status_code=400, detail=f"Invalid {field}")
+        return parsed
+
+    @classmethod
+    def update_policy(cls, data: dict):
+        """Validates every field first, so a bad request changes nothing"""
+        if not isinstance(data, dict):
+            raise HTTPException(status_code=400, detail="Expected a JSON object")
+        updates = {}
+        for field, (attr, kind, nullable) in cls.POLICY_FIELDS.items():
+            if field in data:
+                updates[attr] = cls._coerce(field, data[field], kind, nullable)
+
+        if "device_policies" in data:
+            policies = data["device_policies"] or {}
+            if not isinstance(policies, dict):
+                raise HTTPException(status_code=400, detail="Invalid device_policies")
+            updates["DEVICE_POLICIES"] = {}
+            for name, policy in policies.items():
+                if not isinstance(policy, dict):
+                    raise HTTPException(
+                        status_code=400, detail=f"Invalid policy for {name}"
+                    )
+                unknown = set(policy) - set(cls.DEVICE_POLICY_FIELDS)
+                if unknown:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Unknown policy field: {sorted(unknown)[0]}",
+                    )
+                updates["DEVICE_POLICIES"][name] = {
+                    field: cls._coerce(field, value, cls.DEVICE_POLICY_FIELDS[field])
+                    for field, value in policy.items()
+                }
+
+        eviction = data.get("eviction")
+        if eviction is not None:
+            if eviction not in cls.EVICTION_MODES:
+                raise HTTPException(status_code=400, detail="Unknown eviction mode")
+            updates["EVICTION"] = eviction
+
+        for attr, value in updates.items():
+            setattr(cls, attr, value)
+        # Age rules changed; rebuild the expiry schedule from the index
+        for key, info in cls._transfers.items():
+            cls._scheduled.pop(key, None)
+            max_age = cls._max_age_hours(info["owner"])
+            if max_age:
+                cls.schedule(key, "transfer", max_age * 3600, info["mtime"])
+
+    # --- Sweeping ---
+
+    @classmethod
+    def add_removal_listener(cls, callback):
+        """callback(path) runs after retention deletes something from disk"""
+        cls._removal_listeners.append(callback)
+
+    @classmethod
+    def add_release_listener(cls, callback):
+        """callback(blob) runs after the last tracked link to a blob is deleted"""
+        cls._release_listeners.append(callback)
+
+    @classmethod
+    def _removed(cls, path: str, info: dict = None):
+        for callback in cls._removal_listeners:
+            callback(path)
+        cls._release_blobs([(path, info)])
+
+    @classmethod
+    def _release_blobs(cls, victims: list):
+        """Release listeners for blobs whose last tracked link is among victims"""
+        for _, info in victims:
+            blob = info.get("blob") if info else None
+            if blob and blob not in cls._blob_refs:
+                for callback in cls._release_listeners:
+                    callback(blob)
+
+    @classmethod
+    def _remove(cls, path: str, info: dict = None) -> bool:
+        """info is the dropped transfer entry, if path was one"""
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            cls._removed(path, info)
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logging.error(f"Retention: failed to remove {path}: {e}")
+            return False
+
+    @classmethod
+    def _restore(cls, victims: list):
+        """Tracks evicted transfers again when their eviction is called off"""
+        for key, info in victims:
+            cls._put(key, info)
+            max_age = cls._max_age_hours(info["owner"])
+            if max_age:
+                cls.schedule(key, "transfer", max_age * 3600, info["mtime"])
+
+    @classmethod
+    def _dispose(cls, victims: list) -> Optional[str]:
+        """
+        Deletes dropped entries, given as (path, info), by moving them to
+        the trash in one batch. The renames happen here; the unlinks and
+        rmtrees happen later in TrashService's reclaimer, off the event
+        loop. Paths outside the transfer folders (temp-dir archives) are
+        removed inline. Returns the trash batch id, if any.
+        """
+        from services.trash_service import TrashService
+
+        items, moved = [], []
+        for path, info in victims:
+            if TrashService._trash_root(path) is None:
+                cls._remove(path, info)
+                continue
+            owner = info["owner"] if info else ""
+            items.append((path, owner, "sent" if cls._outgoing(path) else "received"))
+            moved.append((path, info))
+        batch_id = TrashService.move(items, hold=0) if items else None
+        for path, info in moved:
+            cls._removed(path, info)
+        return batch_id
+
+    @classmethod
+    def sweep(cls, now: float = None) -> int:
+        """Removes every entry that is due. Only touches due paths."""
+        now = now if now is not None else time.time()
+        victims = []
+        while cls._queue and cls._queue[0][0] <= now:
+            due, _, key = heapq.heappop(cls._queue)
+            entry = cls._scheduled.get(key)
+            if not entry or entry[0] != due:
+                continue  # Rescheduled or discarded
+            kind = entry[1]
+
+            if kind == "temp":
+                # Uploads still being written keep bumping their mtime
+                try:
+                    mtime = os.path.getmtime(key)
+                except OSError:
+                    del cls._scheduled[key]
+                    continue
+                if mtime + cls.TEMP_TTL > now:
+                    cls.schedule(key, kind, cls.TEMP_TTL, mtime)
+                    continue
+
+            del cls._scheduled[key]
+            victims.append((key, cls._drop(key)))
+        cls._dispose(victims)
+        return len(victims)
+
+    @classmethod
+    def expire_transfers(cls, max_age_seconds: float, owner: str = None) -> int:
+        """Removes tracked transfers older than max_age_seconds (0 = all)"""
+        now = time.time()
+        victims = []
+        for key, info in list(cls._transfers.items()):
+            if owner is not None and info["owner"] != owner:
+                continue
+            if max_age_seconds and now - info["mtime"] <= max_age_seconds:
+                continue
+            victims.append((key, cls.remove_transfer(key)))
+        cls._dispose(victims)
+        return len(victims)
+
+    # --- Reconciliation ---
+
+    @classmethod
+    def request_reconcile(cls):
+        cls._last_reconcile = 0.0
+
+    @classmethod
+    def reconcile_due(cls) -> bool:
+        return time.time() - cls._last_reconcile >= cls.RECONCILE_INTERVAL
+
+    @staticmethod
+    def arrival(st) -> float:
+        """
+        When a file landed here. Not st_mtime: sync uploads carry the
+        client's original mtime (x-file-mtime), and an old photo must not
+        look expired the moment it arrives. Writing, renaming or stamping
+        a file all set st_ctime, which is creation time on Windows.
+        """
+        return max(st.st_mtime, st.st_ctime)
+
+    @classmethod
+    def _scan(cls, upload_dir: str, save_path: str):
+        """Blocking full walk. Returns (transfers, temps, archives)."""
+        transfers, temps, archives = {}, [], []
+
+        def walk(root, owner):
+            for dirpath, _, files in os.walk(root):
+                for f in files:
+                    path = os.path.join(dirpath, f)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    if f.endswith(".tmp"):
+                        temps.append((cls._key(path), st.st_mtime))
+                    else:
+                        arrived = cls.arrival(st)
+                        info = {
+                            "owner": owner,
+                            "size": st.st_size,
+                            "mtime": arrived,
+                            "atime": arrived,
+                        }
+                        if st.st_nlink > 1:
+                            info["blob"] = f"{st.st_dev}:{st.st_ino}"
+                        transfers[cls._key(path)] = info
+
+        # Incoming: SAVE_PATH/<device>/...
+        if os.path.isdir(save_path):
+            for d in os.listdir(save_path):
+                path = os.path.join(save_path, d)
+                if os.path.isdir(path) and not d.startswith("."):
+                    walk(path, d)
+
+        # Outgoing: UPLOAD_DIR/<session>/outgoing/...
+        if os.path.isdir(upload_dir):
+            for d in os.listdir(upload_dir):
+                path = os.path.join(upload_dir, d, "outgoing")
+                if os.path.isdir(path):
+                    walk(path, d)
+
+        # System TEMP (Batch ZIPs from a previous run)
+        sys_temp = tempfile.gettempdir()
+        for f in os.listdir(sys_temp):
+            if f.endswith(".zip") and "transfer_bundle" in f:
+                path = os.path.join(sys_temp, f)
+                try:
+                    archives.append((cls._key(path), os.path.getmtime(path)))
+                except OSError:
+                    continue
+
+        return transfers, temps, archives
+
+    @classmethod
+    async def reconcile(cls, upload_dir: str, save_path: str):
+        """Rebuilds the index from disk without blocking the event loop"""
+        started = time.time()
+        cls._last_reconcile = started
+        loop = asyncio.get_running_loop()
+        transfers, temps, archives = await loop.run_in_executor(
+            None, cls._scan, upload_dir, save_path
+        )
+
+        # Keep transfers that completed while the walk was running, and the
+        # LRU state of the ones we already knew about
+        for key, info in cls._transfers.items():
+            if key not in transfers:
+                if info["mtime"] >= started:
+                    transfers[key] = info
+            else:
+                transfers[key]["atime"] = info["atime"]
+        cls._transfers, cls._usage, cls._total = {}, {}, [0, 0]
+        cls._blob_refs, cls._heaps = {}, {}
+        for key, info in transfers.items():
+            cls._put(key, info)
+
+        # Live uploads keep bumping their mtime, so a sweep only takes idle ones
+        for key, mtime in temps:
+            if key not in cls._scheduled:
+                cls.schedule(key, "temp", cls.TEMP_TTL, mtime)
+        for key, mtime in archives:
+            if key not in cls._scheduled:
+                cls.schedule(key, "archive", cls.ARCHIVE_TTL, mtime)
+        for key, info in transfers.items():
+            max_age = cls._max_age_hours(info["owner"])
+            if max_age and key not in cls._scheduled:
+                cls.schedule(key, "transfer", max_age * 3600, info["mtime"])
+
+        logging.info(
+            f"Retention: reconciled {len(transfers)} transfers, "
+            f"{len(temps)} temp files, {len(archives)} archives"
+        )
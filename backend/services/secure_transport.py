@@ -0,0 +1,313 @@
+import os
+import base64
+import struct
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Optional
+from fastapi import HTTPException
+from core.config import CHUNK_SIZE, AEAD_CIPHER, AEAD_PORT
+
+FINAL_BIT = 0x80000000  # Set in the length word of a stream's last frame
+SALT_SIZE = 32  # Random per-stream salt sent alongside the frames
+MIN_SALT_SIZE = 16
+
+
+def stream_aead(key: bytes, cipher: str, salt: bytes, context: bytes):
+    """
+    AEAD for one stream: HKDF-SHA256 of the session key with the stream's
+    random salt and context. Every stream gets its own key, so counter
+    nonces never repeat under a key whoever picked the salt.
+    """
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+    stream_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        info=SecureTransport.INFO + b"|stream|" + context,
+    ).derive(key)
+    return SecureTransport.make_aead(stream_key, cipher)
+
+
+def _nonce(counter: int) -> bytes:
+    return b"\0\0\0\0" + struct.pack(">Q", counter)
+
+
+class FrameEncryptor:
+    """
+    Splits a byte stream into sealed frames: [u32 length][ciphertext+tag].
+
+    Frames are sealed under a fresh per-stream key (see stream_aead; send
+    salt to the peer). Frame n uses nonce n and authenticates n, the final
+    flag and the stream context, so frames can't be reordered, replayed
+    across streams or silently truncated.
+    """
+
+    def __init__(self, key: bytes, cipher: str, context: bytes):
+        self.salt = os.urandom(SALT_SIZE)
+        self.aead = stream_aead(key, cipher, self.salt, context)
+        self.context = context
+        self.counter = 0
+
+    def seal(self, data: bytes, final: bool = False) -> bytes:
+        nonce = _nonce(self.counter)
+        aad = struct.pack(">Q?", self.counter, final) + self.context
+        self.counter += 1
+        sealed = self.aead.encrypt(nonce, bytes(data), aad)
+        return struct.pack(">I", len(sealed) | (FINAL_BIT if final else 0)) + sealed
+
+
+class FrameDecryptor:
+    """Incremental inverse of FrameEncryptor; feed() arbitrary-size chunks"""
+
+    TAG_SIZE = 16
+
+    def __init__(
+        self, key: bytes, cipher: str, context: bytes, salt: bytes, max_frame: int
+    ):
+        if not MIN_SALT_SIZE <= len(salt) <= SALT_SIZE:
+            raise HTTPException(status_code=400, detail="Missing AEAD salt")
+        self.aead = stream_aead(key, cipher, salt, context)
+        self.context = context
+        self.max_frame = max_frame + self.TAG_SIZE
+        self.counter = 0
+        self.finished = False
+        self._buf = bytearray()
+
+    def _header(self) -> tuple:
+        """(length, final) of the buffered frame, or (None, False) if unknown"""
+        if len(self._buf) < 4:
+            return None, False
+        (length,) = struct.unpack_from(">I", self._buf)
+        final = bool(length & FINAL_BIT)
+        length &= ~FINAL_BIT
+        if length < self.TAG_SIZE or length > self.max_frame:
+            raise HTTPException(status_code=400, detail="Bad AEAD frame")
+        return length, final
+
+    def buffer(self, chunk: bytes) -> bool:
+        """Cheap: appends chunk; True once a whole frame is waiting for feed()"""
+        self._buf += chunk
+        length, _ = self._header()
+        return length is not None and len(self._buf) >= 4 + length
+
+    def feed(self, chunk: bytes = b"") -> list:
+        from cryptography.exceptions import InvalidTag
+
+        self._buf += chunk
+        out = []
+        while True:
+            length, final = self._header()
+            if length is None or len(self._buf) < 4 + length:
+                break
+            if self.finished:
+                raise HTTPException(status_code=400, detail="Data after final frame")
+            sealed = bytes(self._buf[4 : 4 + length])
+            del self._buf[: 4 + length]
+            nonce = _nonce(self.counter)
+            aad = struct.pack(">Q?", self.counter, final) + self.context
+            try:
+                out.append(self.aead.decrypt(nonce, sealed, aad))
+            except InvalidTag:
+                raise HTTPException(
+                    status_code=400, detail="AEAD authentication failed"
+                )
+            self.finished = final
+            self.counter += 1
+        return out
+
+    def close(self):
+        if not self.finished or self._buf:
+            raise HTTPException(status_code=400, detail="Truncated AEAD stream")
+
+
+class SecureTransport:
+    """
+    Optional plain-HTTP transport for authenticated sessions. At PIN
+    verification the client sends an X25519 public key; both sides derive
+    a per-session key (HKDF-SHA256 over the shared secret, salted with the
+    session id and bound to the PIN). Upload and download bodies are then
+    sent as chunked AEAD frames on AEAD_PORT, skipping TLS entirely; each
+    body is sealed under its own key derived from a random x-aead-salt.
+    """
+
+    CIPHERS = ("aesgcm", "chacha20")
+    CIPHER = AEAD_CIPHER if AEAD_CIPHER in CIPHERS else "aesgcm"
+    PORT = AEAD_PORT  # 0 disables the plain-HTTP listener
+    FRAME_SIZE = CHUNK_SIZE  # Plaintext bytes per frame
+    INFO = b"turbosync-aead-v1"
+
+    _keys: Dict[str, tuple] = {}  # session_id -> (key, cipher)
+    _server = None
+    _task = None
+
+    @staticmethod
+    def b64encode(data: bytes) -> str:
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    @staticmethod
+    def b64decode(text: str) -> bytes:
+        return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+    @staticmethod
+    def derive_key(
+        private, peer_public: bytes, session_id: str, pin: str, cipher: str
+    ) -> bytes:
+        """Session key from our X25519 private key and the peer's raw public key"""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+        from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PublicKey
+
+        shared = private.exchange(X25519PublicKey.from_public_bytes(peer_public))
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=session_id.encode(),
+            info=SecureTransport.INFO + b"|" + cipher.encode() + b"|" + pin.encode(),
+        ).derive(shared)
+
+    @staticmethod
+    def make_aead(key: bytes, cipher: str):
+        if cipher == "chacha20":
+            from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+            return ChaCha20Poly1305(key)
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        return AESGCM(key)
+
+    @staticmethod
+    def public_bytes(private) -> bytes:
+        from cryptography.hazmat.primitives.serialization import (
+            Encoding,
+            PublicFormat,
+        )
+
+        return private.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+
+    @classmethod
+    def negotiate(
+        cls, session: dict, pin: str, client_public_key: str, cipher: str = None
+    ) -> dict:
+        """
+        Derives and stores the session key; returns what the client needs
+        to derive the same key and reach the AEAD listener.
+        """
+        from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+        cipher = cipher if cipher in cls.CIPHERS else cls.CIPHER
+        private = X25519PrivateKey.generate()
+        try:
+            key = cls.derive_key(
+                private,
+                cls.b64decode(client_public_key),
+                session["session_id"],
+                str(pin),
+                cipher,
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid public key")
+        cls._keys[session["session_id"]] = (key, cipher)
+
+        return {
+            "server_public_key": cls.b64encode(cls.public_bytes(private)),
+            "cipher": cipher,
+            "port": cls.PORT or None,
+            "frame_size": cls.FRAME_SIZE,
+        }
+
+    @classmethod
+    def forget(cls, session_id: str):
+        cls._keys.pop(session_id, None)
+
+    @classmethod
+    def _key(cls, session_id: Optional[str]) -> tuple:
+        entry = cls._keys.get(session_id)
+        if not entry:
+            raise HTTPException(status_code=401, detail="No transport key for session")
+        return entry
+
+    # --- Streaming pipelines ---
+
+    @classmethod
+    async def decrypt_stream(
+        cls, session_id: str, salt: str, context: str, body: AsyncIterator
+    ) -> AsyncIterator[bytes]:
+        """
+        Decrypts an uploaded frame stream as it arrives. Request chunks are
+        buffered on the loop; frames are opened off it, like sealing.
+        """
+        try:
+            salt = cls.b64decode(salt or "")
+        except ValueError:
+            salt = b""
+        decryptor = FrameDecryptor(
+            *cls._key(session_id), context.encode(), salt, cls.FRAME_SIZE
+        )
+        loop = asyncio.get_running_loop()
+        async for chunk in body:
+            if not decryptor.buffer(chunk):
+                continue
+            for plain in await loop.run_in_executor(None, decryptor.feed):
+                if plain:
+                    yield plain
+        decryptor.close()
+
+    @classmethod
+    def encryptor(cls, session_id: str, context: str) -> FrameEncryptor:
+        return FrameEncryptor(*cls._key(session_id), context.encode())
+
+    @classmethod
+    async def encrypt_file(
+        cls, path: str, encryptor: FrameEncryptor
+    ) -> AsyncIterator[bytes]:
+        """Reads and seals a file frame by frame, off the event loop"""
+        from services.io_backend import IOBackend
+
+        loop = asyncio.get_running_loop()
+        io = IOBackend.get()
+        size = os.path.getsize(path)
+        fd = await io.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            sent = 0
+            while True:
+                data = await io.pread(fd, cls.FRAME_SIZE, sent)
+                sent += len(data)
+                final = not data or sent >= size
+                yield await loop.run_in_executor(None, encryptor.seal, data, final)
+                if final:
+                    return
+        finally:
+            await io.close(fd)
+
+    # --- Plain-HTTP listener ---
+
+    @classmethod
+    async def start(cls, app, host: str = "0.0.0.0"):
+        if not cls.PORT or cls._task is not None:
+            return
+        import uvicorn
+        from contextlib import contextmanager
+
+        class EmbeddedServer(uvicorn.Server):
+            @contextmanager
+            def capture_signals(self):
+                yield  # The main server owns the signal handlers
+
+        config = uvicorn.Config(
+            app, host=host, port=cls.PORT, log_level="warning", lifespan="off"
+        )
+        cls._server = EmbeddedServer(config)
+        cls._task = asyncio.create_task(cls._server.serve())
+        logging.info(f"AEAD transport listening on http://{host}:{cls.PORT}")
+
+    @classmethod
+    async def stop(cls):
+        if cls._server is not None:
+            cls._server.should_exit = True
+            try:
+                await asyncio.wait_for(cls._task, timeout=5)
+            except Exception:
+                cls._task.cancel()
+        cls._server, cls._task = None, None
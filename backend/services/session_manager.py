@@ -39,7 +39,10 @@ class SessionManager:
             # Cleanup files on disconnect
             from services.file_service import FileService
 
+            from services.secure_transport import SecureTransport
+
             FileService.delete_session_files(session_id)
+            SecureTransport.forget(session_id)
             del self.sessions[session_id]
             return True
         return False
@@ -48,7 +51,10 @@ class SessionManager:
         if session_id in self.sessions:
             from services.file_service import FileService
 
+            from services.secure_transport import SecureTransport
+
             FileService.delete_session_files(session_id)
+            SecureTransport.forget(session_id)
             self.blocked_sessions.add(session_id)
             del self.sessions[session_id]
             return True
@@ -121,9 +127,11 @@ class SessionManager:
     def reset(self):
         # Clear all sessions and their files
         from services.file_service import FileService
+        from services.secure_transport import SecureTransport
 
         for sid in list(self.sessions.keys()):
             FileService.delete_session_files(sid)
+            SecureTransport.forget(sid)
         self.sessions = {}
         return {"status": "cleared"}
 
@@ -1,20 +1,38 @@
+import io
 import os
-from PIL import Image
+import json
+import base64
+import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
+from fastapi import HTTPException
 
 
 class ThumbnailService:
     THUMB_DIR = os.path.join("uploads", ".thumbnails")
+    THUMB_SIZE = (128, 128)
+    IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp", ".bmp"]
+    MAX_BATCH = 200  # Thumbnails per batch request (one gallery page)
+    SPRITE_COLUMNS = 10
+    MAX_CACHED_SPRITES = 16
+    _tasks = set()
+    _dir_ready = False
+    _sprites = OrderedDict()  # etag -> rendered sprite sheet
 
     @classmethod
     def get_thumbnail_path(cls, file_path: str) -> str:
-        if not os.path.exists(cls.THUMB_DIR):
-            os.makedirs(cls.THUMB_DIR, exist_ok=True)
-
+        # Pure path math: called per file by every listing
         file_name = os.path.basename(file_path)
         thumb_name = f"thumb_{file_name}.webp"
         return os.path.join(cls.THUMB_DIR, thumb_name)
 
+    @classmethod
+    def _ensure_dir(cls):
+        if not cls._dir_ready:
+            os.makedirs(cls.THUMB_DIR, exist_ok=True)
+            cls._dir_ready = True
+
     @classmethod
     def generate_thumbnail(cls, file_path: str) -> bool:
         try:
@@ -23,7 +41,7 @@ class ThumbnailService:
 
             # Supported image formats
             ext = os.path.splitext(file_path)[1].lower()
-            if ext not in [".jpg", ".jpeg", ".png", ".webp", ".bmp"]:
+            if ext not in cls.IMAGE_EXTENSIONS:
                 return False
 
             thumb_path = cls.get_thumbnail_path(file_path)
@@ -34,12 +52,172 @@ class ThumbnailService:
             ) >= os.path.getmtime(file_path):
                 return True
 
+            from PIL import Image  # Heavy import, only load when needed
+
+            cls._ensure_dir()
             with Image.open(file_path) as img:
-                img.thumbnail((128, 128))
+                # JPEGs decode at a reduced scale, so big photos stay cheap
+                img.draft("RGB", cls.THUMB_SIZE)
+                img.thumbnail(cls.THUMB_SIZE)
                 img.save(thumb_path, "WEBP", quality=80)
 
-            logging.info(f"Generated thumbnail for {file_name}")
+            logging.info(f"Generated thumbnail for {os.path.basename(file_path)}")
             return True
         except Exception as e:
             logging.error(f"Thumbnail generation failed for {file_path}: {e}")
             return False
+
+    @classmethod
+    def generate_thumbnails(cls, file_paths: list) -> int:
+        """Generates thumbnails for a batch of files, returns how many exist"""
+        return sum(1 for path in file_paths if cls.generate_thumbnail(path))
+
+    @classmethod
+    def _decode_cost(cls, file_path: str) -> int:
+        """Bytes needed to decode an image at thumbnail (draft) scale"""
+        from PIL import Image
+
+        with Image.open(file_path) as img:
+            img.draft("RGB", cls.THUMB_SIZE)
+            width, height = img.size
+        return width * height * 4
+
+    @classmethod
+    async def generate_thumbnails_async(cls, file_paths: list) -> int:
+        """
+        Like generate_thumbnails, but each image waits for a slot (and its
+        decode memory) in the "thumbnail" admission pool and renders off-loop.
+        """
+        from services.admission_service import AdmissionService
+
+        loop = asyncio.get_running_loop()
+        count = 0
+        for path in file_paths:
+            if os.path.splitext(path)[1].lower() not in cls.IMAGE_EXTENSIONS:
+                continue
+            try:
+                cost = await loop.run_in_executor(None, cls._decode_cost, path)
+                async with AdmissionService.slot("thumbnail", cost):
+                    if await loop.run_in_executor(None, cls.generate_thumbnail, path):
+                        count += 1
+            except HTTPException as e:
+                logging.warning(f"Thumbnail skipped for {path}: {e.detail}")
+            except Exception as e:
+                logging.error(f"Thumbnail generation failed for {path}: {e}")
+        return count
+
+    @classmethod
+    def schedule(cls, file_paths: list):
+        """Fire-and-forget generate_thumbnails_async from inside a request"""
+        task = asyncio.ensure_future(cls.generate_thumbnails_async(file_paths))
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
+    # --- Batches (gallery pages) ---
+
+    @classmethod
+    def lookup(cls, file_ids: list, session_id: str = None) -> tuple:
+        """
+        Blocking. Resolves ids (names as /download takes them) to cached
+        thumbnails. Returns (found, missing, to_render): found holds
+        (id, thumb_path, stat) tuples; to_render lists source images whose
+        thumbnail doesn't exist yet.
+        """
+        from services.file_service import FileService
+
+        found, missing, to_render = [], [], []
+        for file_id in file_ids:
+            src = FileService.resolve_path(file_id, session_id)
+            if not src or not os.path.isfile(src):
+                missing.append(file_id)
+                continue
+            thumb = cls.get_thumbnail_path(src)
+            try:
+                found.append((file_id, thumb, os.stat(thumb)))
+            except OSError:
+                missing.append(file_id)
+                if os.path.splitext(src)[1].lower() in cls.IMAGE_EXTENSIONS:
+                    to_render.append(src)
+        return found, missing, to_render
+
+    @staticmethod
+    def batch_etag(fmt: str, file_ids: list, found: list) -> str:
+        """One validator for the page, from stats alone (no thumbnail reads)"""
+        digest = hashlib.sha1(fmt.encode())
+        for file_id in file_ids:
+            digest.update(b"\0" + file_id.encode())
+        for file_id, _, st in found:
+            digest.update(f"\0{file_id}:{st.st_mtime_ns}:{st.st_size}".encode())
+        return f'"{digest.hexdigest()}"'
+
+    @classmethod
+    def render_multipart(cls, found: list, missing: list, boundary: str) -> bytes:
+        """Blocking. multipart/mixed body: one image/webp part per thumbnail"""
+        from urllib.parse import quote
+
+        delimiter = f"--{boundary}\r\n".encode()
+        out = io.BytesIO()
+        for file_id, thumb, _ in found:
+            try:
+                with open(thumb, "rb") as f:
+                    data = f.read()
+            except OSError:
+                missing.append(file_id)
+                continue
+            out.write(delimiter)
+            out.write(
+                f"Content-Type: image/webp\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"X-File-Id: {quote(file_id)}\r\n\r\n".encode()
+            )
+            out.write(data)
+            out.write(b"\r\n")
+        # Trailing part tells the client which ids have no thumbnail (yet)
+        summary = json.dumps({"missing": missing}).encode()
+        out.write(delimiter)
+        out.write(b"Content-Type: application/json\r\n\r\n" + summary + b"\r\n")
+        out.write(f"--{boundary}--\r\n".encode())
+        return out.getvalue()
+
+    @classmethod
+    def render_sprite(cls, found: list, missing: list, etag: str) -> dict:
+        """
+        Blocking. Packs the page into one WEBP sprite sheet on a grid of
+        THUMB_SIZE cells. Returns the sheet as a data URI plus an offset map
+        {id: [x, y, width, height]}; cached per ETag.
+        """
+        cached = cls._sprites.get(etag)
+        if cached is not None:
+            cls._sprites.move_to_end(etag)
+            return cached
+
+        from PIL import Image
+
+        cell_w, cell_h = cls.THUMB_SIZE
+        columns = max(1, min(cls.SPRITE_COLUMNS, len(found)))
+        rows = max(1, -(-len(found) // columns))
+        sheet = Image.new("RGBA", (columns * cell_w, rows * cell_h), (0, 0, 0, 0))
+        offsets = {}
+        for i, (file_id, thumb, _) in enumerate(found):
+            x, y = (i % columns) * cell_w, (i // columns) * cell_h
+            try:
+                with Image.open(thumb) as img:
+                    sheet.paste(img.convert("RGBA"), (x, y))
+                    offsets[file_id] = [x, y, img.width, img.height]
+            except OSError:
+                missing.append(file_id)
+
+        buf = io.BytesIO()
+        sheet.save(buf, "WEBP", quality=80)
+        sprite = {
+            "sprite": "data:image/webp;base64,"
+            + base64.b64encode(buf.getvalue()).decode(),
+            "width": sheet.width,
+            "height": sheet.height,
+            "offsets": offsets,
+            "missing": missing,
+        }
+        cls._sprites[etag] = sprite
+        if len(cls._sprites) > cls.MAX_CACHED_SPRITES:
+            cls._sprites.popitem(last=False)
+        return sprite
@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional
+from fastapi import HTTPException
+from core.config import UPLOAD_DIR
+
+
+class TrashService:
+    """
+    Deletes by renaming targets into a trash folder on the same filesystem
+    (UPLOAD_DIR/.trash or SAVE_PATH/.trash), which is O(1) however large the
+    tree is, so requests return immediately. A background reclaimer frees
+    the space later at a bounded unlink rate; until a batch's undo window
+    has passed it can be restored instead.
+
+    Every batch directory carries a manifest of what was moved, so batches
+    left over from a previous run are still reclaimed (or restorable).
+    """
+
+    TRASH_DIR = ".trash"
+    MANIFEST = ".manifest.json"
+    UNDO_WINDOW = 30  # Seconds a deleted batch stays restorable
+    RECLAIM_RATE = 2000  # Unlinks per second, leaves disk bandwidth for transfers
+    RECLAIM_STEP = 200  # Unlinks between rate-limit checks
+    POLL_INTERVAL = 5
+
+    _batches: Dict[str, dict] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _roots(cls) -> List[str]:
+        from services.file_service import FileService
+
+        return [os.path.abspath(UPLOAD_DIR), os.path.abspath(FileService.SAVE_PATH)]
+
+    @classmethod
+    def _trash_root(cls, path: str) -> Optional[str]:
+        """Trash folder of the deepest known root containing path"""
+        path = os.path.abspath(path)
+        roots = [r for r in cls._roots() if path.startswith(r + os.sep)]
+        if not roots:
+            return None
+        return os.path.join(max(roots, key=len), cls.TRASH_DIR)
+
+    @staticmethod
+    def _delete(path: str):
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        elif os.path.lexists(path):
+            os.remove(path)
+
+    @classmethod
+    def _write_manifest(cls, batch: dict):
+        for batch_dir in batch["dirs"]:
+            tmp = os.path.join(batch_dir, cls.MANIFEST + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(batch, f)
+            os.replace(tmp, os.path.join(batch_dir, cls.MANIFEST))
+
+    # --- Delete / undo ---
+
+    @classmethod
+    def move(
+        cls, items: List[tuple], hold: float = None, session_id: str = None
+    ) -> Optional[str]:
+        """
+        Moves (path, owner, direction) items to the trash. hold is how long
+        the batch stays restorable (UNDO_WINDOW by default, 0 = reclaim as
+        soon as possible). Returns the batch id, or None if nothing moved.
+        """
+        batch_id = uuid.uuid4().hex[:12]
+        batch = {
+            "id": batch_id,
+            "session_id": session_id,
+            "deleted_at": time.time(),
+            "hold": cls.UNDO_WINDOW if hold is None else hold,
+            "dirs": [],
+            "items": [],
+        }
+        for i, (path, owner, direction) in enumerate(items):
+            trash = cls._trash_root(path)
+            try:
+                if trash is None:
+                    raise OSError("outside the transfer folders")
+                batch_dir = os.path.join(trash, batch_id)
+                if batch_dir not in batch["dirs"]:
+                    os.makedirs(batch_dir, exist_ok=True)
+                    batch["dirs"].append(batch_dir)
+                dst = os.path.join(batch_dir, f"{i}_{os.path.basename(path)}")
+                # Same filesystem as the target, so this is a metadata-only rename
+                os.rename(path, dst)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logging.warning(f"Trash: deleting {path} inline ({e})")
+                cls._delete(path)
+                continue
+            batch["items"].append(
+                {
+                    "src": os.path.abspath(path),
+                    "dst": dst,
+                    "owner": owner,
+                    "direction": direction,
+                }
+            )
+        if not batch["dirs"]:
+            return None
+        from services.index_service import IndexService
+
+        IndexService.update_tree(*(item["src"] for item in batch["items"]))
+        cls._write_manifest(batch)
+        with cls._lock:
+            cls._batches[batch_id] = batch
+        return batch_id if batch["items"] else None
+
+    @staticmethod
+    def _register(path: str, owner: str, direction: str) -> list:
+        """Re-tracks a restored file or tree; returns index items for it"""
+        from services.retention_service import RetentionService
+
+        if os.path.isdir(path):
+            files = [
+                os.path.join(dirpath, f)
+                for dirpath, _, names in os.walk(path)
+                for f in names
+            ]
+        else:
+            files = [path]
+        items = []
+        for f in files:
+            try:
+                st = os.stat(f)
+            except OSError:
+                continue
+            RetentionService.add_transfer(
+                f, owner, st.st_size, RetentionService.arrival(st)
+            )
+            items.append((f, owner, direction))
+        if os.path.isdir(path):
+            items.append((path, owner, direction))
+        return items
+
+    @classmethod
+    def restore(cls, batch_id: str, session_id: str = None) -> dict:
+        """Moves a batch back where it came from while its undo window lasts"""
+        from services.index_service import IndexService
+
+        with cls._lock:
+            batch = cls._batches.get(batch_id)
+            if batch is None or cls._due(batch, time.time()):
+                raise HTTPException(status_code=404, detail="Nothing to restore")
+            if batch["session_id"] != session_id:
+                raise HTTPException(status_code=403, detail="Not your delete")
+            del cls._batches[batch_id]
+
+        restored, conflicts, index_items = [], [], []
+        for item in batch["items"]:
+            src, dst = item["src"], item["dst"]
+            if os.path.lexists(src) or not os.path.lexists(dst):
+                conflicts.append(os.path.basename(src))
+                continue
+            os.makedirs(os.path.dirname(src), exist_ok=True)
+            os.rename(dst, src)
+            restored.append(os.path.basename(src))
+            index_items += cls._register(src, item["owner"], item["direction"])
+        IndexService.add_files(index_items)
+        IndexService.update_tree(*(path for path, _, _ in index_items))
+
+        # Whatever could not go back is reclaimed on the next pass
+        batch["hold"] = 0
+        with cls._lock:
+            cls._batches[batch_id] = batch
+        return {"restored": restored, "conflicts": conflicts}
+
+    @classmethod
+    def list_batches(cls, session_id: str = None) -> list:
+        now = time.time()
+        with cls._lock:
+            batches = list(cls._batches.values())
+        return [
+            {
+                "id": b["id"],
+                "names": [os.path.basename(i["src"]) for i in b["items"]],
+                "deleted_at": b["deleted_at"],
+                "undo_seconds": round(b["deleted_at"] + b["hold"] - now, 1),
+            }
+            for b in batches
+            if b["session_id"] == session_id and not cls._due(b, now)
+        ]
+
+    # --- Reclaim ---
+
+    @staticmethod
+    def _due(batch: dict, now: float) -> bool:
+        return now >= batch["deleted_at"] + batch["hold"]
+
+    @classmethod
+    def _load(cls):
+        """Picks up batches a previous run left in the trash folders"""
+        for root in cls._roots():
+            trash = os.path.join(root, cls.TRASH_DIR)
+            if not os.path.isdir(trash):
+                continue
+            for name in os.listdir(trash):
+                batch_dir = os.path.join(trash, name)
+                with cls._lock:
+                    known = name in cls._batches
+                if known or not os.path.isdir(batch_dir):
+                    continue
+                try:
+                    with open(os.path.join(batch_dir, cls.MANIFEST)) as f:
+                        batch = json.load(f)
+                except (OSError, ValueError):
+                    # Moved but never recorded: nothing to restore it to
+                    batch = {"id": name, "session_id": None, "items": []}
+                    batch.update(deleted_at=0, hold=0, dirs=[batch_dir])
+                # Runs in an executor while requests may add batches
+                with cls._lock:
+                    cls._batches.setdefault(batch["id"], batch)
+
+    @classmethod
+    def _reclaim(cls, batch: dict) -> Iterator[int]:
+        """
+        Unlinks a batch bottom-up, yielding the running count every
+        RECLAIM_STEP entries (and once at the end) so the caller can pace it
+        """
+        count = 0
+        for batch_dir in batch["dirs"]:
+            try:
+                # Dropped first: a half-reclaimed batch must not be restorable
+                os.remove(os.path.join(batch_dir, cls.MANIFEST))
+            except OSError:
+                pass
+            for dirpath, dirs, files in os.walk(batch_dir, topdown=False):
+                for name in files + dirs:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        if name in dirs and not os.path.islink(path):
+                            os.rmdir(path)
+                        else:
+                            os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logging.error(f"Trash: could not reclaim {path}: {e}")
+                    count += 1
+                    if count % cls.RECLAIM_STEP == 0:
+                        yield count
+            try:
+                os.rmdir(batch_dir)
+            except OSError as e:
+                logging.error(f"Trash: could not reclaim {batch_dir}: {e}")
+        yield count
+
+    @classmethod
+    async def _reclaim_paced(cls, batch: dict) -> int:
+        """
+        Runs _reclaim one step per executor call, at most RECLAIM_RATE
+        entries a second; the pause is an asyncio sleep, so no pool thread
+        is held while waiting
+        """
+        loop = asyncio.get_running_loop()
+        steps = cls._reclaim(batch)
+        started = time.monotonic()
+        count = 0
+        while True:
+            step = await loop.run_in_executor(None, next, steps, None)
+            if step is None:
+                return count
+            count = step
+            ahead = count / cls.RECLAIM_RATE - (time.monotonic() - started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+
+    @classmethod
+    async def reclaim_now(cls, batch_id: Optional[str]):
+        """
+        Reclaims one batch right away, unpaced but still off the loop, for
+        callers that need the space back (retention under disk pressure)
+        """
+        with cls._lock:
+            batch = cls._batches.pop(batch_id, None) if batch_id else None
+        if batch is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, list, cls._reclaim(batch))
+
+    @classmethod
+    async def reclaim_loop(cls):
+        from services.blob_store import BlobStore
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, cls._load)
+        while True:
+            try:
+                now = time.time()
+                with cls._lock:
+                    due = [b for b in cls._batches.values() if cls._due(b, now)]
+                    for batch in due:
+                        del cls._batches[batch["id"]]
+                for batch in due:
+                    await cls._reclaim_paced(batch)
+                if due:
+                    # Hardlinks held by the trash kept shared blobs alive
+                    BlobStore.collect()
+            except Exception as e:
+                logging.error(f"Trash reclaim error: {e}")
+            with cls._lock:
+                deadlines = [b["deleted_at"] + b["hold"] for b in cls._batches.values()]
+            wait = min(deadlines, default=now + cls.POLL_INTERVAL) - time.time()
+            await asyncio.sleep(min(max(wait, 0.1), cls.POLL_INTERVAL))
@@ -0,0 +1,164 @@
+import os
+import asyncio
+import logging
+from core.config import CHUNK_SIZE, FSYNC_POLICY, FSYNC_INTERVAL
+from services.io_backend import IOBackend
+
+
+class BufferPool:
+    """Reusable fixed-size bytearrays, so uploads don't allocate per chunk"""
+
+    def __init__(self, buffer_size: int = CHUNK_SIZE, max_idle: int = 32):
+        self.buffer_size = buffer_size
+        self.max_idle = max_idle
+        self._idle = []
+
+    def acquire(self) -> bytearray:
+        if self._idle:
+            return self._idle.pop()
+        return bytearray(self.buffer_size)
+
+    def release(self, buf: bytearray):
+        if len(self._idle) < self.max_idle and len(buf) == self.buffer_size:
+            self._idle.append(buf)
+
+
+class UploadWriter:
+    """
+    Coalesces small request.stream() chunks into CHUNK_SIZE buffers and
+    writes them through the file I/O backend, one large write at a time.
+
+    While one buffer is being written the next one is filled (double
+    buffering), so each upload holds at most two buffers in memory.
+    """
+
+    FSYNC_POLICIES = ("none", "close", "periodic")
+    FSYNC_POLICY = FSYNC_POLICY if FSYNC_POLICY in FSYNC_POLICIES else "none"
+    FSYNC_INTERVAL = FSYNC_INTERVAL
+    PREALLOCATE = hasattr(os, "posix_fallocate")
+
+    _pool = BufferPool()
+
+    def __init__(self, path: str, expected_size: int = 0, fsync_policy: str = None):
+        self.path = path
+        self.expected_size = expected_size
+        self.fsync_policy = fsync_policy or self.FSYNC_POLICY
+        self.written = 0
+        self._fd = None
+        self._buf = None
+        self._fill = 0
+        self._pending = None
+        self._synced_at = 0
+        self._preallocated = False
+        self._io = IOBackend.get()
+
+    async def open(self):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+        self._fd = await self._io.open(self.path, flags, 0o644)
+        if self.PREALLOCATE and self.expected_size > 0:
+            try:
+                # Reserve contiguous extents up front to limit fragmentation
+                await self._io.fallocate(self._fd, 0, self.expected_size)
+                self._preallocated = True
+            except OSError as e:
+                logging.debug(f"fallocate unsupported for {self.path}: {e}")
+        return self
+
+    async def _write(self, data, offset: int, release: bytearray = None):
+        try:
+            await self._io.pwrite(self._fd, data, offset)
+            end = offset + len(data)
+            if (
+                self.fsync_policy == "periodic"
+                and end - self._synced_at >= self.FSYNC_INTERVAL
+            ):
+                await self._io.fsync(self._fd)
+                self._synced_at = end
+        finally:
+            if release is not None:
+                self._pool.release(release)
+
+    async def _close(self, sync: bool):
+        try:
+            if self._preallocated and self.written != self.expected_size:
+                await self._io.ftruncate(self._fd, self.written)
+            if sync:
+                await self._io.fsync(self._fd)
+        finally:
+            fd, self._fd = self._fd, None
+            await self._io.close(fd)
+
+    async def _submit(self, data, release: bytearray = None):
+        # Only one write in flight per file keeps writes ordered
+        if self._pending is not None:
+            await self._pending
+        offset = self.written
+        self.written += len(data)
+        self._pending = asyncio.ensure_future(self._write(data, offset, release))
+
+    async def write(self, chunk: bytes):
+        if not chunk:
+            return
+        size = self._pool.buffer_size
+
+        # Large chunks with nothing buffered skip the copy entirely
+        if self._fill == 0 and len(chunk) >= size:
+            await self._submit(chunk)
+            return
+
+        view = memoryview(chunk)
+        while view:
+            if self._buf is None:
+                self._buf = self._pool.acquire()
+                self._fill = 0
+            n = min(size - self._fill, len(view))
+            self._buf[self._fill : self._fill + n] = view[:n]
+            self._fill += n
+            view = view[n:]
+            if self._fill == size:
+                await self._flush()
+
+    async def _flush(self):
+        if self._buf is None:
+            return
+        buf, fill = self._buf, self._fill
+        self._buf, self._fill = None, 0
+        if fill:
+            await self._submit(memoryview(buf)[:fill], release=buf)
+        else:
+            self._pool.release(buf)
+
+    async def close(self) -> int:
+        """Flushes, applies the fsync policy and returns bytes written"""
+        try:
+            await self._flush()
+            if self._pending is not None:
+                await self._pending
+        finally:
+            self._pending = None
+            if self._fd is not None:
+                await self._close(self.fsync_policy != "none")
+        return self.written
+
+    async def abort(self):
+        if self._pending is not None:
+            try:
+                await self._pending
+            except Exception:
+                pass
+            self._pending = None
+        if self._buf is not None:
+            self._pool.release(self._buf)
+            self._buf = None
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            await self._io.close(fd)
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.close()
+        else:
+            await self.abort()
@@ -1,28 +1,39 @@
 import os
 import socket
 from datetime import datetime, timedelta
-from cryptography import x509
-from cryptography.x509.oid import NameOID
-from cryptography.hazmat.primitives import hashes, serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-
 
 from net_utils import get_smart_ips
 
+# "rsa" (2048-bit, widest compatibility) or "ec" (P-256, near-instant to generate)
+TLS_KEY_TYPE = os.environ.get("TURBO_TLS_KEY_TYPE", "rsa")
+
 
 def get_local_ips():
     return get_smart_ips() + ["127.0.0.1", "localhost"]
 
 
-def generate_self_signed_cert(cert_path="cert.pem", key_path="key.pem"):
-    if os.path.exists(cert_path) and os.path.exists(key_path):
-        return
+def generate_private_key(key_type: str = None):
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
 
-    key = rsa.generate_private_key(
+    if (key_type or TLS_KEY_TYPE) == "ec":
+        return ec.generate_private_key(ec.SECP256R1())
+    return rsa.generate_private_key(
         public_exponent=65537,
         key_size=2048,
     )
 
+
+def generate_self_signed_cert(cert_path="cert.pem", key_path="key.pem", key_type=None):
+    # Cached TLS material: existing files are reused without loading cryptography
+    if os.path.exists(cert_path) and os.path.exists(key_path):
+        return
+
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+
+    key = generate_private_key(key_type)
+
     subject = issuer = x509.Name(
         [
             x509.NameAttribute(NameOID.COUNTRY_NAME, "US"),
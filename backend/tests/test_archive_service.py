@@ -0,0 +1,110 @@
+import os
+import zipfile
+
+import pytest
+
+from services import archive_service
+from services.archive_service import ArchiveService
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Small blocks so a few KB already spans several of them
+    monkeypatch.setattr(ArchiveService, "BLOCK_SIZE", 4096)
+
+
+def make_tree(root):
+    files = {
+        "empty.txt": b"",
+        "notes.txt": b"hello zip\n" * 100,
+        "déjà vu/日本語.txt": "unicode ✓".encode(),
+        "nested/deeper/multi.bin": os.urandom(3 * 4096 + 123),
+        "nested/text.log": b"line\n" * 5000,  # Compressible, several blocks
+        "photo.jpg": os.urandom(10000),  # Stored, not deflated
+    }
+    for name, data in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    os.makedirs(os.path.join(root, "empty dir"))
+    return files
+
+
+def check(archive, files):
+    with zipfile.ZipFile(archive) as z:
+        assert z.testzip() is None
+        names = z.namelist()
+        assert len(names) == len(set(names))
+        for name, data in files.items():
+            assert z.read(name) == data
+        return z
+
+
+def test_round_trip(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    files = make_tree(str(src))
+    archive = ArchiveService.write_directory(str(tmp_path / "out.zip"), str(src))
+
+    z = check(archive, files)
+    names = z.namelist()
+    assert "empty dir/" in names
+    assert "nested/deeper/" in names
+    assert z.getinfo("photo.jpg").compress_type == zipfile.ZIP_STORED
+    assert z.getinfo("nested/text.log").compress_type == zipfile.ZIP_DEFLATED
+    assert z.getinfo("nested/text.log").compress_size < 5 * 5000
+
+
+def test_level_zero_stores_everything(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    files = make_tree(str(src))
+    archive = ArchiveService.write_directory(str(tmp_path / "out.zip"), str(src), 0)
+
+    z = check(archive, files)
+    assert all(i.compress_type == zipfile.ZIP_STORED for i in z.infolist())
+
+
+def test_zip64_local_headers(tmp_path, monkeypatch):
+    init = archive_service._Entry.__init__
+
+    def forced(self, *args):
+        init(self, *args)
+        self.zip64 = True
+
+    monkeypatch.setattr(archive_service._Entry, "__init__", forced)
+    src = tmp_path / "src"
+    src.mkdir()
+    files = make_tree(str(src))
+    archive = ArchiveService.write_directory(str(tmp_path / "out.zip"), str(src))
+
+    check(archive, files)
+
+
+def test_duplicate_arcnames(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    for folder, tag in ((a, b"a"), (b, b"b")):
+        (folder / "shared").mkdir(parents=True)
+        (folder / "report.pdf").write_bytes(tag * 100)
+        (folder / "shared" / "inner.txt").write_bytes(tag)
+    (b / "shared" / "only_b.txt").write_bytes(b"b")
+
+    sources = [
+        (str(a / "report.pdf"), "report.pdf"),
+        (str(b / "report.pdf"), "report.pdf"),
+        (str(a / "shared"), "shared"),
+        (str(b / "shared"), "shared"),
+    ]
+    archive = ArchiveService.write(str(tmp_path / "out.zip"), sources)
+
+    check(
+        archive,
+        {
+            "report.pdf": b"a" * 100,
+            "report (1).pdf": b"b" * 100,
+            "shared/inner.txt": b"a",
+            "shared/inner (1).txt": b"b",
+            "shared/only_b.txt": b"b",
+        },
+    )
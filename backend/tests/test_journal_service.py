@@ -0,0 +1,88 @@
+import os
+import sys
+import signal
+import asyncio
+import subprocess
+
+import pytest
+
+from services.journal_service import JournalService
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Opens a job, creates what it is about to touch, then dies without
+# finishing it (no atexit, no flush: SIGKILL)
+CRASH = """
+import os, sys, signal
+from services.journal_service import JournalService
+
+JournalService.JOURNAL_PATH = sys.argv[1]
+kind, paths = sys.argv[2], sys.argv[3:]
+JournalService.begin(kind, paths)
+if kind == "upload":
+    with open(paths[0], "wb") as f:
+        f.write(b"partial")
+os.kill(os.getpid(), signal.SIGKILL)
+"""
+
+
+def crash(tmp_path, kind, *paths):
+    proc = subprocess.run(
+        [sys.executable, "-c", CRASH, str(tmp_path / "journal.log"), kind, *paths],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": BACKEND_DIR, "TURBO_FSYNC": "close"},
+    )
+    assert proc.returncode == -signal.SIGKILL
+
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    JournalService.flush()
+    monkeypatch.setattr(JournalService, "JOURNAL_PATH", str(tmp_path / "journal.log"))
+    monkeypatch.setattr(JournalService, "_file", None)
+    monkeypatch.setattr(JournalService, "_jobs", {})
+    yield JournalService
+    JournalService.flush()
+    if JournalService._file is not None:
+        JournalService._file.close()
+
+
+def test_upload_rolled_back_after_crash(tmp_path, journal):
+    temp = tmp_path / "upload.tmp"
+    crash(tmp_path, "upload", str(temp))
+    assert temp.exists()
+
+    assert journal.replay() == 1
+    assert not temp.exists()
+    assert journal.replay() == 0  # The fresh log has nothing open
+
+
+def test_delete_rolled_forward_after_crash(tmp_path, journal):
+    doomed = [tmp_path / "a.txt", tmp_path / "folder"]
+    doomed[0].write_bytes(b"a")
+    (doomed[1] / "inner").mkdir(parents=True)
+    keep = tmp_path / "keep.txt"
+    keep.write_bytes(b"k")
+    crash(tmp_path, "delete", *map(str, doomed))
+
+    assert journal.replay() == 1
+    assert not any(p.exists() for p in doomed)
+    assert keep.exists()
+
+
+def test_begin_and_commit_are_on_disk_when_they_return(journal):
+    job_id = journal.begin("upload", ["x.tmp"])
+    with open(journal.JOURNAL_PATH) as f:
+        assert job_id in f.read()
+    journal.commit(job_id, blob="b")
+    assert journal._read()[job_id]["committed"]
+
+
+def test_async_begin_waits_for_its_batch(journal):
+    async def run():
+        job_id = await journal.begin_async("zip", ["a.zip"])
+        await journal.commit_async(job_id)
+        return job_id
+
+    job_id = asyncio.run(run())
+    assert journal._read()[job_id]["committed"]
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from services.retention_service import RetentionService
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    for attr, value in {
+        "_queue": [],
+        "_scheduled": {},
+        "_transfers": {},
+        "_usage": {},
+        "_total": [0, 0],
+        "_blob_refs": {},
+        "_heaps": {},
+        "_paths": [],
+        "_indexed": set(),
+        "TRANSFER_MAX_AGE_HOURS": None,
+        "DEVICE_POLICIES": {},
+    }.items():
+        monkeypatch.setattr(RetentionService, attr, value)
+
+
+def test_remove_tree_takes_only_the_subtree(tmp_path):
+    root = str(tmp_path / "Phone")
+    inside = ["a.txt", "sub/b.txt", "sub/deeper/c.txt"]
+    outside = ["../Phone-2/d.txt", "../Phone.txt", "../Phone0/e.txt"]
+    for name in inside + outside:
+        RetentionService.add_transfer(os.path.join(root, name), "Phone", 10)
+    RetentionService.schedule(os.path.join(root, "x.tmp"), "temp", 60)
+    RetentionService.schedule(os.path.join(root, "../y.tmp"), "temp", 60)
+
+    RetentionService.remove_tree(root)
+
+    left = {os.path.relpath(p, root) for p in RetentionService._transfers}
+    assert left == {os.path.normpath(name) for name in outside}
+    assert list(RetentionService._scheduled) == [
+        RetentionService._key(os.path.join(root, "../y.tmp"))
+    ]
+    assert RetentionService.get_usage()["total"] == {"bytes": 30, "files": 3}
+
+    # A single file, and a path nothing is tracked under
+    RetentionService.remove_tree(os.path.join(root, "../Phone.txt"))
+    RetentionService.remove_tree(os.path.join(root, "missing"))
+    assert len(RetentionService._transfers) == 2
+
+
+def test_index_drops_stale_paths(tmp_path):
+    for i in range(3000):
+        path = str(tmp_path / f"f{i}")
+        RetentionService.add_transfer(path, "Phone", 1)
+        RetentionService.remove_transfer(path)
+    assert len(RetentionService._paths) <= 1024 + 1
@@ -0,0 +1,404 @@
+"""
+Headless TurboTransfer client for scripted backups and restores.
+
+    python turbo_cli.py --server https://host:8000 push ~/projects --dest projects
+    python turbo_cli.py --server https://host:8000 pull projects ./restore
+
+Pairs like a browser does: prints a PIN for the host to enter, or with
+--auto-verify confirms it itself (handy against a local test server).
+push uploads a tree into this device's received folder on the host; pull
+downloads from it (or, with --from sent, from what the host shared with
+this device). Files the other side already has with the same size and
+mtime are skipped, so an interrupted run is resumed by running it again;
+partial downloads continue where they stopped.
+
+Standard library only, so it can be copied onto any box with Python 3.8+.
+"""
+
+import os
+import re
+import sys
+import ssl
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import http.client
+from urllib.parse import quote, urlencode, urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_BATCH = 50_000  # Entries per sync manifest request
+MTIME_TOLERANCE = 2.0  # Seconds; FAT and some network filesystems round mtimes
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class TransientError(Exception):
+    """Worth retrying: connection trouble, timeouts, overload"""
+
+
+class TransferError(Exception):
+    """Not worth retrying: the server rejected the request"""
+
+
+def sanitize_filename(name: str) -> str:
+    """Mirror of FileService.sanitize_filename, so remote names can be predicted"""
+    name = re.sub(r"[^\w\s\.\-\(\)]", "_", os.path.basename(name))
+    return "_" + name if name.startswith(".") else name
+
+
+def remote_path(rel: str) -> str:
+    return "/".join(sanitize_filename(p) for p in rel.split("/") if p not in ("", "."))
+
+
+def same_file(size: int, mtime: float, other: dict) -> bool:
+    return other["size"] == size and abs(other["mtime"] - mtime) <= MTIME_TOLERANCE
+
+
+class Client:
+    """One keep-alive connection per worker thread (the pool is the threads)"""
+
+    def __init__(self, server: str, insecure: bool = False, cafile: str = None):
+        url = urlsplit(server if "://" in server else f"https://{server}")
+        self.https = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port or (443 if self.https else 80)
+        self.timeout = 60
+        self.context = None
+        if self.https:
+            self.context = ssl.create_default_context(cafile=cafile)
+            if insecure:
+                # The server generates a self-signed certificate on first run
+                self.context.check_hostname = False
+                self.context.verify_mode = ssl.CERT_NONE
+        self.session_id = None
+        self.device_name = None
+        self._local = threading.local()
+
+    def _conn(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.https:
+                conn = http.client.HTTPSConnection(
+                    self.host,
+                    self.port,
+                    timeout=self.timeout,
+                    context=self.context,
+                    blocksize=CHUNK_SIZE,
+                )
+            else:
+                conn = http.client.HTTPConnection(
+                    self.host, self.port, timeout=self.timeout, blocksize=CHUNK_SIZE
+                )
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def request(self, method, path, body=None, headers=None, sink=None):
+        """
+        Returns (status, response headers, body bytes). With sink, a 2xx
+        body is streamed into sink(status).write() instead of being returned.
+        """
+        headers = dict(headers or {})
+        if self.session_id:
+            headers["x-session-id"] = self.session_id
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        try:
+            conn = self._conn()
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            if sink is not None and 200 <= resp.status < 300:
+                out = sink(resp.status)
+                while True:
+                    chunk = resp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                data = b""
+            else:
+                data = resp.read()
+        except (OSError, http.client.HTTPException) as e:
+            # Includes timeouts, resets and a server that closed a kept-alive
+            # connection; the next attempt opens a fresh one
+            self._reset()
+            raise TransientError(f"{method} {path}: {e!r}")
+        if resp.will_close:
+            self._reset()
+        if resp.status in RETRY_STATUS:
+            raise TransientError(f"{method} {path}: HTTP {resp.status}")
+        if resp.status >= 400:
+            try:
+                detail = json.loads(data).get("detail", data.decode())
+            except ValueError:
+                detail = data.decode(errors="replace")
+            raise TransferError(f"HTTP {resp.status}: {detail}")
+        return resp.status, resp.headers, data
+
+    def json(self, method, path, body=None):
+        return json.loads(self.request(method, path, body)[2])
+
+    # --- Pairing ---
+
+    def pair(self, device_name: str, auto_verify: bool = False, session: str = None):
+        self.device_name = device_name
+        if session:
+            sessions = self.json("GET", "/api/session/status")["sessions"]
+            match = [s for s in sessions if s["session_id"] == session]
+            if not match or match[0]["status"] != "AUTHENTICATED":
+                raise TransferError(f"Session {session} is not paired")
+            self.session_id = session
+            self.device_name = match[0]["device_name"]
+            return
+        init = self.json(
+            "GET", "/api/session/init?" + urlencode({"device_name": device_name})
+        )
+        if auto_verify:
+            self.json("POST", "/api/session/verify", {"pin": init["pin"]})
+        else:
+            print(
+                f"Enter PIN {init['pin']} on the host to pair '{device_name}'...",
+                file=sys.stderr,
+            )
+            while True:
+                if time.time() > init["expires_at"]:
+                    raise TransferError("PIN expired before the host entered it")
+                sessions = self.json("GET", "/api/session/status")["sessions"]
+                mine = [s for s in sessions if s["session_id"] == init["session_id"]]
+                if mine and mine[0]["status"] == "AUTHENTICATED":
+                    break
+                time.sleep(1)
+        self.session_id = init["session_id"]
+        print(f"Paired as '{device_name}' (session {self.session_id})", file=sys.stderr)
+
+    def tree(self, direction: str, path: str = "") -> dict:
+        query = urlencode({"direction": direction, "path": path})
+        return self.json("GET", f"/api/files/tree?{query}")
+
+    # --- Transfers ---
+
+    def upload(self, local: str, rel: str) -> int:
+        st = os.stat(local)
+        folder, name = os.path.split(rel)
+        headers = {
+            "x-filename": name,
+            "x-filesize": str(st.st_size),
+            "x-device-name": self.device_name,
+            "x-relative-dir": folder,
+            "x-file-mtime": repr(st.st_mtime),
+            "Content-Length": str(st.st_size),
+            "Content-Type": "application/octet-stream",
+        }
+        with open(local, "rb") as f:
+            self.request("POST", "/api/files/upload", body=f, headers=headers)
+        return st.st_size
+
+    def download(self, name: str, local: str, size: int, mtime: float) -> int:
+        """Resumes into local + '.part' and renames it into place when done"""
+        part = local + ".part"
+        os.makedirs(os.path.dirname(local) or ".", exist_ok=True)
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if offset > size:
+            offset = 0
+        headers = {"Range": f"bytes={offset}-"} if 0 < offset < size else {}
+        path = "/api/files/download/" + quote(name)
+
+        with open(part, "ab"):
+            pass
+        with open(part, "r+b") as f:
+
+            def sink(status):
+                # 206 continues the part file; a 200 is the whole file again
+                f.seek(offset if status == 206 else 0)
+                f.truncate()
+                return f
+
+            if offset < size or size == 0:
+                self.request("GET", path, headers=headers, sink=sink)
+        if os.path.getsize(part) != size:
+            os.remove(part)  # Changed on the server meanwhile; start over
+            raise TransientError(f"{name}: size mismatch")
+        os.utime(part, (time.time(), mtime))
+        os.replace(part, local)
+        return size - offset
+
+
+def with_retry(fn, retries: int, backoff: float):
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except TransientError:
+            if attempt >= retries:
+                raise
+            # Exponential backoff with jitter so parallel workers spread out
+            time.sleep(min(backoff * 2**attempt, 30) * random.uniform(0.5, 1.5))
+            attempt += 1
+
+
+def run_jobs(jobs, workers: int, retries: int, backoff: float, quiet: bool) -> dict:
+    """jobs: [(label, fn)], fn returns bytes moved -> summary of the run"""
+    summary = {"done": 0, "bytes": 0, "failed": []}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(with_retry, fn, retries, backoff): label for label, fn in jobs
+        }
+        for future in as_completed(futures):
+            label = futures[future]
+            try:
+                summary["bytes"] += future.result()
+                summary["done"] += 1
+                if not quiet:
+                    print(f"  {label}", file=sys.stderr)
+            except (TransientError, TransferError, OSError) as e:
+                summary["failed"].append((label, str(e)))
+                print(f"  FAILED {label}: {e}", file=sys.stderr)
+    summary["elapsed"] = time.perf_counter() - started
+    return summary
+
+
+def push(client: Client, args) -> dict:
+    src = os.path.abspath(args.source)
+    dest = remote_path(args.dest or "")
+    if os.path.isfile(src):
+        files = [(src, os.path.basename(src))]
+    else:
+        files = [
+            (os.path.join(dirpath, f), os.path.relpath(os.path.join(dirpath, f), src))
+            for dirpath, _, names in os.walk(src)
+            for f in names
+        ]
+    locals_by_rel = {}
+    for local, rel in files:
+        rel = remote_path("/".join(filter(None, [dest, rel.replace(os.sep, "/")])))
+        st = os.stat(local)
+        locals_by_rel[rel] = (local, st.st_size, st.st_mtime)
+    # The host answers with only the files it lacks or holds another copy of
+    wanted = set()
+    manifest = [[rel, size, mtime] for rel, (_, size, mtime) in locals_by_rel.items()]
+    for i in range(0, len(manifest), MANIFEST_BATCH):
+        diff = client.json(
+            "POST",
+            "/api/files/sync/manifest",
+            {"files": manifest[i : i + MANIFEST_BATCH]},
+        )
+        wanted.update(diff["missing"], diff["changed"])
+
+    jobs = [
+        (rel, lambda local=local, rel=rel: client.upload(local, rel))
+        for rel, (local, _, _) in sorted(locals_by_rel.items())
+        if rel in wanted
+    ]
+    skipped = len(locals_by_rel) - len(jobs)
+    return dict(
+        run_jobs(jobs, args.jobs, args.retries, args.backoff, args.quiet),
+        skipped=skipped,
+    )
+
+
+def pull(client: Client, args) -> dict:
+    source = remote_path(args.source or "")
+    listing = client.tree(args.direction, source)
+    prefix = listing["download_prefix"]
+
+    jobs, skipped = [], 0
+    for f in sorted(listing["files"], key=lambda f: f["path"]):
+        rel = f["path"][len(source) :].lstrip("/") if source else f["path"]
+        local = os.path.join(args.dest, *rel.split("/"))
+        if os.path.exists(local):
+            st = os.stat(local)
+            if same_file(st.st_size, st.st_mtime, f):
+                skipped += 1
+                continue
+
+        def fn(f=f, local=local):
+            return client.download(prefix + f["path"], local, f["size"], f["mtime"])
+
+        jobs.append((f["path"], fn))
+    return dict(
+        run_jobs(jobs, args.jobs, args.retries, args.backoff, args.quiet),
+        skipped=skipped,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless TurboTransfer client")
+    parser.add_argument("--server", default="https://127.0.0.1:8000")
+    parser.add_argument(
+        "--device", default=socket.gethostname(), help="name shown on the host"
+    )
+    parser.add_argument("--session", help="reuse an already paired session id")
+    parser.add_argument(
+        "--auto-verify", action="store_true", help="confirm the PIN without the host"
+    )
+    parser.add_argument(
+        "--insecure", action="store_true", help="accept the self-signed certificate"
+    )
+    parser.add_argument(
+        "--cafile", help="trust this certificate (e.g. the server's cert.pem)"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=4, help="concurrent transfers"
+    )
+    parser.add_argument("--retries", type=int, default=4)
+    parser.add_argument(
+        "--backoff", type=float, default=0.5, help="first retry delay (s)"
+    )
+    parser.add_argument("-q", "--quiet", action="store_true")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("push", help="upload a file or folder tree to the host")
+    p.add_argument("source")
+    p.add_argument(
+        "--dest", default="", help="folder under this device's received folder"
+    )
+    p.set_defaults(run=push)
+
+    p = commands.add_parser("pull", help="download a folder tree from the host")
+    p.add_argument(
+        "source", nargs="?", default="", help="remote folder (default: everything)"
+    )
+    p.add_argument("dest")
+    p.add_argument(
+        "--from",
+        dest="direction",
+        choices=["received", "sent"],
+        default="received",
+        help="received: what this device pushed; sent: what the host shared",
+    )
+    p.set_defaults(run=pull)
+
+    args = parser.parse_args(argv)
+    client = Client(args.server, args.insecure, args.cafile)
+    try:
+        with_retry(
+            lambda: client.pair(args.device, args.auto_verify, args.session),
+            args.retries,
+            args.backoff,
+        )
+        summary = args.run(client, args)
+    except (TransientError, TransferError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    elapsed = summary["elapsed"]
+    rate = summary["bytes"] / elapsed / 1e6 if elapsed else 0
+    print(
+        f"{args.command}: {summary['done']} transferred, {summary['skipped']} skipped, "
+        f"{len(summary['failed'])} failed; {summary['bytes'] / 1e6:.1f} MB "
+        f"in {elapsed:.2f}s ({rate:.1f} MB/s)"
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())